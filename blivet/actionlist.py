@@ -21,9 +21,17 @@
 #
 
 import copy
+import heapq
+import sys
+from collections import OrderedDict
+from threading import Thread
 
+import six
+
+from .callbacks import event_callbacks
 from .deviceaction import ActionCreateDevice
 from .deviceaction import action_type_from_string, action_object_from_string
+from .devicestatus import statusCache
 from .devicelibs import lvm
 from .devices import PartitionDevice
 from .errors import DiskLabelCommitError, StorageError
@@ -34,18 +42,57 @@ import logging
 log = logging.getLogger("blivet")
 
 class ActionList(object):
+    """ An ordered collection of actions.
+
+        Actions are indexed by device id and by action and object type so
+        that lookups, removals and pruning do not need to scan the whole list.
+    """
     def __init__(self):
-        self._actions = []
+        self._actions = OrderedDict()   # action -> position
+        self._device_actions = {}       # device id -> list of actions
+        self._container_actions = {}    # container id -> list of actions
+        self._type_actions = {}         # (type, obj) -> OrderedDict of actions
         self._completed_actions = []
+        self._next_position = 0
 
     def __iter__(self):
-        return iter(self._actions)
+        return iter(list(self._actions))
 
     def append(self, action):
-        self._actions.append(action)
+        self._actions[action] = self._next_position
+        self._next_position += 1
+        self._device_actions.setdefault(action.device.id, []).append(action)
+        if action.isContainer:
+            self._container_actions.setdefault(action.container.id,
+                                               []).append(action)
+
+        key = (action.type, action.obj)
+        self._type_actions.setdefault(key, OrderedDict())[action] = None
 
     def remove(self, action):
-        self._actions.remove(action)
+        del self._actions[action]
+        device_actions = self._device_actions[action.device.id]
+        device_actions.remove(action)
+        if not device_actions:
+            del self._device_actions[action.device.id]
+
+        if action.isContainer:
+            container_actions = self._container_actions[action.container.id]
+            container_actions.remove(action)
+            if not container_actions:
+                del self._container_actions[action.container.id]
+
+        del self._type_actions[(action.type, action.obj)][action]
+
+    def _setActions(self, actions):
+        """ Replace the contents of the list, rebuilding the indexes. """
+        self._actions = OrderedDict()
+        self._device_actions = {}
+        self._container_actions = {}
+        self._type_actions = {}
+        self._next_position = 0
+        for action in actions:
+            self.append(action)
 
     def find(self, device=None, action_type=None, object_type=None,
              path=None, devid=None):
@@ -70,14 +117,30 @@ class ActionList(object):
         """
         if device is None and action_type is None and object_type is None and \
            path is None and devid is None:
-            return self._actions[:]
+            return list(self._actions)
 
         # convert the string arguments to the types used in actions
         _type = action_type_from_string(action_type)
         _object = action_object_from_string(object_type)
 
+        # start from the smallest set of candidates the indexes can provide
+        if device is not None or devid is not None:
+            if devid is None:
+                devid = device.id
+
+            candidates = self._device_actions.get(devid, [])
+        elif _type is not None or _object is not None:
+            candidates = []
+            for ((a_type, a_obj), actions) in self._type_actions.items():
+                if _type in (None, a_type) and _object in (None, a_obj):
+                    candidates.extend(actions)
+
+            candidates.sort(key=self._actions.get)
+        else:
+            candidates = self._actions
+
         actions = []
-        for action in self._actions:
+        for action in candidates:
             if device is not None and action.device != device:
                 continue
 
@@ -98,57 +161,165 @@ class ActionList(object):
         return actions
 
     def prune(self):
-        """ Remove redundant/obsolete actions from the action list. """
-        for action in reversed(self._actions[:]):
+        """ Remove redundant/obsolete actions from the action list.
+
+            An action can only obsolete actions on the same device or, for
+            the destruction of a container, actions adding members to that
+            container. Each action is only compared to those actions.
+        """
+        for action in reversed(list(self._actions)):
             if action not in self._actions:
                 log.debug("action %d already pruned", action.id)
                 continue
 
-            for obsolete in self._actions[:]:
+            candidates = self._device_actions[action.device.id][:]
+            candidates.extend(self._container_actions.get(action.device.id, []))
+            for obsolete in candidates:
+                if obsolete not in self._actions:
+                    continue
+
                 if action.obsoletes(obsolete):
                     log.info("removing obsolete action %d (%d)",
                              obsolete.id, action.id)
-                    self._actions.remove(obsolete)
+                    self.remove(obsolete)
 
                     if obsolete.obsoletes(action) and action in self._actions:
                         log.info("removing mutually-obsolete action %d (%d)",
                                  action.id, obsolete.id)
-                        self._actions.remove(action)
+                        self.remove(action)
+
+    @staticmethod
+    def _dependentDevices(device):
+        """ Return a set of device and all devices that may depend on it. """
+        devices = set([device])
+        stack = [device]
+        while stack:
+            for dep in stack.pop().dependents:
+                if dep not in devices:
+                    devices.add(dep)
+                    stack.append(dep)
 
-    def sort(self):
-        """ Sort actions based on dependencies. """
-        if not self._actions:
-            return
+        return devices
+
+    def _relatedActions(self):
+        """ Return a dict of possibly related action indices by action index.
 
+            Apart from the ordering by action type (see :meth:`sort`), actions
+            can only require each other if they operate on the same device,
+            on devices that depend on one another or on partitions of the
+            same disk, or if one of them adds or removes a member of a
+            container the other action's device belongs to.
+        """
+        actions = list(self._actions)
+        related = dict((idx, set()) for idx in range(len(actions)))
+
+        def relate(indices, others):
+            for idx in indices:
+                related[idx].update(others)
+
+        by_device = {}
+        devices = {}
+        by_disk = {}
+        by_container = {}
+        for (idx, action) in enumerate(actions):
+            device = action.device
+            by_device.setdefault(device.id, []).append(idx)
+            devices.setdefault(device.id, set()).add(device)
+            if isinstance(device, PartitionDevice) and device.disk:
+                by_disk.setdefault(device.disk.id, []).append(idx)
+
+            for container in (action.container,
+                              getattr(device, "container", None)):
+                if container is not None:
+                    by_container.setdefault(container.id, []).append(idx)
+
+        for (devid, indices) in by_device.items():
+            for device in devices[devid]:
+                for dep in self._dependentDevices(device):
+                    others = by_device.get(dep.id)
+                    if others:
+                        relate(indices, others)
+                        relate(others, indices)
+
+        for indices in by_disk.values():
+            relate(indices, indices)
+
+        for indices in by_container.values():
+            members = [i for i in indices if actions[i].isContainer]
+            relate(indices, members)
+            relate(members, indices)
+
+        return related
+
+    def _dependencyEdges(self, actions):
+        """ Return the ordering requirements for a list of actions.
+
+            :param actions: the actions
+            :type actions: list of :class:`~.deviceaction.DeviceAction`
+            :returns: (required, requiring) pairs of node indices and the
+                      indices of the barrier nodes
+            :rtype: tuple of (list of tuple, list of int)
+
+            Action nodes are the actions' indices in the list. Barrier nodes
+            follow them and order the actions by type (see :meth:`sort`).
+        """
+        count = len(actions)
         edges = []
 
         # collect all ordering requirements for the actions
-        for action in self._actions:
-            action_idx = self._actions.index(action)
-            children = []
-            for _action in self._actions:
-                if _action == action:
+        for (action_idx, related) in self._relatedActions().items():
+            action = actions[action_idx]
+            for child_idx in sorted(related):
+                if child_idx == action_idx:
                     continue
 
                 # create edges based on both action type and dependencies.
-                if _action.requires(action):
-                    children.append(_action)
+                if actions[child_idx].requires(action):
+                    edges.append((action_idx, child_idx))
+
+        # order device and format actions by type using a barrier node
+        # following the actions of each type
+        tiers = {}
+        for (idx, action) in enumerate(actions):
+            if not action.isContainer:
+                tiers.setdefault(action.type, []).append(idx)
+
+        barriers = []
+        for action_type in sorted(tiers, reverse=True):
+            if barriers:
+                edges.extend((barriers[-1], idx) for idx in tiers[action_type])
+
+            barriers.append(count + len(barriers))
+            edges.extend((idx, barriers[-1]) for idx in tiers[action_type])
+
+        return (edges, barriers)
+
+    def sort(self):
+        """ Sort actions based on dependencies.
+
+            Device and format actions with a higher type always precede those
+            with a lower type (see :meth:`~.deviceaction.DeviceAction.requires`).
+            That ordering is expressed using one extra graph node per action
+            type instead of an edge for every such pair of actions, and
+            :meth:`~.deviceaction.DeviceAction.requires` is only consulted for
+            pairs of actions that can possibly be related. Actions keep their
+            original relative order wherever the requirements allow it.
+        """
+        if not self._actions:
+            return
 
-            for child in children:
-                child_idx = self._actions.index(child)
-                edges.append((action_idx, child_idx))
+        actions = list(self._actions)
+        count = len(actions)
+        (edges, barriers) = self._dependencyEdges(actions)
 
         # create a graph reflecting the ordering information we have
-        graph = tsort.create_graph(list(range(len(self._actions))), edges)
+        graph = tsort.create_graph(barriers + list(range(count)), edges)
 
         # perform a topological sort based on the graph's contents
-        order = tsort.tsort(graph)
+        order = tsort.tsort(graph, stable=True)
 
-        # now replace self._actions with a sorted version of the same list
-        actions = []
-        for idx in order:
-            actions.append(self._actions[idx])
-        self._actions = actions
+        # now replace the actions with a sorted version of the same list
+        self._setActions(actions[idx] for idx in order if idx < count)
 
     def _preProcess(self, devices=None):
         """ Prepare the action queue for execution. """
@@ -159,21 +330,22 @@ class ActionList(object):
         log.info("pruning action queue...")
         self.prune()
 
-        problematic = self._findActiveDevicesOnActionDisks(devices=devices)
-        if problematic:
-            if flags.installer_mode:
-                for device in devices:
-                    if device.protected:
-                        continue
-
-                    try:
-                        device.teardown(recursive=True)
-                    except StorageError as e:
-                        log.info("teardown of %s failed: %s", device.name, e)
-            else:
-                raise RuntimeError("partitions in use on disks with changes "
-                                   "pending: %s" %
-                                   ",".join(problematic))
+        with statusCache.snapshot():
+            problematic = self._findActiveDevicesOnActionDisks(devices=devices)
+            if problematic:
+                if flags.installer_mode:
+                    for device in devices:
+                        if device.protected:
+                            continue
+
+                        try:
+                            device.teardown(recursive=True)
+                        except StorageError as e:
+                            log.info("teardown of %s failed: %s", device.name, e)
+                else:
+                    raise RuntimeError("partitions in use on disks with changes "
+                                       "pending: %s" %
+                                       ",".join(problematic))
 
         log.info("resetting parted disks...")
         for device in devices:
@@ -209,7 +381,7 @@ class ActionList(object):
                 action = ActionCreateDevice(device)
                 # apply the action first in case the apply method fails
                 action.apply()
-                self._actions.append(action)
+                self.append(action)
 
         log.info("sorting actions...")
         self.sort()
@@ -261,40 +433,339 @@ class ActionList(object):
         devices = [a.name for a in active if any(d in disks for d in a.disks)]
         return devices
 
-    def process(self, callbacks=None, devices=None, dryRun=None):
+    def _teardownDiskUsers(self, disk, devices=None):
+        """ Tear down the devices using a disk so its disklabel can be
+            committed.
+        """
+        # it's likely that a previous action
+        # triggered setup of an lvm or md device.
+        # include deps no longer in the tree due to pending removal
+        devs = devices + [a.device for a in self._actions]
+        for dep in set(devs):
+            if dep.exists and dep.dependsOn(disk):
+                dep.teardown(recursive=True)
+
+    def _executeAction(self, action, callbacks=None, devices=None):
+        """ Execute an action, retrying once if the disklabel commit fails. """
+        try:
+            action.execute(callbacks)
+        except DiskLabelCommitError:
+            self._teardownDiskUsers(action.device.disk, devices=devices)
+            action.execute(callbacks)
+
+    @staticmethod
+    def _batchRuns(actions):
+        """ Find the partition actions that can share a disklabel commit.
+
+            :param actions: the sorted actions
+            :type actions: list of :class:`~.deviceaction.DeviceAction`
+            :returns: (first, last) indices of the run each batched action
+                      belongs to, keyed by the action's index
+            :rtype: dict
+
+            A run is a sequence of partition create actions, or of partition
+            destroy actions, on one disk. Destroying the formats of other
+            partitions on that disk does not interrupt a run of destroy
+            actions since it does not depend on the partition table. Creating
+            a format does, since the new partition has to be on disk first.
+
+            The format actions within a run are not batched. Reverting the
+            run does not bring the formats back, so they are done as soon as
+            they have been executed.
+        """
+        runs = {}
+        run = None
+        for (idx, action) in enumerate(actions):
+            if run is not None:
+                first = actions[run[0]]
+                sameDisk = (isinstance(action.device, PartitionDevice) and
+                            action.device.disk == first.device.disk)
+                if sameDisk and action.isDevice and action.type == first.type:
+                    run[1] = idx
+                    continue
+                elif sameDisk and first.isDestroy and action.isDestroy:
+                    continue
+
+                if run[1] > run[0]:
+                    runs.update((i, tuple(run))
+                                for i in range(run[0], run[1] + 1))
+
+                run = None
+
+            if action.isDevice and (action.isCreate or action.isDestroy) and \
+               isinstance(action.device, PartitionDevice):
+                run = [idx, idx]
+
+        if run is not None and run[1] > run[0]:
+            runs.update((i, tuple(run)) for i in range(run[0], run[1] + 1))
+
+        return runs
+
+    @staticmethod
+    def _diskLabels(disk):
+        """ Return the distinct disklabels of a disk. """
+        labels = []
+        for fmt in (disk.originalFormat, disk.format):
+            if fmt.type == "disklabel" and fmt not in labels:
+                labels.append(fmt)
+
+        return labels
+
+    def _endBatch(self, disk, devices=None):
+        """ Commit the changes batched on a disk's disklabels.
+
+            The commit is retried once like in :meth:`_executeAction`. The
+            work the partitions deferred until the commit is done afterwards.
+            If the retry fails too, the batches are left open for
+            :meth:`_abortBatch`.
+        """
+        deferred = []
+        for label in self._diskLabels(disk):
+            try:
+                deferred.extend(label.endBatch())
+            except DiskLabelCommitError:
+                self._teardownDiskUsers(disk, devices=devices)
+                deferred.extend(label.endBatch())
+
+        for func in deferred:
+            func()
+
+    def _abortBatch(self, disk):
+        """ Stop batching the commits of a disk's disklabels after a failure,
+            reverting the changes that were not committed.
+        """
+        for label in self._diskLabels(disk):
+            if not label.batching:
+                continue
+
+            try:
+                label.abortBatch()
+            except Exception as e: # pylint: disable=broad-except
+                log.error("failed to revert batched changes to %s: %s",
+                          disk.name, e)
+
+    def _runAction(self, idx, actions, runs, callbacks=None, devices=None):
+        """ Execute one of the sorted actions.
+
+            The disklabel commits of the actions in a run (see
+            :meth:`_batchRuns`) are batched into one commit after the last
+            action of the run. If any part of a run fails, the changes made
+            by the run's actions are reverted.
+
+            :attr:`~.callbacks.event_callbacks.action_executed` fires for the
+            partition actions of a run once the run has been committed, and
+            not at all if it is reverted.
+        """
+        action = actions[idx]
+        run = runs.get(idx)
+        if run and idx == run[0]:
+            for label in self._diskLabels(action.device.disk):
+                label.beginBatch()
+
+        try:
+            self._executeAction(action, callbacks=callbacks, devices=devices)
+            if run and idx == run[1]:
+                self._endBatch(action.device.disk, devices=devices)
+        except Exception: # pylint: disable=broad-except
+            exc_info = sys.exc_info()
+            if run:
+                self._abortBatch(action.device.disk)
+
+            six.reraise(*exc_info)
+
+        if not run or not action.isDevice:
+            event_callbacks.action_executed(action=action)
+        elif idx == run[1]:
+            for batched in actions[run[0]:idx + 1]:
+                if batched.isDevice:
+                    event_callbacks.action_executed(action=batched)
+
+    @staticmethod
+    def _updatePartitions(partitions):
+        for device in partitions:
+            # make sure we catch any renumbering parted does
+            if device.exists:
+                device.updateName()
+                device.format.device = device.path
+
+    @staticmethod
+    def _renumbers(action):
+        """ Whether an action can change the numbering of partitions. """
+        if action.isDevice:
+            return isinstance(action.device, PartitionDevice)
+
+        return action.isFormat and action.format.type == "disklabel"
+
+    def process(self, callbacks=None, devices=None, dryRun=None, workers=1):
         """
         Execute all registered actions.
 
         :param callbacks: callbacks to be invoked when actions are executed
         :param devices: a list of all devices current in the devicetree
         :type callbacks: :class:`~.callbacks.DoItCallbacks`
+        :keyword int workers: the number of actions to execute at a time
 
+        With more than one worker, independent actions run concurrently in
+        worker threads (see :meth:`_processParallel`), so the callbacks
+        have to be thread-safe.
         """
         devices = devices or []
         self._preProcess(devices=devices)
 
-        for action in self._actions[:]:
+        if workers > 1 and not dryRun:
+            self._processParallel(callbacks=callbacks, devices=devices,
+                                  workers=workers)
+            self._postProcess(devices=devices)
+            return
+
+        partitions = [d for d in devices if isinstance(d, PartitionDevice)]
+        actions = list(self._actions)
+        runs = self._batchRuns(actions) if not dryRun else {}
+        executed = []
+        for (idx, action) in enumerate(actions):
             log.info("executing action: %s", action)
             if not dryRun:
                 try:
-                    action.execute(callbacks)
-                except DiskLabelCommitError:
-                    # it's likely that a previous action
-                    # triggered setup of an lvm or md device.
-                    # include deps no longer in the tree due to pending removal
-                    devs = devices + [a.device for a in self._actions]
-                    for dep in set(devs):
-                        if dep.exists and dep.dependsOn(action.device.disk):
-                            dep.teardown(recursive=True)
-
-                    action.execute(callbacks)
-
-                for device in devices:
-                    # make sure we catch any renumbering parted does
-                    if device.exists and isinstance(device, PartitionDevice):
-                        device.updateName()
-                        device.format.device = device.path
-
-                self._completed_actions.append(self._actions.pop(0))
+                    self._runAction(idx, actions, runs, callbacks=callbacks,
+                                    devices=devices)
+                except Exception: # pylint: disable=broad-except
+                    exc_info = sys.exc_info()
+                    for done in executed:
+                        if not done.isDevice:
+                            self.remove(done)
+                            self._completed_actions.append(done)
+
+                    six.reraise(*exc_info)
+
+                if self._renumbers(action):
+                    disks = action.device.disks
+                    self._updatePartitions(d for d in partitions
+                                           if d.disk in disks)
+
+                # the actions of a run are only done once it is committed
+                executed.append(action)
+                if idx in runs and idx != runs[idx][1]:
+                    continue
+
+                for done in executed:
+                    self.remove(done)
+                    self._completed_actions.append(done)
+
+                executed = []
 
         self._postProcess(devices=devices)
+
+    def _processParallel(self, callbacks=None, devices=None, workers=2):
+        """ Execute the sorted actions using a pool of worker threads.
+
+            An action starts once all of the actions it requires (as used by
+            :meth:`sort`) have finished. Actions that involve the same disk
+            or that involve no disks at all still run one at a time and in
+            order, so changes to each disklabel stay serialized. Commits to
+            different disklabels can run at the same time, and runs of
+            partition actions on one disk share a commit like they do when
+            the actions are executed one at a time.
+
+            If an action fails, no further actions are started. The error is
+            re-raised once the running actions have finished. Finished
+            actions are recorded as completed in their sorted order either
+            way, except for the partition actions of runs that were reverted.
+        """
+        actions = list(self._actions)
+        count = len(actions)
+        (edges, barriers) = self._dependencyEdges(actions)
+        runs = self._batchRuns(actions)
+
+        last_by_disk = {}
+        for (idx, action) in enumerate(actions):
+            keys = [d.id for d in action.device.disks] or [None]
+            for key in keys:
+                if key in last_by_disk:
+                    edges.append((last_by_disk[key], idx))
+                last_by_disk[key] = idx
+
+        required = dict((idx, set()) for idx in list(range(count)) + barriers)
+        dependents = dict((idx, []) for idx in required)
+        for (parent, child) in edges:
+            if parent not in required[child]:
+                required[child].add(parent)
+                dependents[parent].append(child)
+
+        results = six.moves.queue.Queue()
+
+        def run(idx):
+            try:
+                self._runAction(idx, actions, runs, callbacks=callbacks,
+                                devices=devices)
+            except Exception: # pylint: disable=broad-except
+                results.put((idx, sys.exc_info()))
+            else:
+                results.put((idx, None))
+
+        ready = []
+        finished = []
+
+        def release(idx):
+            for child in dependents[idx]:
+                required[child].discard(idx)
+                if required[child]:
+                    continue
+
+                if child < count:
+                    heapq.heappush(ready, child)
+                else:
+                    release(child)
+
+        for (idx, reqs) in required.items():
+            if reqs:
+                continue
+
+            if idx < count:
+                heapq.heappush(ready, idx)
+            else:
+                release(idx)
+
+        running = 0
+        error = None
+        while running or (ready and error is None):
+            while ready and running < workers and error is None:
+                idx = heapq.heappop(ready)
+                log.info("executing action: %s", actions[idx])
+                thread = Thread(target=run, args=(idx,))
+                thread.daemon = True
+                thread.start()
+                running += 1
+
+            (idx, exc_info) = results.get()
+            running -= 1
+            if exc_info is not None:
+                log.error("action %s failed", actions[idx])
+                if error is None:
+                    error = exc_info
+                continue
+
+            action = actions[idx]
+            finished.append(idx)
+            if self._renumbers(action):
+                disks = action.device.disks
+                self._updatePartitions(d for d in devices
+                                       if isinstance(d, PartitionDevice) and
+                                       d.disk in disks)
+            release(idx)
+
+        if error is not None:
+            # runs on other disks may have been cut short by the failure
+            for run in set(runs.values()):
+                self._abortBatch(actions[run[0]].device.disk)
+
+        for idx in sorted(finished):
+            if idx in runs and actions[idx].isDevice and \
+               runs[idx][1] not in finished:
+                # the run was reverted
+                continue
+
+            self.remove(actions[idx])
+            self._completed_actions.append(actions[idx])
+
+        if error is not None:
+            six.reraise(*error)
@@ -42,6 +42,102 @@ log = logging.getLogger("blivet")
 # DMI information paths
 DMI_CHASSIS_VENDOR = "/sys/class/dmi/id/chassis_vendor"
 
+class HardwareInfo(object):
+    """ A description of the hardware we are running on.
+
+        Each part of the description is read from the system the first time
+        it is used and kept from then on. Any part can instead be given when
+        creating the instance, which together with :func:`setHardwareInfo`
+        lets tests describe whatever machine they need.
+    """
+
+    def __init__(self, machine=None, kernelRelease=None, cpuinfo=None,
+                 dmiChassisVendor=None, efi=None):
+        """
+            :keyword str machine: machine hardware name, as in ``uname -m``
+            :keyword str kernelRelease: kernel release, as in ``uname -r``
+            :keyword str cpuinfo: contents of /proc/cpuinfo
+            :keyword str dmiChassisVendor: DMI chassis vendor ("" for none)
+            :keyword bool efi: whether the system booted via EFI
+        """
+        self._machine = machine
+        self._kernelRelease = kernelRelease
+        self._cpuinfo = None
+        if cpuinfo is not None:
+            self._cpuinfo = cpuinfo.splitlines()
+        self._dmiChassisVendor = dmiChassisVendor
+        self._efi = efi
+
+    def _uname(self):
+        uname = os.uname()
+        if self._machine is None:
+            self._machine = uname[4]
+        if self._kernelRelease is None:
+            self._kernelRelease = uname[2]
+
+    @property
+    def machine(self):
+        if self._machine is None:
+            self._uname()
+        return self._machine
+
+    @property
+    def kernelRelease(self):
+        if self._kernelRelease is None:
+            self._uname()
+        return self._kernelRelease
+
+    @property
+    def cpuinfo(self):
+        """ The lines of /proc/cpuinfo. """
+        if self._cpuinfo is None:
+            try:
+                with open('/proc/cpuinfo', 'r') as f:
+                    self._cpuinfo = f.read().splitlines()
+            except IOError as e:
+                log.warning("failed to read /proc/cpuinfo: %s", e)
+                self._cpuinfo = []
+        return self._cpuinfo
+
+    @property
+    def dmiChassisVendor(self):
+        if self._dmiChassisVendor is None:
+            self._dmiChassisVendor = ""
+            if os.path.isfile(DMI_CHASSIS_VENDOR):
+                with open(DMI_CHASSIS_VENDOR) as f:
+                    self._dmiChassisVendor = f.read().strip()
+        return self._dmiChassisVendor
+
+    @property
+    def efi(self):
+        if self._efi is None:
+            # XXX need to make sure efivars is loaded...
+            self._efi = os.path.exists("/sys/firmware/efi")
+        return self._efi
+
+_hardwareInfo = None
+
+def getHardwareInfo():
+    """
+    :return: The description of the hardware we are running on.
+    :rtype: :class:`HardwareInfo`
+
+    """
+    global _hardwareInfo # pylint: disable=global-statement
+    if _hardwareInfo is None:
+        _hardwareInfo = HardwareInfo()
+    return _hardwareInfo
+
+def setHardwareInfo(info):
+    """ Replace the description of the hardware we are running on.
+
+        :param info: the new description, or None to read it from the
+                     system again
+        :type info: :class:`HardwareInfo` or NoneType
+    """
+    global _hardwareInfo # pylint: disable=global-statement
+    _hardwareInfo = info
+
 def getPPCMachine():
     """
     :return: The PPC machine type, or None if not PPC.
@@ -77,12 +173,11 @@ def getPPCMachine():
     machine = None
     platform = None
 
-    with open('/proc/cpuinfo', 'r') as f:
-        for line in f:
-            if 'machine' in line:
-                machine = line.split(':')[1]
-            elif 'platform' in line:
-                platform = line.split(':')[1]
+    for line in getHardwareInfo().cpuinfo:
+        if 'machine' in line:
+            machine = line.split(':')[1]
+        elif 'platform' in line:
+            platform = line.split(':')[1]
 
     for part in (machine, platform):
         if part is None:
@@ -107,11 +202,10 @@ def getPPCMacID():
     if getPPCMachine() != "PMac":
         return None
 
-    with open('/proc/cpuinfo', 'r') as f:
-        for line in f:
-            if 'machine' in line:
-                machine = line.split(':')[1]
-                return machine.strip()
+    for line in getHardwareInfo().cpuinfo:
+        if 'machine' in line:
+            machine = line.split(':')[1]
+            return machine.strip()
 
     log.warning("No Power Mac machine id")
     return None
@@ -132,11 +226,10 @@ def getPPCMacGen():
         return None
 
     gen = None
-    with open('/proc/cpuinfo', 'r') as f:
-        for line in f:
-            if 'pmac-generation' in line:
-                gen = line.split(':')[1]
-                break
+    for line in getHardwareInfo().cpuinfo:
+        if 'pmac-generation' in line:
+            gen = line.split(':')[1]
+            break
 
     if gen is None:
         log.warning("Unable to find pmac-generation")
@@ -161,10 +254,9 @@ def getPPCMacBook():
         return False
 
     #@TBD - Search for 'book' anywhere in cpuinfo? Shouldn't this be more restrictive?
-    with open('/proc/cpuinfo', 'r') as f:
-        for line in f:
-            if 'book' in line.lower():
-                return True
+    for line in getHardwareInfo().cpuinfo:
+        if 'book' in line.lower():
+            return True
 
     return False
 
@@ -174,7 +266,7 @@ def isAARCH64():
     :rtype: boolean
 
     """
-    return os.uname()[4] == 'aarch64'
+    return getHardwareInfo().machine == 'aarch64'
 
 def getARMMachine():
     """
@@ -188,7 +280,7 @@ def getARMMachine():
     if flags.arm_platform:
         return flags.arm_platform
 
-    armMachine = os.uname()[2].rpartition('.' )[2]
+    armMachine = getHardwareInfo().kernelRelease.rpartition('.' )[2]
 
     if armMachine.startswith('arm'):
         # @TBD - Huh? Don't you want the arm machine name here?
@@ -205,10 +297,9 @@ def isCell():
     if not isPPC():
         return False
 
-    with open('/proc/cpuinfo', 'r') as f:
-        for line in f:
-            if 'Cell' in line:
-                return True
+    for line in getHardwareInfo().cpuinfo:
+        if 'Cell' in line:
+            return True
 
     return False
 
@@ -219,13 +310,9 @@ def isMactel():
 
     """
     if not isX86():
-        mactel = False
-    elif not os.path.isfile(DMI_CHASSIS_VENDOR):
-        mactel = False
-    else:
-        buf = open(DMI_CHASSIS_VENDOR).read()
-        mactel = ("apple" in buf.lower())
-    return mactel
+        return False
+
+    return "apple" in getHardwareInfo().dmiChassisVendor.lower()
 
 def isEfi():
     """
@@ -233,11 +320,7 @@ def isEfi():
     :rtype: boolean
 
     """
-    # XXX need to make sure efivars is loaded...
-    if os.path.exists("/sys/firmware/efi"):
-        return True
-    else:
-        return False
+    return getHardwareInfo().efi
 
 # Architecture checking functions
 
@@ -248,7 +331,7 @@ def isX86(bits=None):
     :type bits: int
 
     """
-    arch = os.uname()[4]
+    arch = getHardwareInfo().machine
 
     # x86 platforms include:
     #     i*86
@@ -279,7 +362,7 @@ def isPPC(bits=None):
     :type bits: int
 
     """
-    arch = os.uname()[4]
+    arch = getHardwareInfo().machine
 
     if bits is None:
         if arch in ('ppc', 'ppc64', 'ppc64le'):
@@ -299,7 +382,7 @@ def isS390():
     :rtype: boolean
 
     """
-    return os.uname()[4].startswith('s390')
+    return getHardwareInfo().machine.startswith('s390')
 
 def isIA64():
     """
@@ -307,7 +390,7 @@ def isIA64():
     :rtype: boolean
 
     """
-    return os.uname()[4] == 'ia64'
+    return getHardwareInfo().machine == 'ia64'
 
 def isAlpha():
     """
@@ -315,7 +398,7 @@ def isAlpha():
     :rtype: boolean
 
     """
-    return os.uname()[4].startswith('alpha')
+    return getHardwareInfo().machine.startswith('alpha')
 
 def isARM():
     """
@@ -323,7 +406,7 @@ def isARM():
     :rtype: boolean
 
     """
-    return os.uname()[4].startswith('arm')
+    return getHardwareInfo().machine.startswith('arm')
 
 def getArch():
     """
@@ -339,7 +422,7 @@ def getArch():
         return 'ppc'
     elif isPPC(bits=64):
         # ppc64 and ppc64le are distinct architectures
-        return os.uname()[4]
+        return getHardwareInfo().machine
     elif isAARCH64():
         return 'aarch64'
     elif isAlpha():
@@ -347,7 +430,7 @@ def getArch():
     elif isARM():
         return 'arm'
     else:
-        return os.uname()[4]
+        return getHardwareInfo().machine
 
 def numBits():
     """ Return an integer representing the length
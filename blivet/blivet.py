@@ -52,6 +52,7 @@ from . import iscsi
 from . import fcoe
 from . import zfcp
 from . import devicefactory
+from . import udev
 from . import get_bootloader, getSysroot, shortProductName, __version__
 
 from .i18n import _
@@ -88,6 +89,10 @@ class StorageDiscoveryConfig(object):
         # disklabels depends on this flag.
         self.clearNonExistent = False
 
+        # Number of threads used to probe devices while populating the
+        # device tree. Devices are still added to the tree one at a time.
+        self.populateWorkers = 1
+
     def update(self, ksdata):
         """ Update configuration from ksdata source.
 
@@ -127,6 +132,7 @@ class Blivet(object):
         self.autoPartitionRequests = []
         self.eddDict = {}
         self.dasd = []
+        self.settleStats = udev.SettleStats()
 
         self.__luksDevs = {}
         self.size_sets = []
@@ -151,16 +157,28 @@ class Blivet(object):
         self.services = set()
         self._free_space_snapshot = None
 
-    def doIt(self, callbacks=None):
+    def doIt(self, callbacks=None, workers=1):
         """
         Commit queued changes to disk.
 
         :param callbacks: callbacks to be invoked when actions are executed
         :type callbacks: return value of the :func:`~.callbacks.create_new_callbacks_register`
+        :keyword int workers: the number of independent actions to execute
+                              at a time (see :meth:`.ActionList.process`)
 
+        The udev settles done while committing the changes are counted in
+        :attr:`settleStats` (see :class:`~.udev.SettleStats`).
         """
 
-        self.devicetree.processActions(callbacks=callbacks)
+        udev.settle_stats.reset()
+        try:
+            self._doIt(callbacks=callbacks, workers=workers)
+        finally:
+            self.settleStats = udev.settle_stats.copy()
+            log.info("doIt: %s", self.settleStats)
+
+    def _doIt(self, callbacks=None, workers=1):
+        self.devicetree.processActions(callbacks=callbacks, workers=workers)
         if not flags.installer_mode:
             return
 
@@ -297,6 +315,25 @@ class Blivet(object):
 
         self.updateBootLoaderDiskList()
 
+    def prefetchSizeInfo(self, devices=None, workers=1):
+        """ Gather the size info of existing filesystems before it is used.
+
+            :keyword devices: the devices whose filesystems to probe (default
+                              is all devices)
+            :type devices: list of :class:`~.devices.StorageDevice`
+            :keyword int workers: the number of filesystems to probe at a time
+
+            In installer mode the size info of an existing filesystem is only
+            gathered when its size, minimum size or resizability is first
+            used. Call this to gather it for many filesystems in parallel.
+            Inactive devices are set up for the probe and torn down again
+            afterwards.
+        """
+        if devices is None:
+            devices = self.devices
+
+        self.devicetree.prefetchSizeInfo(devices=devices, workers=workers)
+
     @property
     def unusedDevices(self):
         used_devices = []
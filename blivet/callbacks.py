@@ -25,6 +25,8 @@ arguments.
 """
 
 from collections import namedtuple
+from threading import Lock
+import weakref
 
 # A private namedtuple class with self-descriptive fields for passing callbacks
 # to the blivet.doIt method. Each field should be populated with a function
@@ -73,3 +75,76 @@ ResizeFormatPostData = namedtuple("ResizeFormatPostData",
                                   ["msg"])
 WaitForEntropyData = namedtuple("WaitForEntropyData",
                                 ["msg", "min_entropy"])
+
+class CallbackList(object):
+    """ A list of functions to call when some event occurs.
+
+        Bound methods are held via a weak reference to their instance so that
+        registering a handler does not keep the instance alive. Handlers whose
+        instance has been garbage-collected are dropped the next time the
+        event fires.
+
+        Events can fire from several threads at once, e.g. while actions are
+        executed in parallel, so the list is only changed with a lock held.
+    """
+    def __init__(self):
+        self._cb_list = []
+        self._lock = Lock()
+
+    @staticmethod
+    def _ref(cb):
+        if getattr(cb, "__self__", None) is not None:
+            return (weakref.ref(cb.__self__), cb.__func__)
+
+        return (None, cb)
+
+    def add(self, cb):
+        """ Add a handler for this event. """
+        ref = self._ref(cb)
+        with self._lock:
+            if ref not in self._cb_list:
+                self._cb_list.append(ref)
+
+    def remove(self, cb):
+        """ Remove a previously added handler. """
+        with self._lock:
+            self._cb_list.remove(self._ref(cb))
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            cb_list = self._cb_list[:]
+
+        for ref in cb_list:
+            (obj_ref, func) = ref
+            if obj_ref is None:
+                func(*args, **kwargs)
+                continue
+
+            obj = obj_ref()
+            if obj is None:
+                with self._lock:
+                    # another thread may have dropped it already
+                    if ref in self._cb_list:
+                        self._cb_list.remove(ref)
+                continue
+
+            func(obj, *args, **kwargs)
+
+class _EventCallbacks(object):
+    """ Internal notifications about changes to devices and formats. """
+    def __init__(self):
+        self.attribute_changed = CallbackList()
+        """ Called with device or fmt and attr keyword arguments when an
+            identifying attribute (name, uuid, sysfsPath, format, label)
+            changes.
+        """
+        self.action_executed = CallbackList()
+        """ Called with an action keyword argument after an action has been
+            executed.
+        """
+        self.size_info_needed = CallbackList()
+        """ Called with a fmt keyword argument when the size info of a
+            filesystem, which has been put off, is first needed.
+        """
+
+event_callbacks = _EventCallbacks()
@@ -305,9 +305,7 @@ class DeviceFactory(object):
         self.min_luks_entropy = min_luks_entropy
 
         # used for error recovery
-        self.__devices = []
-        self.__actions = []
-        self.__names = []
+        self.__checkpoint = None
         self.__roots = []
 
     @property
@@ -818,17 +816,24 @@ class DeviceFactory(object):
     # methods for error recovery
     #
     def _save_devicetree(self):
-        _blivet_copy = self.storage.copy()
-        self.__devices = _blivet_copy.devicetree._devices
-        self.__actions = _blivet_copy.devicetree._actions
-        self.__names = _blivet_copy.devicetree.names
-        self.__roots = _blivet_copy.roots
+        container = self.get_container(device=self.raw_device,
+                                       name=self.container_name)
+        devices = [d for d in self.disks + [self.device, container] if d]
+        self.__checkpoint = self.storage.devicetree.checkpoint(devices=devices)
+        # the devices are restored in place, so the roots only need their
+        # lists of mounts and swaps saved
+        self.__roots = [(root, root.mounts.copy(), root.swaps[:])
+                        for root in self.storage.roots]
 
     def _revert_devicetree(self):
-        self.storage.devicetree._devices = self.__devices
-        self.storage.devicetree._actions = self.__actions
-        self.storage.devicetree.names = self.__names
-        self.storage.roots = self.__roots
+        self.storage.devicetree.rollback(self.__checkpoint)
+        self.__checkpoint = None
+        for (root, mounts, swaps) in self.__roots:
+            root.mounts = mounts
+            root.swaps = swaps
+
+        self.storage.roots = [root for (root, _mounts, _swaps) in self.__roots]
+        self.__roots = []
 
 class PartitionFactory(DeviceFactory):
     """ Factory class for creating a partition. """
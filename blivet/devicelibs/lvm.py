@@ -109,3 +109,135 @@ def lvm_cc_removeFilterRejectRegexp(regexp):
 def lvm_cc_resetFilter():
     config_args_data["filterRejects"] = []
     config_args_data["filterAccepts"] = []
+
+class LVMInfoCache(object):
+    """ Cached information about the system's LVM physical and logical volumes.
+
+        Information about all PVs and all LVs is gathered with one query
+        each, the first time it is needed, and the LVs are indexed by VG.
+        When a single VG changes only its LVs are dropped, and they are
+        queried again, for that VG alone, the next time LV information is
+        needed.
+    """
+    def __init__(self):
+        self._pvs = None
+        self._lvs = None
+        self._vg_lvs = None
+        self._stale_vgs = set()
+        self._origins = {}
+        self._pool_names = {}
+
+    @property
+    def pvs(self):
+        """ PV information, keyed by PV path. """
+        if self._pvs is None:
+            self._pvs = dict((pv.pv_name, pv) for pv in blockdev.lvm.pvs())
+
+        return self._pvs
+
+    def _addLV(self, lv):
+        name = "%s-%s" % (lv.vg_name, lv.lv_name)
+        self._lvs[name] = lv
+        self._vg_lvs.setdefault(lv.vg_name, {})[name] = lv
+
+    def _loadLVs(self):
+        if self._lvs is None:
+            self._lvs = {}
+            self._vg_lvs = {}
+            self._stale_vgs = set()
+            for lv in blockdev.lvm.lvs():
+                self._addLV(lv)
+
+        while self._stale_vgs:
+            vg_name = self._stale_vgs.pop()
+            try:
+                lvs = blockdev.lvm.lvs(vg_name)
+            except blockdev.LVMError as e:
+                # the VG may have been removed since it was dropped
+                log.debug("failed to get LVs of VG %s: %s", vg_name, e)
+                lvs = []
+
+            for lv in lvs:
+                self._addLV(lv)
+
+    @property
+    def lvs(self):
+        """ LV information, keyed by full LV name ("vgname-lvname"). """
+        self._loadLVs()
+        return self._lvs
+
+    def getVGLVs(self, vg_name):
+        """ Return information about the LVs of one VG.
+
+            :param str vg_name: the name of the VG
+            :returns: LV information keyed by full LV name
+            :rtype: dict
+        """
+        self._loadLVs()
+        return self._vg_lvs.get(vg_name, {})
+
+    def getOrigin(self, lv):
+        """ Return the name of the origin of a snapshot LV.
+
+            :param lv: information about the snapshot LV
+            :returns: the origin's LV name (without the VG name)
+            :rtype: str or NoneType
+        """
+        # older versions of libblockdev do not report origins with the LVs
+        if hasattr(lv, "origin"):
+            return lv.origin
+
+        key = (lv.vg_name, lv.lv_name)
+        if key not in self._origins:
+            self._origins[key] = blockdev.lvm.lvorigin(lv.vg_name, lv.lv_name)
+
+        return self._origins[key]
+
+    def getPoolName(self, lv):
+        """ Return the name of the pool of a thin LV.
+
+            :param lv: information about the thin LV
+            :returns: the pool's LV name (without the VG name)
+            :rtype: str
+        """
+        if hasattr(lv, "pool_lv"):
+            return lv.pool_lv
+
+        key = (lv.vg_name, lv.lv_name)
+        if key not in self._pool_names:
+            self._pool_names[key] = blockdev.lvm.thlvpoolname(lv.vg_name,
+                                                              lv.lv_name)
+
+        return self._pool_names[key]
+
+    def dropPVs(self):
+        """ Drop cached PV information. """
+        self._pvs = None
+
+    def drop(self, vg_name=None):
+        """ Drop cached information.
+
+            :keyword str vg_name: only drop the information about this VG
+
+            PV information is always dropped since it includes VG sizes.
+        """
+        self.dropPVs()
+        if vg_name is None:
+            self._lvs = None
+            self._vg_lvs = None
+            self._origins = {}
+            self._pool_names = {}
+            return
+
+        for key in [k for k in self._origins if k[0] == vg_name]:
+            del self._origins[key]
+        for key in [k for k in self._pool_names if k[0] == vg_name]:
+            del self._pool_names[key]
+
+        if self._lvs is None:
+            return
+
+        for name in self._vg_lvs.pop(vg_name, {}):
+            del self._lvs[name]
+
+        self._stale_vgs.add(vg_name)
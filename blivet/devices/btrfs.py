@@ -507,6 +507,13 @@ class BTRFSSubVolumeDevice(BTRFSDevice, RaidDevice):
 
         self.format.mountopts = opts
 
+    @property
+    def dependents(self):
+        dependents = super(BTRFSSubVolumeDevice, self).dependents
+        dependents.extend(s for s in self.volume.subvolumes
+                            if getattr(s, "source", None) == self)
+        return dependents
+
     @property
     def volume(self):
         """Return the first ancestor that is not a BTRFSSubVolumeDevice.
@@ -660,6 +667,6 @@ class BTRFSSnapShotDevice(BTRFSSubVolumeDevice):
         finally:
             self.volume._undo_temp_mount()
 
-    def dependsOn(self, dep):
+    def _dependsOnSibling(self, dep):
         return (dep == self.source or
-                super(BTRFSSnapShotDevice, self).dependsOn(dep))
+                super(BTRFSSnapShotDevice, self)._dependsOnSibling(dep))
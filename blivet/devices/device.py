@@ -23,6 +23,7 @@
 import pprint
 
 from .. import util
+from ..callbacks import event_callbacks
 from ..storage_log import log_method_call
 
 import logging
@@ -34,9 +35,10 @@ class Device(util.ObjectID):
     """ A generic device.
 
         Device instances know which devices they depend upon (parents
-        attribute). They do not know which devices depend upon them, but
-        they do know whether or not they have any dependent devices
-        (isleaf attribute).
+        attribute) and which device instances list them as a parent
+        (children attribute). Since the latter includes devices that are not
+        currently in any device tree, whether or not they have any dependent
+        devices is tracked separately (isleaf attribute).
 
         A Device's setup method should set up all parent devices as well
         as the device itself. It should not run the resident format's
@@ -76,6 +78,8 @@ class Device(util.ObjectID):
         """
         util.ObjectID.__init__(self)
         self.kids = 0
+        self._children = set()
+        self._ancestors = None
 
         # Copy only the validity check from _setName so we don't try to check a
         # bunch of inappropriate state properties during __init__ in subclasses
@@ -134,12 +138,43 @@ class Device(util.ObjectID):
         """
         parent.removeChild()
 
+    def _parentAdded(self, parent):
+        """ Called after adding a parent to this device.
+
+            See :attr:`~.ParentList.postappendfunc`.
+        """
+        parent._children.add(self)
+        self._dropAncestors()
+
+    def _parentRemoved(self, parent):
+        """ Called after removing a parent from this device.
+
+            See :attr:`~.ParentList.postremovefunc`.
+        """
+        parent._children.discard(self)
+        self._dropAncestors()
+
+    def _dropAncestors(self):
+        """ Invalidate the cached ancestors of this device and its children. """
+        devices = [self]
+        while devices:
+            device = devices.pop()
+            if device._ancestors is None and device is not self:
+                # a device's ancestors are cached only if all of its parents'
+                # ancestors are, so there is nothing cached below this one
+                continue
+
+            device._ancestors = None
+            devices.extend(device._children)
+
     def _initParentList(self):
         """ Initialize this instance's parent list. """
         if not hasattr(self, "_parents"):
             # pylint: disable=attribute-defined-outside-init
             self._parents = ParentList(appendfunc=self._addParent,
-                                       removefunc=self._removeParent)
+                                       removefunc=self._removeParent,
+                                       postappendfunc=self._parentAdded,
+                                       postremovefunc=self._parentRemoved)
 
         # iterate over a copy of the parent list because we are altering it in
         # the for-cycle
@@ -158,6 +193,25 @@ class Device(util.ObjectID):
     parents = property(_getParentList, _setParentList,
                        doc="devices upon which this device is built")
 
+    @property
+    def children(self):
+        """ Devices that have this device as a parent.
+
+            This includes devices that are not in the device tree, eg:
+            devices that have been removed from it.
+        """
+        return list(self._children)
+
+    @property
+    def dependents(self):
+        """ Devices that depend directly on this device.
+
+            In addition to :attr:`children` this includes devices that
+            depend on this device without being built on it, eg: snapshots
+            of an lvm logical volume.
+        """
+        return self.children
+
     @property
     def dict(self):
         d =  {"type": self.type, "name": self.name,
@@ -222,13 +276,25 @@ class Device(util.ObjectID):
             :rtype: bool
         """
         # XXX does a device depend on itself?
-        if dep in self.parents:
+        ancestors = self._getAncestors()
+        if dep in ancestors and dep is not self:
             return True
 
-        for parent in self.parents:
-            if parent.dependsOn(dep):
-                return True
+        return any(a._dependsOnSibling(dep) for a in ancestors)
+
+    def _dependsOnSibling(self, dep):
+        """ Return True if this device depends on dep without being built on it.
+
+            :param dep: the other device
+            :type dep: :class:`Device`
+            :rtype: bool
 
+            This is for dependencies not reflected in the parent lists, like
+            lvm snapshots' dependency on their origin volume. Subclasses with
+            such dependencies should override this method and also list the
+            affected devices in :attr:`dependents`.
+        """
+        # pylint: disable=unused-argument
         return False
 
     def dracutSetupArgs(self):
@@ -247,8 +313,13 @@ class Device(util.ObjectID):
             raise ValueError("%s is not a valid name for this device" % value)
         self._name = value
 
+    def _changeName(self, value):
+        """ Set this device's name and announce the change. """
+        self._setName(value)
+        event_callbacks.attribute_changed(device=self, attr="name")
+
     name = property(lambda s: s._getName(),
-                    lambda s, v: s._setName(v),
+                    lambda s, v: s._changeName(v),
                     doc="This device's name")
 
     @property
@@ -266,13 +337,21 @@ class Device(util.ObjectID):
         """ Device type. """
         return self._type
 
+    def _getAncestors(self):
+        """ Return the cached set of ancestors, including this device. """
+        if self._ancestors is None:
+            ancestors = set([self])
+            for parent in self.parents:
+                ancestors.update(parent._getAncestors())
+
+            self._ancestors = ancestors
+
+        return self._ancestors
+
     @property
     def ancestors(self):
         """ A list of all of this device's ancestors, including itself. """
-        l = set([self])
-        for p in [d for d in self.parents if d not in l]:
-            l.update(set(p.ancestors))
-        return list(l)
+        return list(self._getAncestors())
 
     @property
     def packages(self):
@@ -28,6 +28,7 @@ from .. import util
 from ..flags import flags
 from ..storage_log import log_method_call
 from .. import udev
+from ..devicestatus import statusCache
 from ..size import Size
 
 from ..fcoe import fcoe
@@ -196,12 +197,14 @@ class DMRaidArrayDevice(DMDevice, ContainerDevice):
         log_method_call(self, self.name, status=self.status)
         # This call already checks if the set is not active.
         blockdev.dm.deactivate_raid_set(self.name)
+        statusCache.invalidate()
 
     def activate(self):
         """ Activate the raid set. """
         log_method_call(self, self.name, status=self.status)
         # This call already checks if the set is active.
         blockdev.dm.activate_raid_set(self.name)
+        statusCache.invalidate()
         udev.settle()
 
     def _setup(self, orig=False):
@@ -27,6 +27,7 @@ from .. import errors
 from .. import util
 from ..storage_log import log_method_call
 from .. import udev
+from ..devicestatus import statusCache
 
 import logging
 log = logging.getLogger("blivet")
@@ -96,6 +97,10 @@ class DMDevice(StorageDevice):
 
     @property
     def status(self):
+        snapshot = statusCache.current()
+        if snapshot is not None:
+            return self.mapName in snapshot.dmActive
+
         try:
             return blockdev.dm.map_exists(self.mapName, True, True)
         except blockdev.DMError as e:
@@ -107,7 +107,8 @@ class ParentList(object):
             x in ml
             x = ml[i]   # not ml[i] = x
     """
-    def __init__(self, items=None, appendfunc=None, removefunc=None):
+    def __init__(self, items=None, appendfunc=None, removefunc=None,
+                 postappendfunc=None, postremovefunc=None):
         """
             :keyword items: initial contents
             :type items: any iterable
@@ -115,6 +116,10 @@ class ParentList(object):
             :type appendfunc: callable
             :keyword removefunc: a function to call before removing an item
             :type removefunc: callable
+            :keyword postappendfunc: a function to call after adding an item
+            :type postappendfunc: callable
+            :keyword postremovefunc: a function to call after removing an item
+            :type postremovefunc: callable
 
             appendfunc and removefunc should take the item to be added or
             removed and perform any checks or other processing. The appropriate
@@ -124,6 +129,10 @@ class ParentList(object):
             to the function. While this is not optimal for general-purpose use,
             it is ideal for the intended use as part of :class:`~.Device`. The
             functions themselves should not modify the :class:`~.ParentList`.
+
+            postappendfunc and postremovefunc are for bookkeeping that has to
+            reflect the actual contents of the list. Unlike appendfunc and
+            removefunc, they are also called by :meth:`replace`.
         """
         self.items = list()
         if items:
@@ -135,6 +144,12 @@ class ParentList(object):
         self.removefunc = removefunc or (lambda i: True)
         """ a function to call before removing an item """
 
+        self.postappendfunc = postappendfunc or (lambda i: True)
+        """ a function to call after adding an item """
+
+        self.postremovefunc = postremovefunc or (lambda i: True)
+        """ a function to call after removing an item """
+
     def __iter__(self):
         return iter(self.items)
 
@@ -154,6 +169,7 @@ class ParentList(object):
 
         self.appendfunc(y)
         self.items.append(y)
+        self.postappendfunc(y)
 
     def remove(self, y):
         """ Remove an item from the list after running a callback. """
@@ -162,6 +178,7 @@ class ParentList(object):
 
         self.removefunc(y)
         self.items.remove(y)
+        self.postremovefunc(y)
 
     def replace(self, x, y):
         """ Replace the first instance of x with y, bypassing callbacks.
@@ -177,3 +194,5 @@ class ParentList(object):
 
         idx = self.items.index(x)
         self.items[idx] = y
+        self.postremovefunc(x)
+        self.postappendfunc(y)
@@ -705,6 +705,12 @@ class LVMLogicalVolumeDevice(DMDevice):
         return (super(LVMLogicalVolumeDevice, self).isleaf and
                 not non_thin_snapshots)
 
+    @property
+    def dependents(self):
+        dependents = super(LVMLogicalVolumeDevice, self).dependents
+        dependents.extend(self.snapshots)
+        return dependents
+
     @property
     def direct(self):
         """ Is this device directly accessible? """
@@ -961,10 +967,10 @@ class LVMSnapShotDevice(LVMSnapShotBase, LVMLogicalVolumeDevice):
     def _getPartedDevicePath(self):
         return "%s-cow" % self.path
 
-    def dependsOn(self, dep):
+    def _dependsOnSibling(self, dep):
         # pylint: disable=bad-super-call
         return (self.origin == dep or
-                super(LVMSnapShotBase, self).dependsOn(dep))
+                super(LVMSnapShotBase, self)._dependsOnSibling(dep))
 
 class LVMThinPoolDevice(LVMLogicalVolumeDevice):
     """ An LVM Thin Pool """
@@ -1229,7 +1235,7 @@ class LVMThinSnapShotDevice(LVMSnapShotBase, LVMThinLogicalVolumeDevice):
         blockdev.lvm.thsnapshotcreate(self.vg.name, self._name, self.origin.lvname,
                                       pool_name=pool_name)
 
-    def dependsOn(self, dep):
+    def _dependsOnSibling(self, dep):
         # once a thin snapshot exists it no longer depends on its origin
         return ((self.origin == dep and not self.exists) or
-                super(LVMThinSnapShotDevice, self).dependsOn(dep))
+                super(LVMThinSnapShotDevice, self)._dependsOnSibling(dep))
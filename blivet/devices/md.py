@@ -31,6 +31,7 @@ from .. import util
 from ..flags import flags
 from ..storage_log import log_method_call
 from .. import udev
+from ..devicestatus import statusCache
 from ..size import Size
 
 import logging
@@ -360,6 +361,10 @@ class MDRaidArrayDevice(ContainerDevice, RaidDevice):
                 self.sysfsPath = ""
                 return status
 
+        snapshot = statusCache.current()
+        if snapshot is not None and self.sysfsPath:
+            return os.path.basename(self.sysfsPath) in snapshot.mdActive
+
         state_file = "%s/md/array_state" % self.sysfsPath
         try:
             state = open(state_file).read().strip()
@@ -450,6 +455,7 @@ class MDRaidArrayDevice(ContainerDevice, RaidDevice):
         # states.
         if self.exists and os.path.exists(self.path):
             blockdev.md.deactivate(self.path)
+            statusCache.invalidate()
 
         self._postTeardown(recursive=recursive)
 
@@ -36,7 +36,6 @@ from ..size import Size, MiB
 import logging
 log = logging.getLogger("blivet")
 
-from .device import Device
 from .storage import StorageDevice
 from .dm import DMDevice
 from .lib import devicePathToName, deviceNameToDiskByPath
@@ -268,6 +267,7 @@ class PartitionDevice(StorageDevice):
             disk.setPartitionGeometry(partition=self.partedPartition,
                                       constraint=constraint,
                                       start=geometry.start, end=geometry.end)
+            self.disk.format.invalidateFreeSpace()
 
     @property
     def path(self):
@@ -380,13 +380,20 @@ class PartitionDevice(StorageDevice):
         else:
             self.name = devicePathToName(self.partedPartition.path)
 
-    def dependsOn(self, dep):
-        """ Return True if this device depends on dep. """
-        if isinstance(dep, PartitionDevice) and dep.isExtended and \
-           self.isLogical and self.disk == dep.disk:
-            return True
+    def _dependsOnSibling(self, dep):
+        # logical partitions depend on the extended partition
+        return (isinstance(dep, PartitionDevice) and dep.isExtended and
+                self.isLogical and self.disk == dep.disk)
 
-        return Device.dependsOn(self, dep)
+    @property
+    def dependents(self):
+        dependents = super(PartitionDevice, self).dependents
+        if self.isExtended and self.disk:
+            dependents.extend(p for p in self.disk.children
+                                if isinstance(p, PartitionDevice) and
+                                   p._dependsOnSibling(self))
+
+        return dependents
 
     @property
     def isleaf(self):
@@ -569,14 +576,19 @@ class PartitionDevice(StorageDevice):
                                       self.partedPartition.type)
 
         self._wipe()
-        try:
-            self.disk.format.commit()
-        except errors.DiskLabelCommitError:
-            part = self.disk.format.partedDisk.getPartitionByPath(self.path)
-            self.disk.format.removePartition(part)
-            raise
+        self.disk.format.commit(undo=self._undoCreate)
+
+    def _undoCreate(self):
+        """ Remove the partition from the disklabel after a failed commit. """
+        part = self.disk.format.partedDisk.getPartitionByPath(self.path)
+        self.disk.format.removePartition(part)
 
     def _postCreate(self):
+        # the commit may be batched with those of other partitions on the disk
+        self.disk.format.afterCommit(self._postCommit)
+
+    def _postCommit(self):
+        """ Finish creating the partition once the disklabel is committed. """
         if self.isExtended:
             partition = self.disk.format.extendedPartition
         else:
@@ -645,6 +657,7 @@ class PartitionDevice(StorageDevice):
                                         constraint=constraint,
                                         start=geometry.start,
                                         end=geometry.end)
+        self.disk.format.invalidateFreeSpace()
 
         self.disk.format.commit()
         self.updateSize()
@@ -661,36 +674,51 @@ class PartitionDevice(StorageDevice):
         log_method_call(self, self.name, status=self.status)
         # we should have already set self.partedPartition to point to the
         # partition on the original disklabel
-        self.disk.originalFormat.removePartition(self.partedPartition)
-        try:
-            self.disk.originalFormat.commit()
-        except errors.DiskLabelCommitError:
-            self.disk.originalFormat.addPartition(
-                                        self.partedPartition.geometry.start,
-                                        self.partedPartition.geometry.end,
-                                        self.partedPartition.type)
-            self.partedPartition = self.disk.originalFormat.partedDisk.getPartitionByPath(self.path)
-            raise
-
-        if self.disk.format.exists and \
-           self.disk.format.type == "disklabel" and \
-           self.disk.format.partedDisk != self.disk.originalFormat.partedDisk:
+        geometry = self.partedPartition.geometry
+        ptype = self.partedPartition.type
+        orig = self.disk.originalFormat
+        orig.removePartition(self.partedPartition)
+        orig.commit(undo=lambda: self._undoDestroy(orig, geometry, ptype))
+
+        label = self.disk.format
+        if label.exists and \
+           label.type == "disklabel" and \
+           label.partedDisk != orig.partedDisk:
             # If the new/current disklabel is the same as the original one, we
             # have to duplicate the removal on the other copy of the DiskLabel.
-            part = self.disk.format.partedDisk.getPartitionByPath(self.path)
-            self.disk.format.removePartition(part)
-            self.disk.format.commit()
+            part = label.partedDisk.getPartitionByPath(self.path)
+            label.removePartition(part)
+            label.commit(undo=lambda: self._undoDestroy(label, geometry, ptype))
+
+    def _undoDestroy(self, label, geometry, ptype):
+        """ Put the partition back on a disklabel after a failed commit.
+
+            :param label: the disklabel the partition was removed from
+            :type label: :class:`~.formats.disklabel.DiskLabel`
+            :param geometry: the partition's geometry
+            :type geometry: :class:`parted.Geometry`
+            :param int ptype: the partition's type
+        """
+        label.addPartition(geometry.start, geometry.end, ptype)
+        if label is self.disk.originalFormat:
+            self.partedPartition = label.partedDisk.getPartitionByPath(self.path)
+            # the removal may have been batched and taken for granted
+            self.exists = True
 
     def _postDestroy(self):
         super(PartitionDevice, self)._postDestroy()
         if isinstance(self.disk, DMDevice):
-            udev.settle()
-            # self.exists has been unset, so don't use self.status
-            if os.path.exists(self.path):
-                try:
-                    blockdev.dm.remove(self.name)
-                except blockdev.DMError:
-                    pass
+            self.disk.originalFormat.afterCommit(self._removeDMPartition)
+
+    def _removeDMPartition(self):
+        """ Remove the map left behind for a partition on a dm disk. """
+        udev.settle()
+        # self.exists has been unset, so don't use self.status
+        if os.path.exists(self.path):
+            try:
+                blockdev.dm.remove(self.name)
+            except blockdev.DMError:
+                pass
 
     def _getSize(self):
         """ Get the device's size. """
@@ -26,6 +26,8 @@ import pyudev
 
 from .. import errors
 from .. import util
+from ..callbacks import event_callbacks
+from ..devicestatus import statusCache
 from ..flags import flags
 from ..storage_log import log_method_call
 from .. import udev
@@ -254,6 +256,28 @@ class StorageDevice(Device):
         """ Device node representing this device. """
         return "%s/%s" % (self._devDir, self.name)
 
+    def _getUUID(self):
+        return self._uuid
+
+    def _setUUID(self, uuid):
+        self._uuid = uuid
+        event_callbacks.attribute_changed(device=self, attr="uuid")
+
+    uuid = property(lambda d: d._getUUID(),
+                    lambda d, u: d._setUUID(u),
+                    doc="universally unique identifier (device -- not fs)")
+
+    def _getSysfsPath(self):
+        return self._sysfsPath
+
+    def _setSysfsPath(self, path):
+        self._sysfsPath = path
+        event_callbacks.attribute_changed(device=self, attr="sysfsPath")
+
+    sysfsPath = property(lambda d: d._getSysfsPath(),
+                         lambda d, p: d._setSysfsPath(p),
+                         doc="sysfs device path")
+
     def updateSysfsPath(self):
         """ Update this device's sysfs path. """
         # We're using os.path.exists as a stand-in for status. We can't use
@@ -373,7 +397,11 @@ class StorageDevice(Device):
         if not self._preSetup(orig=orig):
             return
 
-        self._setup(orig=orig)
+        try:
+            self._setup(orig=orig)
+        finally:
+            statusCache.invalidate()
+
         self._postSetup()
 
     def _postSetup(self):
@@ -416,7 +444,11 @@ class StorageDevice(Device):
         if not self._preTeardown(recursive=recursive):
             return
 
-        self._teardown(recursive=recursive)
+        try:
+            self._teardown(recursive=recursive)
+        finally:
+            statusCache.invalidate()
+
         self._postTeardown(recursive=recursive)
 
     def _postTeardown(self, recursive=None):
@@ -442,7 +474,11 @@ class StorageDevice(Device):
         """ Create the device. """
         log_method_call(self, self.name, status=self.status)
         self._preCreate()
-        self._create()
+        try:
+            self._create()
+        finally:
+            statusCache.invalidate()
+
         self._postCreate()
 
     def _postCreate(self):
@@ -478,7 +514,11 @@ class StorageDevice(Device):
         """ Destroy the device. """
         log_method_call(self, self.name, status=self.status)
         self._preDestroy()
-        self._destroy()
+        try:
+            self._destroy()
+        finally:
+            statusCache.invalidate()
+
         self._postDestroy()
 
     def _postDestroy(self):
@@ -624,8 +664,13 @@ class StorageDevice(Device):
     def _getFormat(self):
         return self._format
 
+    def _changeFormat(self, fmt):
+        """ Set the device's format and announce the change. """
+        self._setFormat(fmt)
+        event_callbacks.attribute_changed(device=self, attr="format")
+
     format = property(lambda d: d._getFormat(),
-                      lambda d,f: d._setFormat(f),
+                      lambda d,f: d._changeFormat(f),
                       doc="The device's formatting.")
 
     def preCommitFixup(self):
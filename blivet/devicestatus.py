@@ -0,0 +1,212 @@
+# devicestatus.py
+# Batched snapshot of active device state.
+#
+# Copyright (C) 2015  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+""" Batched snapshot of active device state.
+
+    Checking the status of a device or format normally queries the system
+    for that one device: a device-mapper ioctl, a read of the md array's
+    state file in sysfs, a swap status check and so on. Passes over the
+    whole device tree (eg: :meth:`~.devicetree.DeviceTree.teardownAll`)
+    check the status of every device, often more than once.
+
+    Within a :meth:`StatusCache.snapshot` block the status properties answer
+    from a :class:`StatusSnapshot` instead, which reads the device-mapper
+    maps, /proc/mdstat, /proc/swaps and /proc/self/mountinfo once. Setting
+    up, tearing down, creating or destroying a device or format drops the
+    snapshot so that it is read again the next time a status is checked.
+    Changes made outside of blivet while a snapshot block is active are not
+    noticed until then.
+"""
+
+from contextlib import contextmanager
+import os
+from threading import Lock
+
+from .mounts import MountsCache
+
+import logging
+log = logging.getLogger("blivet")
+
+def _lvmVGName(mapName):
+    """ Return the VG name from an LVM LV's device-mapper map name.
+
+        LVM joins the VG and LV names with a "-" after doubling any "-" in
+        them.
+    """
+    name = ""
+    i = 0
+    while i < len(mapName):
+        if mapName[i] == "-":
+            if mapName[i+1:i+2] != "-":
+                return name
+
+            i += 1
+
+        name += mapName[i]
+        i += 1
+
+    return None
+
+class StatusSnapshot(object):
+    """ The state of active device-mapper maps, md arrays, swaps and mounts
+        at one point in time.
+    """
+
+    def __init__(self, sysfs="/sys/block", proc="/proc"):
+        """
+            :keyword str sysfs: the block device directory in sysfs
+            :keyword str proc: the path of procfs
+        """
+        self.dmNames = set()    # names of all device-mapper maps
+        self.dmActive = set()   # maps with a live table that aren't suspended
+        self.vgNames = set()    # VGs with at least one active LV
+        self.mdActive = set()   # kernel names of active md arrays
+        self.swaps = set()      # real paths of active swap devices
+        self.mountpoints = {}
+
+        self._readDMMaps(sysfs)
+        self.mdActive = self._parseMDStat(self._readLines(proc, "mdstat"))
+        self.swaps = self._parseSwaps(self._readLines(proc, "swaps"))
+        lines = self._readLines(proc, "self/mountinfo")
+        # pylint: disable=protected-access
+        self.mountpoints = MountsCache._parseMountInfo(lines)
+
+    @staticmethod
+    def _readLines(proc, name):
+        path = os.path.join(proc, name)
+        try:
+            with open(path) as f:
+                return f.readlines()
+        except IOError as e:
+            log.debug("failed to read %s: %s", path, e)
+            return []
+
+    @staticmethod
+    def _readAttr(path):
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except IOError:
+            return None
+
+    def _readDMMaps(self, sysfs):
+        try:
+            entries = os.listdir(sysfs)
+        except OSError as e:
+            log.debug("failed to list %s: %s", sysfs, e)
+            return
+
+        for entry in entries:
+            if not entry.startswith("dm-"):
+                continue
+
+            path = os.path.join(sysfs, entry)
+            name = self._readAttr(os.path.join(path, "dm/name"))
+            if not name:
+                continue
+
+            self.dmNames.add(name)
+
+            # a map without a live table has no size
+            if self._readAttr(os.path.join(path, "dm/suspended")) != "0" or \
+               self._readAttr(os.path.join(path, "size")) in (None, "0"):
+                continue
+
+            self.dmActive.add(name)
+            uuid = self._readAttr(os.path.join(path, "dm/uuid")) or ""
+            if uuid.startswith("LVM-"):
+                vgName = _lvmVGName(name)
+                if vgName:
+                    self.vgNames.add(vgName)
+
+    @staticmethod
+    def _parseMDStat(lines):
+        """ Return the names of the active arrays listed in /proc/mdstat. """
+        active = set()
+        for line in lines:
+            fields = line.split()
+            if len(fields) > 2 and fields[1] == ":" and fields[2] == "active":
+                active.add(fields[0])
+
+        return active
+
+    @staticmethod
+    def _parseSwaps(lines):
+        """ Return the real paths of the active swaps listed in /proc/swaps. """
+        swaps = set()
+        for line in lines[1:]:
+            fields = line.split()
+            if fields:
+                swaps.add(os.path.realpath(fields[0]))
+
+        return swaps
+
+    def getMountpoints(self, devspec, subvolspec=None):
+        """ Return the mountpoints of a device like
+            :meth:`~.mounts.MountsCache.getMountpoints` does.
+        """
+        return self.mountpoints.get((devspec, subvolspec), [])
+
+class StatusCache(object):
+    """ Holds the status snapshot while a :meth:`snapshot` block is active. """
+
+    def __init__(self):
+        self._depth = 0
+        self._snapshot = None
+        self._lock = Lock()
+
+    @contextmanager
+    def snapshot(self):
+        """ Answer status queries from a snapshot within the block.
+
+            Blocks can be nested; the snapshot is discarded when the
+            outermost one exits.
+        """
+        with self._lock:
+            self._depth += 1
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._depth -= 1
+                if not self._depth:
+                    self._snapshot = None
+
+    def current(self):
+        """ Return the current snapshot, reading it if necessary.
+
+            :returns: the snapshot, or None if no snapshot block is active
+            :rtype: :class:`StatusSnapshot` or NoneType
+        """
+        with self._lock:
+            if not self._depth:
+                return None
+
+            if self._snapshot is None:
+                self._snapshot = StatusSnapshot()
+
+            return self._snapshot
+
+    def invalidate(self):
+        """ Discard the snapshot after a change to the state of a device. """
+        self._snapshot = None
+
+statusCache = StatusCache()
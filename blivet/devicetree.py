@@ -20,19 +20,26 @@
 # Red Hat Author(s): Dave Lehman <dlehman@redhat.com>
 #
 
+import copy
 import os
 import re
+from threading import RLock
 
 from gi.repository import BlockDev as blockdev
 
 from .actionlist import ActionList
+from .callbacks import event_callbacks
 from .errors import DeviceError, DeviceTreeError, StorageError
 from .deviceaction import ActionDestroyDevice, ActionDestroyFormat
-from .devices import BTRFSDevice, DASDDevice, NoDevice, PartitionDevice
+from .devices import BTRFSDevice, DASDDevice, FileDevice, NoDevice, PartitionDevice
 from .devices import LVMLogicalVolumeDevice, LVMVolumeGroupDevice
+from .devices.lib import ParentList
 from . import formats
 from .devicelibs import lvm
 from .devicelibs import edd
+from .devicestatus import statusCache
+from .formats.fs import prefetchSizeInfo
+from .formats.fsprobecache import fsProbeCache
 from . import udev
 from . import util
 from .flags import flags
@@ -44,6 +51,64 @@ log = logging.getLogger("blivet")
 
 _LVM_DEVICE_CLASSES = (LVMLogicalVolumeDevice, LVMVolumeGroupDevice)
 
+# actions executed in parallel fire events from their worker threads
+_event_lock = RLock()
+
+def _copyState(obj):
+    """ Return a copy of an object's attributes for :func:`_restoreState`.
+
+        Lists, sets, dicts and :class:`~.devices.lib.ParentList` instances are
+        copied so that changes to their contents can be undone. All other
+        values, including the devices they contain, are shared.
+    """
+    state = {}
+    for (attr, value) in obj.__dict__.items():
+        if isinstance(value, ParentList):
+            value = copy.copy(value)
+            value.items = value.items[:]
+        elif isinstance(value, (list, set, dict)):
+            value = copy.copy(value)
+
+        state[attr] = value
+
+    return state
+
+def _restoreState(obj, state):
+    obj.__dict__.clear()
+    obj.__dict__.update(state)
+
+class DeviceTreeCheckpoint(object):
+    """ The saved state of a :class:`DeviceTree`.
+
+        See :meth:`DeviceTree.checkpoint` and :meth:`DeviceTree.rollback`.
+    """
+    def __init__(self, tree, devices):
+        """
+            :param tree: the device tree
+            :type tree: :class:`DeviceTree`
+            :param devices: the devices whose state to save
+            :type devices: iterable of :class:`~.devices.StorageDevice`
+        """
+        # pylint: disable=protected-access
+        self.devices = tree._devices[:]
+        self.hidden = tree._hidden[:]
+        self.names = tree.names[:]
+        self.order = tree._order.copy()
+        self.nextOrder = tree._nextOrder
+
+        self.actions = list(tree.actions)
+        self.actionStates = dict((a, _copyState(a)) for a in self.actions)
+
+        self.deviceStates = {}
+        self.formatStates = {}
+        for device in devices:
+            self.deviceStates[device] = _copyState(device)
+            for value in list(device.__dict__.values()):
+                if isinstance(value, formats.DeviceFormat) and \
+                   value not in self.formatStates:
+                    # disklabels duplicate their parted disks when copied
+                    self.formatStates[value] = copy.deepcopy(value).__dict__
+
 class DeviceTree(object):
     """ A quasi-tree that represents the devices in the system.
 
@@ -93,6 +158,11 @@ class DeviceTree(object):
 
         self._hidden = []
 
+        self._resetIndexes()
+        event_callbacks.attribute_changed.add(self._attributeChanged)
+        event_callbacks.action_executed.add(self._actionExecuted)
+        event_callbacks.size_info_needed.add(self._sizeInfoNeeded)
+
         # initialize attributes that may later hold cached lvm info
         self.dropLVMCache()
 
@@ -105,10 +175,292 @@ class DeviceTree(object):
                                     iscsi=iscsi,
                                     dasd=dasd)
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # copies need to be notified of changes to their own devices
+        event_callbacks.attribute_changed.add(self._attributeChanged)
+        event_callbacks.action_executed.add(self._actionExecuted)
+        event_callbacks.size_info_needed.add(self._sizeInfoNeeded)
+
     @property
     def actions(self):
         return self._actions
 
+    #
+    # lookup indexes
+    #
+    def _resetIndexes(self):
+        """ Rebuild the lookup indexes from the device and hidden lists. """
+        self._indexes = dict((attr, {}) for attr in ("id", "name", "path",
+                                                     "sysfsPath", "uuid",
+                                                     "label"))
+        self._indexKeys = {}    # device -> (list of (attr, key), format)
+        self._formatOwners = {} # format -> device
+        self._order = {}        # device -> (hidden, sequence number)
+        self._nextOrder = 0
+
+        # paths of file devices depend on their parent's mountpoint, which we
+        # do not get notified about, so these always get checked directly
+        self._unindexedPaths = set()
+
+        for device in self._devices:
+            self._indexDevice(device)
+
+        for device in self._hidden:
+            self._indexDevice(device, hidden=True)
+
+    def _indexDevice(self, device, hidden=False):
+        """ Add a device to the lookup indexes.
+
+            :param device: the device
+            :type device: :class:`~.devices.StorageDevice`
+            :keyword bool hidden: whether the device is on the hidden list
+
+            The device is ordered after all devices previously added to the
+            same (hidden or visible) list.
+        """
+        self._order[device] = (hidden, self._nextOrder)
+        self._nextOrder += 1
+        self._updateIndexKeys(device)
+
+    def _unindexDevice(self, device):
+        """ Remove a device from the lookup indexes. """
+        self._dropIndexKeys(device)
+        del self._order[device]
+        self._unindexedPaths.discard(device)
+
+    def _dropIndexKeys(self, device):
+        (keys, fmt) = self._indexKeys.pop(device, ([], None))
+        for (attr, key) in keys:
+            bucket = self._indexes[attr][key]
+            bucket.remove(device)
+            if not bucket:
+                del self._indexes[attr][key]
+
+        if self._formatOwners.get(fmt) is device:
+            del self._formatOwners[fmt]
+
+    def _updateIndexKeys(self, device):
+        """ (Re)compute the index keys of a device already in the tree. """
+        self._dropIndexKeys(device)
+
+        fmt = getattr(device, "format", None)
+        keys = [("id", device.id), ("name", device.name)]
+        if isinstance(device, FileDevice):
+            self._unindexedPaths.add(device)
+        else:
+            keys.append(("path", device.path))
+
+        if getattr(device, "sysfsPath", None):
+            keys.append(("sysfsPath", device.sysfsPath))
+
+        if getattr(device, "uuid", None):
+            keys.append(("uuid", device.uuid))
+
+        if getattr(fmt, "uuid", None) and fmt.uuid != getattr(device, "uuid", None):
+            keys.append(("uuid", fmt.uuid))
+
+        if getattr(fmt, "label", None):
+            keys.append(("label", fmt.label))
+
+        for (attr, key) in keys:
+            self._indexes[attr].setdefault(key, []).append(device)
+
+        if fmt is not None:
+            self._formatOwners[fmt] = device
+
+        self._indexKeys[device] = (keys, fmt)
+
+    def _attributeChanged(self, device=None, fmt=None, attr=None):
+        """ Update the lookup indexes after a device or format changed.
+
+            This is registered with
+            :attr:`~.callbacks.event_callbacks.attribute_changed`.
+        """
+        with _event_lock:
+            if device is None:
+                device = self._formatOwners.get(fmt)
+                if device is None or device.format is not fmt:
+                    return
+
+            if device not in self._order:
+                return
+
+            self._updateIndexKeys(device)
+            if attr in ("name", "sysfsPath"):
+                # lv names and btrfs paths are derived from their parents'
+                for child in self._getIndexedDescendants(device):
+                    self._updateIndexKeys(child)
+
+    def _getIndexedDescendants(self, device):
+        return [d for d in self._getDependents(device) if d in self._order]
+
+    def _getDependents(self, dep):
+        """ Return the set of device instances that depend on dep.
+
+            The result is not limited to devices in the tree.
+        """
+        dependents = set()
+        devices = dep.dependents
+        while devices:
+            device = devices.pop()
+            if device in dependents:
+                continue
+
+            dependents.add(device)
+            devices.extend(device.dependents)
+
+        # only return devices that actually depend on dep to keep the results
+        # consistent with dependsOn for all device types
+        return set(d for d in dependents if d.dependsOn(dep))
+
+    def _sorted(self, devices):
+        """ Return devices sorted as in :meth:`_filterDevices`. """
+        return sorted(devices, key=self._order.get)
+
+    def _lookup(self, attr, keys, match, incomplete=False, hidden=False,
+                last=False, candidates=None):
+        """ Return the first device in the indexes matching the criteria.
+
+            :param str attr: the index to search
+            :param keys: the keys to look up in the index
+            :type keys: list
+            :param match: a function returning True if a device matches
+            :type match: callable
+            :keyword bool incomplete: include incomplete devices
+            :keyword bool hidden: include hidden devices
+            :keyword bool last: return the last match instead of the first
+            :keyword candidates: additional, unindexed devices to consider
+            :returns: the matching device or None
+
+            Matches are ordered the same way :meth:`_filterDevices` orders
+            the devices it returns.
+        """
+        found = []
+        devices = [d for key in keys for d in self._indexes[attr].get(key, [])]
+        for device in devices + list(candidates or []):
+            if self._order[device][0] and not hidden:
+                continue
+
+            if not incomplete and not getattr(device, "complete", True):
+                continue
+
+            if match(device):
+                found.append(device)
+
+        if not found:
+            return None
+
+        if last:
+            return max(found, key=self._order.get)
+
+        return min(found, key=self._order.get)
+
+    def _inTree(self, device):
+        """ Return True if the device is in the (non-hidden) device list. """
+        order = self._order.get(device)
+        return order is not None and not order[0]
+
+    #
+    # checkpoints
+    #
+    def checkpoint(self, devices=None):
+        """ Save the current state of the tree for a later :meth:`rollback`.
+
+            :keyword devices: devices the caller is about to modify
+            :type devices: list of :class:`~.devices.StorageDevice`
+            :returns: the saved state
+            :rtype: :class:`DeviceTreeCheckpoint`
+
+            Rather than copying every device, the state of the specified
+            devices is saved along with that of all devices that do not exist
+            yet and all devices with scheduled actions -- and everything
+            these depend on or are depended on by. The lists of devices,
+            hidden devices, names and actions are copied as they are.
+        """
+        pending = list(devices or [])
+        pending.extend(d for d in self._devices + self._hidden if not d.exists)
+        pending.extend(a.device for a in self._actions)
+        pending.extend(disk for d in pending[:]
+                            for disk in getattr(d, "req_disks", []))
+        if any(isinstance(d, PartitionDevice) and not d.exists and
+               not d.req_disks for d in pending):
+            # such partitions can be allocated on any disk
+            pending.extend(d for d in self._devices + self._hidden
+                           if d.partitionable)
+
+        related = set()
+        while pending:
+            device = pending.pop()
+            if device not in related:
+                related.add(device)
+                pending.extend(device.dependents)
+
+        scope = set()
+        for device in related:
+            scope.update(device.ancestors)
+
+        return DeviceTreeCheckpoint(self, scope)
+
+    def rollback(self, checkpoint):
+        """ Restore the state saved by :meth:`checkpoint`.
+
+            :param checkpoint: the saved state
+            :type checkpoint: :class:`DeviceTreeCheckpoint`
+
+            Devices are restored in place, so references to them remain
+            valid. Devices added since the checkpoint are dropped.
+        """
+        live = set(self._devices + self._hidden)
+        saved = set(checkpoint.devices + checkpoint.hidden)
+        restored = checkpoint.deviceStates
+
+        for (action, state) in checkpoint.actionStates.items():
+            _restoreState(action, state)
+
+        self._actions._setActions(checkpoint.actions)
+
+        # detach the devices from their current parents' child sets before
+        # their parent lists get restored
+        for device in list(restored) + list(live - saved):
+            for parent in device.parents:
+                parent._children.discard(device)
+
+        for (fmt, state) in checkpoint.formatStates.items():
+            _restoreState(fmt, state)
+
+        for (device, state) in restored.items():
+            _restoreState(device, state)
+
+        for device in restored:
+            for parent in device.parents:
+                parent._children.add(device)
+
+        for device in restored:
+            device._dropAncestors()
+
+        self._devices = checkpoint.devices[:]
+        self._hidden = checkpoint.hidden[:]
+        self.names = checkpoint.names[:]
+
+        # the restored disklabels have their own copies of the parted disks
+        for disk in (d for d in restored if d.partitioned):
+            for partition in disk.children:
+                if isinstance(partition, PartitionDevice) and \
+                   partition in saved and partition._partedPartition:
+                    pdisk = disk.format.partedDisk
+                    partition.partedPartition = pdisk.getPartitionByPath(partition.path)
+
+        for device in live - saved:
+            self._dropIndexKeys(device)
+            self._unindexedPaths.discard(device)
+
+        self._order = checkpoint.order.copy()
+        self._nextOrder = checkpoint.nextOrder
+        for device in saved:
+            if device in restored or device not in live:
+                self._updateIndexKeys(device)
+
     def setDiskImages(self, images):
         """ Set the disk images and reflect them in exclusiveDisks.
 
@@ -148,25 +500,69 @@ class DeviceTree(object):
         return self._populator.diskImages
 
     @property
-    def pvInfo(self):
-        if self._pvs_cache is None:
-            pvs = blockdev.lvm.pvs()
-            self._pvs_cache = dict((pv.pv_name, pv) for pv in pvs) # pylint: disable=attribute-defined-outside-init
+    def lvmInfo(self):
+        """ Cached information about LVM PVs and LVs.
 
-        return self._pvs_cache
+            :rtype: :class:`~.devicelibs.lvm.LVMInfoCache`
+        """
+        return self._lvm_info
+
+    @property
+    def pvInfo(self):
+        return self._lvm_info.pvs
 
     @property
     def lvInfo(self):
-        if self._lvs_cache is None:
-            lvs = blockdev.lvm.lvs()
-            self._lvs_cache = dict(("%s-%s" % (lv.vg_name, lv.lv_name), lv) for lv in lvs) # pylint: disable=attribute-defined-outside-init
+        return self._lvm_info.lvs
+
+    def dropLVMCache(self, vg_name=None):
+        """ Drop cached lvm information.
+
+            :keyword str vg_name: only drop the information about this VG
+        """
+        with _event_lock:
+            if vg_name is None:
+                self._lvm_info = lvm.LVMInfoCache() # pylint: disable=attribute-defined-outside-init
+            else:
+                self._lvm_info.drop(vg_name)
+
+    def _actionExecuted(self, action=None):
+        """ Drop the cached lvm information an executed action made stale.
+
+            This is registered with
+            :attr:`~.callbacks.event_callbacks.action_executed`.
+        """
+        device = action.device
+        with _event_lock:
+            if action.isContainer and \
+               isinstance(action.container, LVMVolumeGroupDevice):
+                # adding or removing a PV changes the VG's PVs and size
+                self._lvm_info.drop(action.container.name)
+            elif isinstance(device, LVMVolumeGroupDevice):
+                self._lvm_info.drop(device.name)
+            elif isinstance(device, LVMLogicalVolumeDevice):
+                self._lvm_info.drop(device.vg.name)
+            elif action.isFormat and action.format.type == "lvmpv":
+                if action.format.vgName:
+                    self._lvm_info.drop(action.format.vgName)
+                else:
+                    self._lvm_info.dropPVs()
+
+    def _sizeInfoNeeded(self, fmt=None):
+        """ Probe a filesystem on one of the devices, setting it up first if
+            necessary.
 
-        return self._lvs_cache
+            This is registered with
+            :attr:`~.callbacks.event_callbacks.size_info_needed`.
+        """
+        with _event_lock:
+            device = self._formatOwners.get(fmt)
+
+        if device is None or device.format is not fmt or \
+           device not in self._order:
+            return
 
-    def dropLVMCache(self):
-        """ Drop cached lvm information. """
-        self._pvs_cache = None # pylint: disable=attribute-defined-outside-init
-        self._lvs_cache = None # pylint: disable=attribute-defined-outside-init
+        self.prefetchSizeInfo(devices=[device])
 
     def _addDevice(self, newdev, new=True):
         """ Add a device to the tree.
@@ -177,17 +573,19 @@ class DeviceTree(object):
             Raise ValueError if the device's identifier is already
             in the list.
         """
-        if newdev.uuid and newdev.uuid in [d.uuid for d in self._devices] and \
-           not isinstance(newdev, NoDevice):
+        if newdev.uuid and not isinstance(newdev, NoDevice) and \
+           self._lookup("uuid", [newdev.uuid], lambda d: d.uuid == newdev.uuid,
+                        incomplete=True):
             raise ValueError("device is already in tree")
 
         # make sure this device's parent devices are in the tree already
         for parent in newdev.parents:
-            if parent not in self._devices:
+            if not self._inTree(parent):
                 raise DeviceTreeError("parent device not in tree")
 
         newdev.addHook(new=new)
         self._devices.append(newdev)
+        self._indexDevice(newdev)
 
         # don't include "req%d" partition names
         if ((newdev.type != "partition" or
@@ -213,7 +611,7 @@ class DeviceTree(object):
 
                 Only leaves may be removed.
         """
-        if dev not in self._devices:
+        if not self._inTree(dev):
             raise ValueError("Device '%s' not in tree" % dev.name)
 
         if not dev.isleaf and not force:
@@ -233,6 +631,7 @@ class DeviceTree(object):
                         device.updateName()
 
         self._devices.remove(dev)
+        self._unindexDevice(dev)
         if dev.name in self.names and getattr(dev, "complete", True):
             self.names.remove(dev.name)
         log.info("removed %s %s (id %d) from device tree", dev.type,
@@ -300,10 +699,10 @@ class DeviceTree(object):
             get here.
         """
         if not (action.isCreate and action.isDevice) and \
-           action.device not in self._devices:
+           not self._inTree(action.device):
             raise DeviceTreeError("device is not in the tree")
         elif (action.isCreate and action.isDevice):
-            if action.device in self._devices:
+            if self._inTree(action.device):
                 raise DeviceTreeError("device is already in the tree")
 
         if action.isCreate and action.isDevice:
@@ -370,10 +769,11 @@ class DeviceTree(object):
                                   path=path,
                                   devid=devid)
 
-    def processActions(self, callbacks=None, dryRun=False):
+    def processActions(self, callbacks=None, dryRun=False, workers=1):
         self.actions.process(devices=self.devices,
                              dryRun=dryRun,
-                             callbacks=callbacks)
+                             callbacks=callbacks,
+                             workers=workers)
 
     def getDependentDevices(self, dep, hidden=False):
         """ Return a list of devices that depend on dep.
@@ -387,22 +787,16 @@ class DeviceTree(object):
         dependents = []
         log_method_call(self, dep=dep, hidden=hidden)
 
-        # don't bother looping looking for dependents if this is a leaf device
+        # don't bother looking for dependents if this is a leaf device
         # XXX all hidden devices are leaves
         if dep.isleaf and not hidden:
             log.debug("dep is a leaf")
             return dependents
 
-        devices = self._devices[:]
-        if hidden:
-            devices.extend(self._hidden)
-
-        for device in devices:
-            log.debug("checking if %s depends on %s", device.name, dep.name)
-            if device.dependsOn(dep):
-                dependents.append(device)
-
-        return dependents
+        dependents = [d for d in self._getDependents(dep)
+                        if d in self._order and
+                           (hidden or self._inTree(d))]
+        return self._sorted(dependents)
 
     def getRelatedDisks(self, disk):
         """ Return disks related to disk by container membership.
@@ -463,8 +857,9 @@ class DeviceTree(object):
             # Cancel all actions on this disk and any disk related by way of an
             # aggregate/container device (eg: lvm volume group).
             disks = [device]
-            related_actions = [a for a in self._actions
-                                    if a.device.dependsOn(device)]
+            dependents = self._getDependents(device)
+            related_actions = [a for dep in dependents
+                                    for a in self._actions.find(device=dep)]
             for related_device in (a.device for a in related_actions):
                 disks.extend(related_device.disks)
 
@@ -485,6 +880,7 @@ class DeviceTree(object):
         self._removeDevice(device, force=True, modparent=False)
 
         self._hidden.append(device)
+        self._indexDevice(device, hidden=True)
         lvm.lvm_cc_addFilterRejectRegexp(device.name)
 
         if isinstance(device, DASDDevice):
@@ -515,7 +911,9 @@ class DeviceTree(object):
                                                           hidden.name,
                                                           hidden.id)
                 self._hidden.remove(hidden)
+                self._unindexDevice(hidden)
                 self._devices.append(hidden)
+                self._indexDevice(hidden)
                 hidden.addHook(new=False)
                 lvm.lvm_cc_removeFilterRejectRegexp(hidden.name)
                 if isinstance(device, DASDDevice):
@@ -552,10 +950,64 @@ class DeviceTree(object):
             raise
         finally:
             self._hideIgnoredDisks()
+            # write out the results of the probes run while scanning at once
+            fsProbeCache.flush()
 
         if flags.installer_mode:
             self.teardownAll()
 
+    def prefetchSizeInfo(self, devices=None, workers=1):
+        """ Gather the size info of existing filesystems before it is used.
+
+            :keyword devices: the devices whose filesystems to probe (default
+                              is all devices)
+            :type devices: list of :class:`~.devices.StorageDevice`
+            :keyword int workers: the number of filesystems to probe at a time
+
+            Inactive devices are set up for the probe and torn down again
+            afterwards.
+        """
+        if devices is None:
+            devices = self.devices
+
+        pending = [d for d in devices
+                   if getattr(d.format, "sizeInfoPending", False)]
+        probed = []
+        activated = []
+        for device in pending:
+            if not device.status:
+                try:
+                    device.setup()
+                except (StorageError, blockdev.BlockDevError) as e:
+                    log.info("setup of %s failed: %s", device.name, e)
+                    continue
+
+                activated.append(device)
+
+            probed.append(device)
+
+        try:
+            prefetchSizeInfo([d.format for d in probed], workers=workers)
+        finally:
+            for device in activated:
+                try:
+                    device.teardown(recursive=True)
+                except (StorageError, blockdev.BlockDevError) as e:
+                    log.info("teardown of %s failed: %s", device.name, e)
+
+    def handleUdevEvents(self, events):
+        """ Update the tree to reflect changes reported by udev.
+
+            :param events: (action, info) pairs in the order they occurred
+            :type events: iterable of (str, :class:`pyudev.Device`)
+
+            This is a much cheaper way to stay current than repopulating
+            the whole tree. The events can come from a monitor as returned
+            by :func:`.udev.get_monitor`.
+        """
+        self._populator.handleUdevEvents(events)
+        self._hideIgnoredDisks()
+
     def _isIgnoredDisk(self, disk):
         return ((self.ignoredDisks and disk.name in self.ignoredDisks) or
                 (self.exclusiveDisks and
@@ -578,14 +1030,15 @@ class DeviceTree(object):
 
     def teardownAll(self):
         """ Run teardown methods on all devices. """
-        for device in self.leaves:
-            if device.protected:
-                continue
+        with statusCache.snapshot():
+            for device in self.leaves:
+                if device.protected:
+                    continue
 
-            try:
-                device.teardown(recursive=True)
-            except (StorageError, blockdev.BlockDevError) as e:
-                log.info("teardown of %s failed: %s", device.name, e)
+                try:
+                    device.teardown(recursive=True)
+                except (StorageError, blockdev.BlockDevError) as e:
+                    log.info("teardown of %s failed: %s", device.name, e)
 
     def teardownDiskImages(self):
         """ Tear down any disk image stacks. """
@@ -593,11 +1046,12 @@ class DeviceTree(object):
 
     def setupAll(self):
         """ Run setup methods on all devices. """
-        for device in self.leaves:
-            try:
-                device.setup()
-            except DeviceError as e:
-                log.error("setup of %s failed: %s", device.name, e)
+        with statusCache.snapshot():
+            for device in self.leaves:
+                try:
+                    device.setup()
+                except DeviceError as e:
+                    log.error("setup of %s failed: %s", device.name, e)
 
     def _filterDevices(self, incomplete=False, hidden=False):
         """ Return list of devices modified according to parameters.
@@ -629,8 +1083,9 @@ class DeviceTree(object):
         log_method_call(self, path=path, incomplete=incomplete, hidden=hidden)
         result = None
         if path:
-            devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if d.sysfsPath == path), None)
+            result = self._lookup("sysfsPath", [path],
+                                  lambda d: d.sysfsPath == path,
+                                  incomplete=incomplete, hidden=hidden)
         log_method_return(self, result)
         return result
 
@@ -646,8 +1101,9 @@ class DeviceTree(object):
         log_method_call(self, uuid=uuid, incomplete=incomplete, hidden=hidden)
         result = None
         if uuid:
-            devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if d.uuid == uuid or d.format.uuid == uuid), None)
+            result = self._lookup("uuid", [uuid],
+                                  lambda d: d.uuid == uuid or d.format.uuid == uuid,
+                                  incomplete=incomplete, hidden=hidden)
         log_method_return(self, result)
         return result
 
@@ -684,8 +1140,9 @@ class DeviceTree(object):
         log_method_call(self, label=label, incomplete=incomplete, hidden=hidden)
         result = None
         if label:
-            devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if getattr(d.format, "label", None) == label), None)
+            result = self._lookup("label", [label],
+                                  lambda d: getattr(d.format, "label", None) == label,
+                                  incomplete=incomplete, hidden=hidden)
         log_method_return(self, result)
         return result
 
@@ -701,10 +1158,10 @@ class DeviceTree(object):
         log_method_call(self, name=name, incomplete=incomplete, hidden=hidden)
         result = None
         if name:
-            devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if d.name == name or \
-               (isinstance(d, _LVM_DEVICE_CLASSES) and d.name == name.replace("--","-"))),
-               None)
+            result = self._lookup("name", set([name, name.replace("--", "-")]),
+                                  lambda d: d.name == name or \
+                                  (isinstance(d, _LVM_DEVICE_CLASSES) and d.name == name.replace("--","-")),
+                                  incomplete=incomplete, hidden=hidden)
         log_method_return(self, result)
         return result
 
@@ -723,14 +1180,14 @@ class DeviceTree(object):
         log_method_call(self, path=path, incomplete=incomplete, hidden=hidden)
         result = None
         if path:
-            devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
-
             # The usual order of the devices list is one where leaves are at
             # the end. So that the search can prefer leaves to interior nodes
-            # the list that is searched is the reverse of the devices list.
-            result = next((d for d in reversed(list(devices)) if d.path == path or \
-               (isinstance(d, _LVM_DEVICE_CLASSES) and d.path == path.replace("--","-"))),
-               None)
+            # the last match in the devices list is the one we return.
+            result = self._lookup("path", set([path, path.replace("--", "-")]),
+                                  lambda d: d.path == path or \
+                                  (isinstance(d, _LVM_DEVICE_CLASSES) and d.path == path.replace("--","-")),
+                                  incomplete=incomplete, hidden=hidden,
+                                  last=True, candidates=self._unindexedPaths)
 
         log_method_return(self, result)
         return result
@@ -775,8 +1232,8 @@ class DeviceTree(object):
             :rtype: :class:`~.devices.Device`
         """
         log_method_call(self, id_num=id_num, incomplete=incomplete, hidden=hidden)
-        devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
-        result = next((d for d in devices if d.id == id_num), None)
+        result = self._lookup("id", [id_num], lambda d: d.id == id_num,
+                              incomplete=incomplete, hidden=hidden)
         log_method_return(self, result)
         return result
 
@@ -784,14 +1241,17 @@ class DeviceTree(object):
     def devices(self):
         """ List of devices currently in the tree """
         devices = []
+        uuids = set()
         for device in self._devices:
             if not getattr(device, "complete", True):
                 continue
 
-            if device.uuid and device.uuid in [d.uuid for d in devices] and \
+            if device.uuid and device.uuid in uuids and \
                not isinstance(device, NoDevice):
                 raise DeviceTreeError("duplicate uuids in device tree")
 
+            uuids.add(device.uuid)
+
             devices.append(device)
 
         return devices
@@ -853,7 +1313,7 @@ class DeviceTree(object):
 
     def getChildren(self, device):
         """ Return a list of a device's children. """
-        return [c for c in self._devices if device in c.parents]
+        return self._sorted(c for c in device.children if self._inTree(c))
 
     def resolveDevice(self, devspec, blkidTab=None, cryptTab=None, options=None):
         """ Return the device matching the provided device specification.
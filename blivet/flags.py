@@ -64,6 +64,10 @@ class Flags(object):
         # meaningful when flags.installer_mode is False)
         self.include_nodev = False
 
+        # path of a file in which to keep filesystem size probe results
+        # across resets (None disables the cache)
+        self.fs_probe_cache = None
+
         self.boot_cmdline = {}
 
         self.update_from_boot_cmdline()
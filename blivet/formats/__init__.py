@@ -29,6 +29,8 @@ from ..util import notify_kernel
 from ..util import get_sysfs_path_by_name
 from ..util import run_program
 from ..util import ObjectID
+from ..callbacks import event_callbacks
+from ..devicestatus import statusCache
 from ..storage_log import log_method_call
 from ..errors import DeviceFormatError, FormatCreateError, FormatDestroyError, FormatSetupError
 from ..i18n import N_
@@ -182,6 +184,7 @@ class DeviceFormat(ObjectID):
         self._label = None
         self._options = None
         self._device = None
+        self._uuid = None
 
         self.device = kwargs.get("device")
         self.uuid = kwargs.get("uuid")
@@ -269,6 +272,7 @@ class DeviceFormat(ObjectID):
            This method is not intended to be overridden.
         """
         self._label = label
+        event_callbacks.attribute_changed(fmt=self, attr="label")
 
     def _getLabel(self):
         """The label for this filesystem.
@@ -317,6 +321,17 @@ class DeviceFormat(ObjectID):
                       lambda f,d: f._setDevice(d),
                       doc="Full path the device this format occupies")
 
+    def _getUUID(self):
+        return self._uuid
+
+    def _setUUID(self, uuid):
+        self._uuid = uuid
+        event_callbacks.attribute_changed(fmt=self, attr="uuid")
+
+    uuid = property(lambda f: f._getUUID(),
+                    lambda f,u: f._setUUID(u),
+                    doc="the formatting's UUID")
+
     @property
     def name(self):
         return self._name or self.type
@@ -368,7 +383,11 @@ class DeviceFormat(ObjectID):
         log_method_call(self, device=self.device,
                         type=self.type, status=self.status)
         self._preCreate(**kwargs)
-        self._create(**kwargs)
+        try:
+            self._create(**kwargs)
+        finally:
+            statusCache.invalidate()
+
         self._postCreate(**kwargs)
 
     def _preCreate(self, **kwargs):
@@ -406,7 +425,11 @@ class DeviceFormat(ObjectID):
         log_method_call(self, device=self.device,
                         type=self.type, status=self.status)
         self._preDestroy(**kwargs)
-        self._destroy(**kwargs)
+        try:
+            self._destroy(**kwargs)
+        finally:
+            statusCache.invalidate()
+
         self._postDestroy(**kwargs)
 
     # pylint: disable=unused-argument
@@ -457,7 +480,11 @@ class DeviceFormat(ObjectID):
         if not self._preSetup(**kwargs):
             return
 
-        self._setup(**kwargs)
+        try:
+            self._setup(**kwargs)
+        finally:
+            statusCache.invalidate()
+
         self._postSetup(**kwargs)
 
     def _preSetup(self, **kwargs):
@@ -490,7 +517,11 @@ class DeviceFormat(ObjectID):
         if not self._preTeardown(**kwargs):
             return
 
-        self._teardown(**kwargs)
+        try:
+            self._teardown(**kwargs)
+        finally:
+            statusCache.invalidate()
+
         self._postTeardown(**kwargs)
 
     def _preTeardown(self, **kwargs):
@@ -20,6 +20,9 @@
 # Red Hat Author(s): Dave Lehman <dlehman@redhat.com>
 #
 
+from bisect import bisect_left, bisect_right
+import copy
+from operator import gt, lt
 import os
 
 from ..storage_log import log_exception_info, log_method_call
@@ -37,6 +40,60 @@ from ..size import Size
 import logging
 log = logging.getLogger("blivet")
 
+def _duplicate(disk, memo):
+    """ Duplicate a parted.Disk once per deep copy operation.
+
+        Two disklabel instances in a tree can use the same parted.Disk (eg: a
+        device's format and originalFormat after
+        :meth:`DiskLabel.resetPartedDisk`), so the copies should as well.
+    """
+    if disk is None:
+        return None
+
+    key = ("parted.Disk", id(disk))
+    if key not in memo:
+        memo[key] = disk.duplicate()
+    return memo[key]
+
+class SharedPartedDisk(object):
+    """ A parted.Disk describing the partitions as they are on disk.
+
+        Deep copies of a disklabel share the parted.Disk instead of each
+        duplicating it. Whichever of them first needs to modify it (by making
+        it its working copy in :meth:`DiskLabel.resetPartedDisk`) duplicates
+        it first.
+    """
+
+    def __init__(self, disk):
+        self.disk = disk
+        self.shared = False
+        self.owned = False
+
+    def __deepcopy__(self, memo):
+        if self.owned:
+            # the disk is somebody's working copy, so it can change at any
+            # time, and so can the duplicate, which is the copy's working copy
+            new = SharedPartedDisk(_duplicate(self.disk, memo))
+            new.owned = True
+            return new
+
+        self.shared = True
+        new = SharedPartedDisk(self.disk)
+        new.shared = True
+        return new
+
+    def own(self):
+        """ Return the parted.Disk for use as a working copy.
+
+            :rtype: :class:`parted.Disk`
+
+            The parted.Disk is duplicated first if any other copy is using it.
+        """
+        if self.shared:
+            self.disk = self.disk.duplicate()
+            self.shared = False
+        self.owned = True
+        return self.disk
 
 class DiskLabel(DeviceFormat):
     """ Disklabel """
@@ -68,19 +125,33 @@ class DiskLabel(DeviceFormat):
         self._origPartedDisk = None
         self._alignment = None
         self._endAlignment = None
+        self._freeSpace = None
+
+        # post-commit work deferred while commits are batched, and the
+        # functions reverting the batched changes
+        self._batch = None
+        self._batchUndo = []
+        self._batchPending = False
 
-        if self.partedDevice:
+        # a new disklabel's parted.Disk is created when it is first used
+        if self.exists and self.partedDevice:
             # set up the parted objects and raise exception on failure
             self.updateOrigPartedDisk()
 
     def __deepcopy__(self, memo):
         """ Create a deep copy of a Disklabel instance.
 
-            We can't do copy.deepcopy on parted objects, which is okay.
+            We can't do copy.deepcopy on parted objects, which is okay. The
+            parted.Device is shared and the parted.Disk describing the disk's
+            current contents is only duplicated when one of the copies needs
+            to modify it (see :class:`SharedPartedDisk`).
         """
-        return util.variable_copy(self, memo,
-           shallow=('_partedDevice', '_alignment', '_endAlignment'),
-           duplicate=('_partedDisk', '_origPartedDisk'))
+        new = util.variable_copy(self, memo,
+           omit=('_partedDevice', '_partedDisk', '_origPartedDisk'),
+           shallow=('_alignment', '_endAlignment', '_freeSpace'))
+        new._partedDisk = _duplicate(self._partedDisk, memo)
+        new._origPartedDisk = copy.deepcopy(self._origPartedDisk, memo)
+        return new
 
     def __repr__(self):
         s = DeviceFormat.__repr__(self)
@@ -96,7 +167,8 @@ class DiskLabel(DeviceFormat):
                "sectorSize": self.sectorSize,
                "offset": self.alignment.offset,
                "grain": self.alignment.grainSize,
-               "disk": self.partedDisk, "orig_disk": self._origPartedDisk,
+               "disk": self.partedDisk,
+               "orig_disk": getattr(self._origPartedDisk, "disk", None),
                "dev": self.partedDevice})
         return s
 
@@ -118,12 +190,16 @@ class DiskLabel(DeviceFormat):
         return d
 
     def updateOrigPartedDisk(self):
-        self._origPartedDisk = self.partedDisk.duplicate()
+        self._origPartedDisk = SharedPartedDisk(self.partedDisk.duplicate())
 
     def resetPartedDisk(self):
         """ Set this instance's partedDisk to reflect the disk's contents. """
         log_method_call(self, device=self.device)
-        self._partedDisk = self._origPartedDisk
+        if self._origPartedDisk is None:
+            # nothing has been written yet, so start over from an empty label
+            self._partedDisk = None
+        else:
+            self._partedDisk = self._origPartedDisk.own()
 
     def freshPartedDisk(self):
         """ Return a new, empty parted.Disk instance for this device. """
@@ -245,18 +321,106 @@ class DiskLabel(DeviceFormat):
                         type=self.type, status=self.status)
         self.partedDevice.clobber()
 
-    def commit(self):
-        """ Commit the current partition table to disk and notify the OS. """
+    def commit(self, undo=None):
+        """ Commit the current partition table to disk and notify the OS.
+
+            :keyword undo: a function taking no arguments that reverts the
+                           changes to commit, run if they cannot be committed
+
+            Between :meth:`beginBatch` and :meth:`endBatch` this only notes
+            that there are changes to commit.
+        """
         log_method_call(self, device=self.device,
                         numparts=len(self.partitions))
+        if self._batch is not None:
+            self._batchPending = True
+            if undo:
+                self._batchUndo.append(undo)
+            return
+
         try:
             self.partedDisk.commit()
         except parted.DiskException as msg:
+            if undo:
+                undo()
             raise DiskLabelCommitError(msg)
         else:
             self.updateOrigPartedDisk()
             udev.settle()
 
+    @property
+    def batching(self):
+        """ Whether commits are currently being batched. """
+        return self._batch is not None
+
+    def beginBatch(self):
+        """ Start batching commits.
+
+            Until :meth:`endBatch` is called, :meth:`commit` does not write
+            anything and the functions passed to :meth:`afterCommit` are held
+            back, so that several partitions can be added or removed with a
+            single write of the partition table, a single re-read of it by the
+            kernel and a single udev settle.
+        """
+        if self._batch is None:
+            self._batch = []
+            self._batchUndo = []
+            self._batchPending = False
+
+    def endBatch(self):
+        """ Commit the changes made since :meth:`beginBatch`.
+
+            :returns: the functions deferred by :meth:`afterCommit`
+            :rtype: list of callables
+            :raises: :class:`~.errors.DiskLabelCommitError`
+
+            If the commit fails the batch stays open, so the commit can be
+            retried by calling this method again or the changes reverted by
+            calling :meth:`abortBatch`.
+        """
+        if self._batch is None:
+            return []
+
+        deferred = self._batch
+        self._batch = None
+        if self._batchPending:
+            try:
+                self.commit()
+            except DiskLabelCommitError:
+                self._batch = deferred
+                raise
+
+            self._batchPending = False
+
+        self._batchUndo = []
+        return deferred
+
+    def abortBatch(self):
+        """ Stop batching commits and revert the changes made since
+            :meth:`beginBatch`.
+
+            The undo functions passed to :meth:`commit` are run, most recent
+            first. Functions deferred by :meth:`afterCommit` are dropped.
+        """
+        undo = self._batchUndo
+        self._batch = None
+        self._batchUndo = []
+        self._batchPending = False
+        for func in reversed(undo):
+            func()
+
+    def afterCommit(self, func):
+        """ Run func once the changes made so far have been committed.
+
+            :param func: a function taking no arguments
+
+            Unless commits are being batched, func is run right away.
+        """
+        if self._batch is None:
+            func()
+        else:
+            self._batch.append(func)
+
     def commitToDisk(self):
         """ Commit the current partition table to disk. """
         log_method_call(self, device=self.device,
@@ -296,6 +460,7 @@ class DiskLabel(DeviceFormat):
         constraint = parted.Constraint(exactGeom=geometry)
         self.partedDisk.addPartition(partition=new_partition,
                                      constraint=constraint)
+        self.invalidateFreeSpace()
 
     def removePartition(self, partition):
         """ Remove a partition from the disklabel.
@@ -304,6 +469,26 @@ class DiskLabel(DeviceFormat):
             :type partition: :class:`parted.Partition`
         """
         self.partedDisk.removePartition(partition)
+        self.invalidateFreeSpace()
+
+    @property
+    def freeSpace(self):
+        """ The free regions of :attr:`partedDisk`.
+
+            :rtype: :class:`FreeSpaceMap`
+        """
+        if self._freeSpace is None or self._freeSpace.disk is not self.partedDisk:
+            self._freeSpace = FreeSpaceMap(self.partedDisk)
+        return self._freeSpace
+
+    def invalidateFreeSpace(self):
+        """ Discard :attr:`freeSpace` after a change to :attr:`partedDisk`.
+
+            Code that changes the partitions on :attr:`partedDisk` without
+            going through :meth:`addPartition` or :meth:`removePartition`
+            must call this.
+        """
+        self._freeSpace = None
 
     @property
     def extendedPartition(self):
@@ -391,3 +576,125 @@ class DiskLabel(DeviceFormat):
             return 0
 
 register_device_format(DiskLabel)
+
+class FreeSpaceMap(object):
+    """ The free regions of a :class:`parted.Disk`, indexed for lookup.
+
+        Regions are kept sorted by start sector and by length, separately for
+        regions inside and outside of the extended partition, so finding the
+        best region for a new partition does not mean walking all of the
+        free regions on the disk. Regions that start beyond the disk's
+        maximum partition start sector are left out since nothing can be
+        allocated from them.
+
+        The map reflects the disk at the time it was built. See
+        :meth:`DiskLabel.invalidateFreeSpace`.
+    """
+    maxBootEnd = Size("2 TiB")
+
+    def __init__(self, disk):
+        """
+            :param disk: the disk
+            :type disk: :class:`parted.Disk`
+        """
+        self.disk = disk
+        self.sectorSize = disk.device.sectorSize
+        extended = disk.getExtendedPartition()
+
+        regions = []
+        for geom in disk.getFreeSpaceRegions():
+            if geom.start > disk.maxPartitionStartSector:
+                continue
+
+            logical = bool(extended and extended.geometry.contains(geom))
+            regions.append((geom.start, geom, logical))
+
+        regions.sort(key=lambda r: r[0])
+        self._regions = [r[1] for r in regions]
+        self._starts = [r[0] for r in regions]
+        self._logical = [r[2] for r in regions]
+
+        # indices into _regions by kind: None for all regions, True for
+        # regions inside the extended partition, False for those outside it
+        self._byStart = {None: list(range(len(regions)))}
+        if extended:
+            self._byStart[True] = [i for (i, r) in enumerate(regions) if r[2]]
+            self._byStart[False] = [i for (i, r) in enumerate(regions) if not r[2]]
+
+        self._byLength = dict((kind, sorted((self._regions[i].length, i) for i in idxs))
+                              for (kind, idxs) in self._byStart.items())
+
+    def __len__(self):
+        return len(self._regions)
+
+    def __iter__(self):
+        return iter(self._regions)
+
+    def _kind(self, part_type):
+        if len(self._byStart) == 1:
+            return None
+        elif part_type == parted.PARTITION_NORMAL:
+            return False
+        elif part_type == parted.PARTITION_LOGICAL:
+            return True
+        else:
+            return None
+
+    def getBest(self, part_type, req_size, start=None, boot=None,
+                best_free=None, grow=None):
+        """ Return the best free region for a new partition.
+
+            :param part_type: the type of partition we want to allocate
+            :type part_type: one of parted's PARTITION_* constants
+            :param req_size: the requested size of the partition
+            :type req_size: :class:`~.size.Size`
+            :keyword int start: requested start sector for the partition
+            :keyword bool boot: whether this will be a bootable partition
+            :keyword best_free: current best free region for this partition
+            :type best_free: :class:`parted.Geometry`
+            :keyword bool grow: whether this is a growable request
+            :returns: the best region, which is best_free if no region on
+                      this disk is better
+            :rtype: :class:`parted.Geometry` or NoneType
+
+            See :func:`~.partitioning.getBestFreeSpaceRegion` for the
+            meaning of "best".
+        """
+        kind = self._kind(part_type)
+        min_length = -(-int(req_size) // self.sectorSize)
+        largest = grow or part_type == parted.PARTITION_EXTENDED
+
+        if start is not None:
+            idx = bisect_right(self._starts, start) - 1
+            candidates = []
+            if idx >= 0 and start <= self._regions[idx].end and \
+               kind in (None, self._logical[idx]):
+                candidates.append(idx)
+        elif boot:
+            candidates = self._byStart[kind]
+        else:
+            # only the smallest or largest fitting region can be the best
+            lengths = self._byLength[kind]
+            if largest and lengths:
+                pos = bisect_left(lengths, (lengths[-1][0],))
+            else:
+                pos = bisect_left(lengths, (min_length,))
+            candidates = [lengths[pos][1]] if pos < len(lengths) else []
+
+        op = gt if largest else lt
+        for idx in candidates:
+            geom = self._regions[idx]
+            if geom.length < min_length:
+                continue
+
+            if boot and \
+               Size(geom.start * self.sectorSize) + req_size > self.maxBootEnd:
+                continue
+
+            if not best_free or op(geom.length, best_free.length):
+                best_free = geom
+                if boot:
+                    # bootable partitions use the first large enough region
+                    break
+
+        return best_free
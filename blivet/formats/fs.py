@@ -27,6 +27,7 @@ import os
 import tempfile
 
 from . import fslabeling
+from ..callbacks import event_callbacks
 from ..errors import FormatCreateError, FSError, FSResizeError
 from . import DeviceFormat, register_device_format
 from .. import util
@@ -40,6 +41,8 @@ from ..size import B, KiB, MiB, GiB, KB, MB, GB
 from ..i18n import _, N_
 from .. import udev
 from ..mounts import mountsCache
+from ..devicestatus import statusCache
+from .fsprobecache import fsProbeCache
 
 import logging
 log = logging.getLogger("blivet")
@@ -56,6 +59,23 @@ def update_kernel_filesystems():
 
 update_kernel_filesystems()
 
+def prefetchSizeInfo(formats, workers=1):
+    """ Gather the size info that has been put off for some filesystems.
+
+        :param formats: formats to gather size info for
+        :type formats: list of :class:`~.formats.DeviceFormat`
+        :keyword int workers: the number of filesystems to probe at a time
+
+        Formats that are not filesystems, or whose size info is already
+        known, are skipped. The filesystems' devices have to be active.
+    """
+    pending = [f for f in formats if getattr(f, "sizeInfoPending", False)]
+    try:
+        util.parallel_map(lambda f: f._gatherSizeInfo(), pending,
+                          workers=workers)
+    finally:
+        fsProbeCache.flush()
+
 class FS(DeviceFormat):
     """ Filesystem base class. """
     _type = "Abstract Filesystem Class"  # fs type name
@@ -113,13 +133,12 @@ class FS(DeviceFormat):
         # Resize operations are limited to error-free filesystems whose current
         # size is known.
         self._resizable = False
-        if flags.installer_mode and self.resizefsProg:
-            # if you want current/min size you have to call updateSizeInfo
-            try:
-                self.updateSizeInfo()
-            except FSError:
-                log.warning("%s filesystem on %s needs repair", self.type,
-                                                                self.device)
+
+        # Gathering size info can mean running fsck, so it is put off until
+        # one of the size properties is used. Outside of installer mode you
+        # have to call updateSizeInfo if you want current/min size.
+        self._sizeInfoPending = bool(flags.installer_mode and self.exists and
+                                     self.resizefsProg)
 
         self._targetSize = self._size
 
@@ -205,6 +224,7 @@ class FS(DeviceFormat):
 
     def _getTargetSize(self):
         """ Get this filesystem's target size. """
+        self._ensureSizeInfo()
         return self._targetSize
 
     targetSize = property(_getTargetSize, _setTargetSize,
@@ -212,13 +232,22 @@ class FS(DeviceFormat):
 
     def _getSize(self):
         """ Get this filesystem's size. """
+        self._ensureSizeInfo()
         return self.targetSize if self.resizable else self._size
 
     size = property(_getSize, doc="This filesystem's size, accounting "
                                   "for pending changes")
 
-    def updateSizeInfo(self):
-        """ Update this filesystem's current and minimum size (for resize). """
+    def updateSizeInfo(self, useCache=True):
+        """ Update this filesystem's current and minimum size (for resize).
+
+            :keyword bool useCache: whether to use results stored in
+                                    :data:`~.fsprobecache.fsProbeCache`
+
+            Results are always stored in the probe cache when it is enabled,
+            but only for filesystems without errors.
+        """
+        self._sizeInfoPending = False
         if not self.exists:
             return
 
@@ -227,6 +256,22 @@ class FS(DeviceFormat):
         self._minInstanceSize = Size(0)
         self._resizable = self.__class__._resizable
 
+        cacheKey = None
+        if fsProbeCache.enabled:
+            cacheKey = fsProbeCache.getKey(self)
+
+        cached = fsProbeCache.lookup(cacheKey) if useCache else None
+        if cached is not None:
+            log.debug("using cached size info for %s on %s", self.type,
+                                                             self.device)
+            self._size = Size(cached["size"])
+            self._minSize = Size(cached["minSize"])
+            self._minInstanceSize = Size(cached["minInstanceSize"])
+            self._resizable = cached["resizable"]
+            if self.label is None and cached.get("label") is not None:
+                self.label = cached["label"]
+            return
+
         # We can't allow resize if the filesystem has errors.
         try:
             self.doCheck()
@@ -249,6 +294,45 @@ class FS(DeviceFormat):
 
         self._getMinSize(info=info)   # force calculation of minimum size
 
+        fsProbeCache.store(cacheKey,
+                           {"size": int(self._size),
+                            "minSize": int(self._minSize),
+                            "minInstanceSize": int(self._minInstanceSize),
+                            "resizable": self._resizable,
+                            "label": self.label})
+
+    @property
+    def sizeInfoPending(self):
+        """ Whether gathering this filesystem's size info has been put off. """
+        return self._sizeInfoPending
+
+    def _ensureSizeInfo(self):
+        """ Gather size info for this filesystem if it has been put off.
+
+            The device tree holding the filesystem's device gets to probe it
+            first since the device may have to be set up for that.
+        """
+        if not self._sizeInfoPending:
+            return
+
+        event_callbacks.size_info_needed(fmt=self)
+        self._gatherSizeInfo()
+
+    def _gatherSizeInfo(self):
+        """ Gather size info that has been put off from an active device. """
+        if not self._sizeInfoPending:
+            return
+
+        resetTarget = self._targetSize == self._size
+        try:
+            self.updateSizeInfo()
+        except FSError:
+            log.warning("%s filesystem on %s needs repair", self.type,
+                                                            self.device)
+
+        if resetTarget:
+            self._targetSize = self._size
+
     def _getMinSize(self, info=None):
         pass
 
@@ -352,8 +436,14 @@ class FS(DeviceFormat):
     @property
     def currentSize(self):
         """ The filesystem's current actual size. """
+        self._ensureSizeInfo()
         return self._size if self.exists else Size(0)
 
+    @property
+    def minSize(self):
+        self._ensureSizeInfo()
+        return super(FS, self).minSize
+
     @property
     def free(self):
         """ The amount of space that can be gained by resizing this
@@ -460,7 +550,7 @@ class FS(DeviceFormat):
         # properly unmounted. After doCheck the minimum size will be correct
         # so run the check one last time and bump up the size if it was too
         # small.
-        self.updateSizeInfo()
+        self.updateSizeInfo(useCache=False)
 
         # Check again if resizable is True, as updateSizeInfo() can change that
         if not self.resizable:
@@ -869,6 +959,7 @@ class FS(DeviceFormat):
     @property
     def resizable(self):
         """ Can formats of this filesystem type be resized? """
+        self._ensureSizeInfo()
         return super(FS, self).resizable and self.utilsAvailable
 
     @property
@@ -934,6 +1025,12 @@ class FS(DeviceFormat):
     def status(self):
         if not self.exists:
             return False
+
+        snapshot = statusCache.current()
+        if snapshot is not None:
+            return bool(snapshot.getMountpoints(self.device,
+                                                getattr(self, "subvolspec", None)))
+
         return self.systemMountpoint is not None
 
     def sync(self, root="/"):
@@ -1057,6 +1154,7 @@ class Ext2FS(FS):
 
     @property
     def minSize(self):
+        self._ensureSizeInfo()
         return self._minInstanceSize
 
     @property
@@ -1421,6 +1519,7 @@ class NTFS(FS):
 
     @property
     def minSize(self):
+        self._ensureSizeInfo()
         return self._minInstanceSize
 
     @property
@@ -1538,6 +1637,9 @@ class TmpFS(NoDevFS):
         NoDevFS.__init__(self, **kwargs)
         self._device = "tmpfs"
 
+        # getting the size of a tmpfs is cheap and it is needed below
+        self._ensureSizeInfo()
+
         # according to the following Kernel ML thread:
         # http://www.gossamer-threads.com/lists/linux/kernel/875278
         # maximum tmpfs mount size is 16TB on 32 bit systems
@@ -0,0 +1,190 @@
+# fsprobecache.py
+# Persistent cache of filesystem probe results.
+#
+# Copyright (C) 2015  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+""" Persistent cache of filesystem size/min size probe results.
+
+    Probing an existing filesystem means running fsck, the filesystem's info
+    tool and usually its resize tool. The results only change when the
+    filesystem does, so they can be kept across :meth:`~.Blivet.reset` calls
+    (and across processes) as long as they are keyed by something that
+    changes whenever the filesystem does.
+
+    The key is made up of the device node's path and device number, the
+    filesystem type and UUID, the size of the block device and a digest of
+    the start of the block device. The superblocks of all of the filesystems
+    whose size we probe live in the first :data:`SUPERBLOCK_AREA` bytes, and
+    they record the last write/mount time or a generation counter, so any
+    change to the filesystem (including resize and relabel) changes the key.
+
+    The cache is disabled unless :attr:`~.flags.Flags.fs_probe_cache` names a
+    file to store it in.
+"""
+
+import hashlib
+import json
+import os
+import stat
+import tempfile
+from threading import Lock
+
+from ..flags import flags
+
+import logging
+log = logging.getLogger("blivet")
+
+SUPERBLOCK_AREA = 128 * 1024
+
+class FSProbeCache(object):
+    """ A JSON-backed map of filesystem identity to probe results. """
+
+    def __init__(self, path=None):
+        """
+            :keyword path: file to store the cache in (default is
+                           :attr:`~.flags.Flags.fs_probe_cache`)
+            :type path: str or NoneType
+        """
+        self._path = path
+        self._entries = None
+        self._loadedPath = None
+        self._dirty = False
+        self._lock = Lock()
+
+    @property
+    def path(self):
+        return self._path or flags.fs_probe_cache
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    @staticmethod
+    def getKey(fmt):
+        """ Return a string identifying the current state of a filesystem.
+
+            :param fmt: an existing filesystem
+            :type fmt: :class:`~.formats.fs.FS`
+            :returns: the cache key, or None if the filesystem can't be cached
+            :rtype: str or NoneType
+
+            Mounted filesystems are not cached since their contents, and with
+            them the minimum size, can change without the superblock being
+            written.
+        """
+        if not fmt.exists or not fmt.uuid or not fmt.device or fmt.status:
+            return None
+
+        try:
+            st = os.stat(fmt.device)
+            if not stat.S_ISBLK(st.st_mode):
+                return None
+
+            with open(fmt.device, "rb") as f:
+                digest = hashlib.sha1(f.read(SUPERBLOCK_AREA)).hexdigest()
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+        except (IOError, OSError) as e:
+            log.debug("not caching probe results for %s: %s", fmt.device, e)
+            return None
+
+        return ":".join([fmt.device, "%d" % st.st_rdev, fmt.type, fmt.uuid,
+                         "%d" % size, digest])
+
+    def _load(self):
+        if self._entries is not None and self._loadedPath == self.path:
+            return
+
+        self._entries = {}
+        self._loadedPath = self.path
+        self._dirty = False
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            log.debug("failed to load fs probe cache %s: %s", self.path, e)
+        else:
+            if isinstance(entries, dict):
+                self._entries = entries
+
+    def _save(self):
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        try:
+            (fd, tmp) = tempfile.mkstemp(dir=dirname, prefix=".fsprobe")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._entries, f)
+            os.rename(tmp, self.path)
+        except (IOError, OSError) as e:
+            log.warning("failed to save fs probe cache %s: %s", self.path, e)
+
+    def lookup(self, key):
+        """ Return the probe results stored for key.
+
+            :param str key: a key returned by :meth:`getKey`
+            :returns: the stored results
+            :rtype: dict or NoneType
+        """
+        if not self.enabled or key is None:
+            return None
+
+        with self._lock:
+            self._load()
+            return self._entries.get(key)
+
+    def store(self, key, results):
+        """ Store the probe results for key.
+
+            :param str key: a key returned by :meth:`getKey`
+            :param dict results: JSON-serializable probe results
+
+            Entries for the same device node with a different key are
+            dropped since they can never match again. The results are not
+            written out until :meth:`flush` is called.
+        """
+        if not self.enabled or key is None:
+            return
+
+        with self._lock:
+            self._load()
+            prefix = key.rsplit(":", 5)[0] + ":"
+            for old in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[old]
+
+            self._entries[key] = results
+            self._dirty = True
+
+    def flush(self):
+        """ Write out the cache if results have been stored since it was
+            last written.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+
+            self._save()
+            self._dirty = False
+
+    def clear(self):
+        """ Forget all cached results, including those stored on disk. """
+        with self._lock:
+            self._entries = None
+            self._dirty = False
+            if self.path and os.path.exists(self.path):
+                os.unlink(self.path)
+
+fsProbeCache = FSProbeCache()
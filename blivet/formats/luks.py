@@ -26,6 +26,7 @@ from gi.repository import BlockDev as blockdev
 from ..storage_log import log_method_call
 from ..errors import LUKSError
 from ..devicelibs import crypto
+from ..devicestatus import statusCache
 from . import DeviceFormat, register_device_format
 from ..flags import flags
 from ..i18n import _, N_
@@ -158,6 +159,11 @@ class LUKS(DeviceFormat):
     def status(self):
         if not self.exists or not self.mapName:
             return False
+
+        snapshot = statusCache.current()
+        if snapshot is not None:
+            return self.mapName in snapshot.dmNames
+
         return os.path.exists("/dev/mapper/%s" % self.mapName)
 
     def _preSetup(self, **kwargs):
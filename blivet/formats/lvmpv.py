@@ -26,6 +26,7 @@ from gi.repository import BlockDev as blockdev
 from ..storage_log import log_method_call
 from parted import PARTITION_LVM
 from ..devicelibs import lvm
+from ..devicestatus import statusCache
 from ..i18n import N_
 from ..size import Size
 from . import DeviceFormat, register_device_format
@@ -123,8 +124,14 @@ class LVMPhysicalVolume(DeviceFormat):
     @property
     def status(self):
         # XXX hack
-        return (self.exists and self.vgName and
-                os.path.isdir("/dev/%s" % self.vgName))
+        if not (self.exists and self.vgName):
+            return False
+
+        snapshot = statusCache.current()
+        if snapshot is not None:
+            return self.vgName in snapshot.vgNames
+
+        return os.path.isdir("/dev/%s" % self.vgName)
 
 register_device_format(LVMPhysicalVolume)
 
@@ -20,10 +20,12 @@
 # Red Hat Author(s): Dave Lehman <dlehman@redhat.com>
 #
 
+import os
 from parted import PARTITION_SWAP, fileSystemType
 from ..storage_log import log_method_call
 from . import DeviceFormat, register_device_format
 from ..size import Size
+from ..devicestatus import statusCache
 from gi.repository import BlockDev as blockdev
 
 import logging
@@ -134,7 +136,14 @@ class SwapSpace(DeviceFormat):
     @property
     def status(self):
         """ Device status. """
-        return self.exists and blockdev.swap.swapstatus(self.device)
+        if not self.exists:
+            return False
+
+        snapshot = statusCache.current()
+        if snapshot is not None:
+            return os.path.realpath(self.device) in snapshot.swaps
+
+        return blockdev.swap.swapstatus(self.device)
 
     def _setup(self, **kwargs):
         log_method_call(self, device=self.device,
@@ -20,19 +20,27 @@
 # Red Hat Author(s): Vojtech Trefny <vtrefny@redhat.com>
 #
 from collections import defaultdict
+import select
+
 from . import util
 
 import logging
 log = logging.getLogger("blivet")
 
 class MountsCache(object):
-    """ Cache object for system mountpoints; checks /proc/mounts and
-        /proc/self/mountinfo for up-to-date information.
+    """ Cache object for system mountpoints; parses /proc/self/mountinfo
+        and only parses it again once the kernel reports a change to the
+        mount table.
     """
 
     def __init__(self):
         self.mountsHash = 0
         self.mountpoints = defaultdict(list)
+        self._paths = set()
+
+        # /proc/self/mounts polls with POLLPRI|POLLERR when mounts change
+        self._mountsFile = None
+        self._poller = None
 
     def getMountpoints(self, devspec, subvolspec=None):
         """ Get mountpoints for selected device
@@ -50,7 +58,7 @@ class MountsCache(object):
         """
         self._cacheCheck()
 
-        return self.mountpoints[(devspec, subvolspec)]
+        return self.mountpoints.get((devspec, subvolspec), [])
 
     def isMountpoint(self, path):
         """ Check to see if a path is already mounted
@@ -59,46 +67,81 @@ class MountsCache(object):
         """
         self._cacheCheck()
 
-        return any(path in p for p in self.mountpoints.values())
+        return path in self._paths
 
-    def _getActiveMounts(self):
-        """ Get information about mounted devices from /proc/mounts and
-            /proc/self/mountinfo
+    @staticmethod
+    def _parseMountInfo(lines):
+        """ Return mountpoints by (devspec, subvolspec) from mountinfo lines.
 
-            Refreshes self.mountpoints with current moutpoint information
+            :param lines: lines in the format of /proc/self/mountinfo
+            :type lines: iterable of str
+            :rtype: dict of list of str
         """
-        self.mountpoints = defaultdict(list)
-        for line in open("/proc/mounts").readlines():
+        mountpoints = defaultdict(list)
+        for line in lines:
+            # the number of optional fields varies, they end with a "-"
             try:
-                (devspec, mountpoint, fstype, _options, _rest) = line.split(None, 4)
+                (fields, rest) = line.split(" - ", 1)
+                (_root, mountpoint) = fields.split()[3:5]
+                (fstype, devspec) = rest.split()[:2]
             except ValueError:
-                log.error("failed to parse /proc/mounts line: %s", line)
+                log.error("failed to parse /proc/self/mountinfo line: %s", line)
                 continue
 
             if fstype == "btrfs":
-                # get the subvol name from /proc/self/mountinfo
-                for line in open("/proc/self/mountinfo").readlines():
-                    fields = line.split()
-                    _subvol = fields[3]
-                    _mountpoint = fields[4]
-                    _devspec = fields[9]
-                    if _mountpoint == mountpoint and _devspec == devspec:
-                        # empty _subvol[1:] means it is a top-level volume
-                        subvolspec = _subvol[1:] or 5
-
-                        self.mountpoints[(devspec, subvolspec)].append(mountpoint)
-
+                # empty _root[1:] means it is a top-level volume
+                subvolspec = _root[1:] or 5
             else:
-                self.mountpoints[(devspec, None)].append(mountpoint)
+                subvolspec = None
 
-    def _cacheCheck(self):
-        """ Computes the MD5 hash on /proc/mounts and updates the cache on change
+            mountpoints[(devspec, subvolspec)].append(mountpoint)
+
+        return mountpoints
+
+    def _getActiveMounts(self):
+        """ Get information about mounted devices from /proc/self/mountinfo
+
+            Refreshes self.mountpoints with current moutpoint information
         """
+        if self._mountsFile is not None:
+            # reading the file re-arms the change notification
+            self._mountsFile.seek(0)
+            self._mountsFile.read()
 
-        md5hash = util.md5_file("/proc/mounts")
+        with open("/proc/self/mountinfo") as mountinfo:
+            self.mountpoints = self._parseMountInfo(mountinfo.readlines())
+
+        self._paths = set(path for paths in self.mountpoints.values()
+                               for path in paths)
+
+    def _mountsChanged(self):
+        """ Return True if the mount table may have changed since the last
+            call.
+        """
+        if self._poller is not None:
+            return bool(self._poller.poll(0))
+
+        try:
+            self._mountsFile = open("/proc/self/mounts")
+            self._poller = select.poll()
+            self._poller.register(self._mountsFile,
+                                  select.POLLPRI | select.POLLERR)
+        except (AttributeError, EnvironmentError) as e:
+            # fall back to comparing the contents of /proc/mounts
+            log.debug("cannot watch /proc/self/mounts: %s", e)
+            self._mountsFile = None
+            self._poller = None
+            md5hash = util.md5_file("/proc/mounts")
+            if md5hash == self.mountsHash:
+                return False
 
-        if md5hash != self.mountsHash:
             self.mountsHash = md5hash
+
+        return True
+
+    def _cacheCheck(self):
+        """ Updates the cache if the mount table has changed """
+        if self._mountsChanged():
             self._getActiveMounts()
 
 mountsCache = MountsCache()
@@ -20,8 +20,8 @@
 # Red Hat Author(s): Dave Lehman <dlehman@redhat.com>
 #
 
-from operator import gt, lt
 from decimal import Decimal
+from fractions import Fraction
 from gi.repository import BlockDev as blockdev
 import functools
 
@@ -30,6 +30,7 @@ import parted
 from .errors import DeviceError, PartitioningError
 from .flags import flags
 from .devices import Device, PartitionDevice, LUKSDevice, devicePathToName
+from .formats.disklabel import FreeSpaceMap
 from .size import Size
 from .i18n import _
 from .util import stringize, unicodeize, compare
@@ -165,7 +166,8 @@ def getNextPartitionType(disk, no_primary=None):
     return part_type
 
 def getBestFreeSpaceRegion(disk, part_type, req_size, start=None,
-                           boot=None, best_free=None, grow=None):
+                           boot=None, best_free=None, grow=None,
+                           free_map=None):
     """ Return the "best" free region on the specified disk.
 
         For non-boot partitions, we return the largest free region on the
@@ -194,65 +196,26 @@ def getBestFreeSpaceRegion(disk, part_type, req_size, start=None,
         :type best_free: :class:`parted.Geometry`
         :keyword grow: indicates whether this is a growable request
         :type grow: bool
+        :keyword free_map: the disk's free regions, if already known
+        :type free_map: :class:`~.formats.disklabel.FreeSpaceMap`
 
     """
-    log.debug("getBestFreeSpaceRegion: disk=%s part_type=%d req_size=%s "
-              "boot=%s best=%s grow=%s start=%s",
-              disk.device.path, part_type, req_size, boot, best_free, grow,
-              start)
-    extended = disk.getExtendedPartition()
+    if free_map is None:
+        free_map = FreeSpaceMap(disk)
 
-    for free_geom in disk.getFreeSpaceRegions():
-        log.debug("checking %d-%d (%s)", free_geom.start, free_geom.end,
-                                         Size(free_geom.getLength(unit="B")))
-        if start is not None and not free_geom.containsSector(start):
-            log.debug("free region does not contain requested start sector")
-            continue
+    # For boot partitions, we want the first suitable region we find.
+    # For growable or extended partitions, we want the largest possible
+    # free region.
+    # For all others, we want the smallest suitable free region.
+    best = free_map.getBest(part_type, req_size, start=start, boot=boot,
+                            best_free=best_free, grow=grow)
 
-        if extended:
-            in_extended = extended.geometry.contains(free_geom)
-            if ((in_extended and part_type == parted.PARTITION_NORMAL) or
-                (not in_extended and part_type == parted.PARTITION_LOGICAL)):
-                log.debug("free region not suitable for request")
-                continue
-
-        if free_geom.start > disk.maxPartitionStartSector:
-            log.debug("free range start sector beyond max for new partitions")
-            continue
-
-        if boot:
-            max_boot = Size("2 TiB")
-            free_start = Size(free_geom.start * disk.device.sectorSize)
-            req_end = free_start + req_size
-            if req_end > max_boot:
-                log.debug("free range position would place boot req above %s",
-                            max_boot)
-                continue
-
-        log.debug("current free range is %d-%d (%s)", free_geom.start,
-                                                      free_geom.end,
-                                                      Size(free_geom.getLength(unit="B")))
-        free_size = Size(free_geom.getLength(unit="B"))
-
-        # For boot partitions, we want the first suitable region we find.
-        # For growable or extended partitions, we want the largest possible
-        # free region.
-        # For all others, we want the smallest suitable free region.
-        if grow or part_type == parted.PARTITION_EXTENDED:
-            op = gt
-        else:
-            op = lt
-        if req_size <= free_size:
-            if not best_free or op(free_geom.length, best_free.length):
-                best_free = free_geom
-
-                if boot:
-                    # if this is a bootable partition we want to
-                    # use the first freespace region large enough
-                    # to satisfy the request
-                    break
-
-    return best_free
+    log.debug("getBestFreeSpaceRegion: disk=%s part_type=%d req_size=%s "
+              "boot=%s best=%s grow=%s start=%s: %d free regions, chose %s",
+              disk.device.path, part_type, req_size, boot, best_free, grow,
+              start, len(free_map),
+              "%d-%d" % (best.start, best.end) if best else None)
+    return best
 
 def sectorsToSize(sectors, sectorSize):
     """ Convert length in sectors to size.
@@ -305,7 +268,7 @@ def removeNewPartitions(disks, remove, all_partitions):
                 # these get removed last
                 continue
 
-            part.disk.format.partedDisk.removePartition(part.partedPartition)
+            part.disk.format.removePartition(part.partedPartition)
             part.partedPartition = None
             part.disk = None
 
@@ -316,7 +279,7 @@ def removeNewPartitions(disks, remove, all_partitions):
            (flags.installer_mode or
             extended not in (p.partedPartition for p in all_partitions)):
             log.debug("removing empty extended partition from %s", disk.name)
-            disk.format.partedDisk.removePartition(extended)
+            disk.format.removePartition(extended)
 
 def addPartition(disklabel, free, part_type, size, start=None, end=None):
     """ Add a new partition to a disk.
@@ -391,6 +354,7 @@ def addPartition(disklabel, free, part_type, size, start=None, end=None):
     constraint = parted.Constraint(exactGeom=new_geom)
     disklabel.partedDisk.addPartition(partition=partition,
                                       constraint=constraint)
+    disklabel.invalidateFreeSpace()
     return partition
 
 def getFreeRegions(disks):
@@ -593,9 +557,17 @@ def allocatePartitions(storage, disks, partitions, freespace):
             disklabels[disk.path] = disk.format
             all_disks[disk.path] = disk
 
+    # the partitions may have been changed directly via parted since the free
+    # space was last looked at
+    for disklabel in disklabels.values():
+        disklabel.invalidateFreeSpace()
+
     removeNewPartitions(disks, new_partitions, partitions)
 
-    for _part in new_partitions:
+    # disk path -> (ids of the new partitions allocated on the disk, growth)
+    disk_growth = {}
+
+    for index, _part in enumerate(new_partitions):
         if _part.partedPartition and _part.isExtended:
             # ignore new extendeds as they are implicit requests
             continue
@@ -630,6 +602,12 @@ def allocatePartitions(storage, disks, partitions, freespace):
         use_disk = None
         part_type = None
         growth = 0  # in sectors
+
+        # the growth of candidate layouts only matters if some request so far
+        # is growable
+        grow_test = any(p.req_grow for p in new_partitions[:index+1])
+        placed = None   # disk path -> new partitions allocated on the disk
+
         # loop through disks
         for _disk in req_disks:
             disklabel = disklabels[_disk.path]
@@ -671,7 +649,8 @@ def allocatePartitions(storage, disks, partitions, freespace):
                                           start=_part.req_start_sector,
                                           best_free=current_free,
                                           boot=boot,
-                                          grow=_part.req_grow)
+                                          grow=_part.req_grow,
+                                          free_map=disklabel.freeSpace)
 
             if best == free and not _part.req_primary and \
                new_part_type == parted.PARTITION_NORMAL:
@@ -686,103 +665,89 @@ def allocatePartitions(storage, disks, partitions, freespace):
                                                   start=_part.req_start_sector,
                                                   best_free=current_free,
                                                   boot=boot,
-                                                  grow=_part.req_grow)
+                                                  grow=_part.req_grow,
+                                                  free_map=disklabel.freeSpace)
 
             if best and free != best:
                 update = True
-                allocated = new_partitions[:new_partitions.index(_part)+1]
-                if any([p.req_grow for p in allocated]):
+                if grow_test:
                     log.debug("evaluating growth potential for new layout")
+                    # Now we check, for growable requests, which of the two
+                    # free regions will allow for more growth.
+                    if placed is None:
+                        placed = {}
+                        for _p in new_partitions[:index]:
+                            placed.setdefault(_p.disk.path, []).append(_p)
+
+                    # The layouts of the other disks are the same for every
+                    # candidate region and only change when a partition gets
+                    # allocated on them, so their growth is cached.
                     new_growth = 0
                     for disk_path in disklabels.keys():
-                        log.debug("calculating growth for disk %s", disk_path)
-                        # Now we check, for growable requests, which of the two
-                        # free regions will allow for more growth.
-
-                        # set up chunks representing the disks' layouts
-                        temp_parts = []
-                        for _p in new_partitions[:new_partitions.index(_part)]:
-                            if _p.disk.path == disk_path:
-                                temp_parts.append(_p)
-
-                        # add the current request to the temp disk to set up
-                        # its partedPartition attribute with a base geometry
                         if disk_path == _disk.path:
-                            _part_type = new_part_type
-                            _free = best
-                            if new_part_type == parted.PARTITION_EXTENDED and \
-                               new_part_type != _part.req_partType:
-                                addPartition(disklabel, best, new_part_type,
-                                             None)
-
-                                _part_type = parted.PARTITION_LOGICAL
-
-                                _free = getBestFreeSpaceRegion(disklabel.partedDisk,
-                                                               _part_type,
-                                                               _part.req_size,
-                                                               start=_part.req_start_sector,
-                                                               boot=boot,
-                                                               grow=_part.req_grow)
-                                if not _free:
-                                    log.info("not enough space after adding "
-                                             "extended partition for growth test")
-                                    if new_part_type == parted.PARTITION_EXTENDED:
-                                        e = disklabel.extendedPartition
-                                        disklabel.partedDisk.removePartition(e)
-
-                                    continue
-
-                            temp_part = None
-                            try:
-                                temp_part = addPartition(disklabel,
-                                                         _free,
-                                                         _part_type,
-                                                         _part.req_size,
-                                                         _part.req_start_sector,
-                                                         _part.req_end_sector)
-                            except ArithmeticError as e:
-                                log.debug("failed to allocate aligned partition "
-                                         "for growth test")
-                                continue
-
-                            _part.partedPartition = temp_part
-                            _part.disk = _disk
-                            temp_parts.append(_part)
-
-                        chunks = getDiskChunks(all_disks[disk_path],
-                                               temp_parts, freespace)
-
-                        # grow all growable requests
-                        disk_growth = 0 # in sectors
-                        disk_sector_size = Size(disklabels[disk_path].partedDevice.sectorSize)
-                        for chunk in chunks:
-                            chunk.growRequests()
-                            # record the growth for this layout
-                            new_growth += chunk.growth
-                            disk_growth += chunk.growth
-                            for req in chunk.requests:
-                                log.debug("request %d (%s) growth: %d (%s) "
-                                          "size: %s",
-                                          req.device.id,
-                                          req.device.name,
-                                          req.growth,
-                                          sectorsToSize(req.growth,
-                                                        disk_sector_size),
-                                          sectorsToSize(req.growth + req.base,
-                                                        disk_sector_size))
-                        log.debug("disk %s growth: %d (%s)",
-                                        disk_path, disk_growth,
-                                        sectorsToSize(disk_growth,
-                                                      disk_sector_size))
+                            continue
+
+                        temp_parts = placed.get(disk_path, [])
+                        key = [p.id for p in temp_parts]
+                        if disk_path not in disk_growth or \
+                           disk_growth[disk_path][0] != key:
+                            log.debug("calculating growth for disk %s", disk_path)
+                            disk_growth[disk_path] = (key,
+                                                      getDiskGrowth(all_disks[disk_path],
+                                                                    temp_parts,
+                                                                    freespace))
+                        new_growth += disk_growth[disk_path][1]
+
+                    # add the current request to the candidate disk to set up
+                    # its partedPartition attribute with a base geometry
+                    log.debug("calculating growth for disk %s", _disk.path)
+                    _part_type = new_part_type
+                    _free = best
+                    temp_part = None
+                    temp_extended = False
+                    if new_part_type == parted.PARTITION_EXTENDED and \
+                       new_part_type != _part.req_partType:
+                        addPartition(disklabel, best, new_part_type, None)
+                        temp_extended = True
+
+                        _part_type = parted.PARTITION_LOGICAL
+
+                        _free = getBestFreeSpaceRegion(disklabel.partedDisk,
+                                                       _part_type,
+                                                       _part.req_size,
+                                                       start=_part.req_start_sector,
+                                                       boot=boot,
+                                                       grow=_part.req_grow,
+                                                       free_map=disklabel.freeSpace)
+                        if not _free:
+                            log.info("not enough space after adding "
+                                     "extended partition for growth test")
+
+                    if _free:
+                        try:
+                            temp_part = addPartition(disklabel,
+                                                     _free,
+                                                     _part_type,
+                                                     _part.req_size,
+                                                     _part.req_start_sector,
+                                                     _part.req_end_sector)
+                        except ArithmeticError:
+                            log.debug("failed to allocate aligned partition "
+                                     "for growth test")
 
                     if temp_part:
-                        disklabel.partedDisk.removePartition(temp_part)
+                        _part.partedPartition = temp_part
+                        _part.disk = _disk
+                        temp_parts = placed.get(_disk.path, []) + [_part]
+                        new_growth += getDiskGrowth(all_disks[_disk.path],
+                                                    temp_parts, freespace)
+                        disklabel.removePartition(temp_part)
+
                     _part.partedPartition = None
                     _part.disk = None
 
-                    if new_part_type == parted.PARTITION_EXTENDED:
-                        e = disklabel.extendedPartition
-                        disklabel.partedDisk.removePartition(e)
+                    if temp_extended:
+                        disklabel.removePartition(disklabel.extendedPartition)
 
                     log.debug("total growth: %d sectors", new_growth)
 
@@ -837,7 +802,8 @@ def allocatePartitions(storage, disks, partitions, freespace):
                                           _part.req_size,
                                           start=_part.req_start_sector,
                                           boot=boot,
-                                          grow=_part.req_grow)
+                                          grow=_part.req_grow,
+                                          free_map=disklabel.freeSpace)
             if not free:
                 raise PartitioningError(_("not enough free space after "
                                         "creating extended partition"))
@@ -1097,6 +1063,61 @@ class Chunk(object):
     def sortRequests(self):
         pass
 
+    def _fillRequests(self, requests, uniform=False):
+        """ Divide the pool among requests by water-filling.
+
+            :param requests: the requests to grow, in order of preference
+            :type requests: list of :class:`Request`
+            :keyword uniform: grow requests uniformly instead of proportionally
+            :type uniform: bool
+
+            Every request gets the same amount of growth per unit of its
+            weight (its base, or one under uniform growth), except for those
+            that reach their maximum growth first. Those get exactly their
+            maximum and are done. Requests are visited in order of the level
+            at which they reach their maximum, so the water level is found in
+            a single pass.
+        """
+        weights = dict((r, 1 if uniform else r.base) for r in requests)
+        requests = [r for r in requests if weights[r] > 0]
+
+        limits = {}
+        for req in requests:
+            max_growth = self.maxGrowth(req)
+            if max_growth:
+                limits[req] = max(max_growth - req.growth, 0)
+
+        pool = self.pool
+        weight = sum(weights[r] for r in requests)
+        for req in sorted(limits.keys(),
+                          key=lambda r: Fraction(int(limits[r]), weights[r])):
+            # stop at the first request whose maximum is above the level
+            # the remaining requests can reach
+            if limits[req] * weight > pool * weights[req]:
+                break
+
+            req.growth += limits[req]
+            req.done = True
+            pool -= limits[req]
+            weight -= weights[req]
+
+        level_pool = pool
+        for req in requests:
+            if req.done:
+                continue
+
+            # truncate, don't round
+            growth = int(weights[req] * level_pool // weight)
+            req.growth += growth
+            pool -= growth
+
+        for req in requests:
+            log.debug("new grow amount for request %d (%s) is %s units, or %s",
+                      req.device.id, req.device.name, req.growth,
+                      self.lengthToSize(req.growth))
+
+        self.pool = pool
+
     def growRequests(self, uniform=False):
         """ Calculate growth amounts for requests in this chunk.
 
@@ -1110,6 +1131,11 @@ class Chunk(object):
 
             Under uniform growth, all requests receive an equal portion of the
             free units.
+
+            Requests that reach their maximum growth stop growing and the
+            rest of the free units go to the others. Units left over from
+            truncating shares to whole units go to the first requests that
+            can still grow.
         """
         log.debug("Chunk.growRequests: %r", self)
 
@@ -1117,41 +1143,25 @@ class Chunk(object):
         for req in self.requests:
             log.debug("req: %r", req)
 
-        # we use this to hold the base for the next loop through the
-        # chunk's requests since we want the base to be the same for
-        # all requests in any given growth iteration
-        new_base = self.base
-        last_pool = 0 # used to track changes to the pool across iterations
-        while not self.done and self.pool and last_pool != self.pool:
-            last_pool = self.pool    # to keep from getting stuck
-            self.base = new_base
-            if uniform:
-                growth = int(last_pool / self.remaining)
+        while self.pool:
+            requests = [r for r in self.requests
+                        if not r.done and r not in self.skip_list]
+            if not requests:
+                break
 
             log.debug("%d requests and %s (%s) left in chunk",
-                        self.remaining, self.pool, self.lengthToSize(self.pool))
-            for p in self.requests:
-                if p.done or p in self.skip_list:
-                    continue
+                        len(requests), self.pool, self.lengthToSize(self.pool))
+            self._fillRequests(requests, uniform=uniform)
 
-                if not uniform:
-                    # Each request is allocated free units from the pool
-                    # based on the relative _base_ sizes of the remaining
-                    # growable requests.
-                    share = Decimal(p.base) / Decimal(self.base)
-                    growth = int(share * last_pool) # truncate, don't round
-
-                p.growth += growth
-                self.pool -= growth
-                log.debug("adding %s (%s) to %d (%s)",
-                            growth, self.lengthToSize(growth),
-                            p.device.id, p.device.name)
+            # Some limits, like the disklabel's maximum end sector, depend on
+            # the growth of other requests. Check them again now that all of
+            # the growth is known and share out whatever gets taken back.
+            pool = self.pool
+            for req in requests:
+                self.trimOverGrownRequest(req)
 
-                new_base = self.trimOverGrownRequest(p, base=new_base)
-                log.debug("new grow amount for request %d (%s) is %s "
-                          "units, or %s",
-                            p.device.id, p.device.name, p.growth,
-                            self.lengthToSize(p.growth))
+            if self.pool == pool:
+                break
 
         if self.pool:
             # allocate any leftovers in pool to the first partition
@@ -1176,6 +1186,8 @@ class Chunk(object):
                 if self.pool == 0:
                     break
 
+        self.base = sum(r.base for r in self.requests if not r.done)
+
         # requests that were skipped over this time through are back on the
         # table next time
         self.skip_list = []
@@ -1367,6 +1379,36 @@ class ThinPoolChunk(VGChunk):
         usable_extents = (pool.size / pool.vg.peSize)
         super(VGChunk, self).__init__(usable_extents, requests=requests) # pylint: disable=bad-super-call
 
+def getDiskGrowth(disk, partitions, free):
+    """ Return the total growth of the partitions on a disk.
+
+        :param disk: the disk
+        :type disk: :class:`~.devices.StorageDevice`
+        :param partitions: list of partitions
+        :type partitions: list of :class:`~.devices.PartitionDevice`
+        :param free: list of free regions
+        :type free: list of :class:`parted.Geometry`
+        :returns: the growth of all growable requests, in sectors
+        :rtype: int
+
+        The partitions are not modified; see :func:`getDiskChunks`.
+    """
+    disk_growth = 0 # in sectors
+    disk_sector_size = Size(disk.format.partedDevice.sectorSize)
+    for chunk in getDiskChunks(disk, partitions, free):
+        chunk.growRequests()
+        disk_growth += chunk.growth
+        for req in chunk.requests:
+            log.debug("request %d (%s) growth: %d (%s) size: %s",
+                      req.device.id, req.device.name, req.growth,
+                      sectorsToSize(req.growth, disk_sector_size),
+                      sectorsToSize(req.growth + req.base, disk_sector_size))
+
+    log.debug("disk %s growth: %d (%s)", disk.path, disk_growth,
+                                          sectorsToSize(disk_growth,
+                                                        disk_sector_size))
+    return disk_growth
+
 def getDiskChunks(disk, partitions, free):
     """ Return a list of Chunk instances representing a disk.
 
@@ -1739,6 +1781,7 @@ def growPartitions(disks, partitions, free, size_sets=None):
                 constraint = parted.Constraint(exactGeom=partition.geometry)
                 disklabel.partedDisk.addPartition(partition=partition,
                                                   constraint=constraint)
+                disklabel.invalidateFreeSpace()
                 path = partition.path
                 if device:
                     # set the device's name
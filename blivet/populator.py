@@ -44,10 +44,11 @@ from .devices import devicePathToName
 from . import formats
 from .devicelibs import lvm
 from .devicelibs import raid
+from . import tsort
 from . import udev
 from . import util
 from .flags import flags
-from .storage_log import log_exception_info, log_method_call
+from .storage_log import log_exception_info, log_method_call, DeferredFormat
 from .i18n import _
 from .size import Size
 
@@ -117,6 +118,15 @@ class Populator(object):
 
         self._cleanup = False
 
+        # number of threads to use for probing devices during populate
+        self.workers = getattr(conf, "populateWorkers", 1)
+
+        # information gathered by _probeUdevDevices, by sysfs path
+        self._probes = {}
+
+        # udev format signatures at the time of scanning, by sysfs path
+        self._formatSignatures = {}
+
     def setDiskImages(self, images):
         """ Set the disk images and reflect them in exclusiveDisks.
 
@@ -608,7 +618,8 @@ class Populator(object):
 
     def addUdevDevice(self, info):
         name = udev.device_get_name(info)
-        log_method_call(self, name=name, info=pprint.pformat(dict(info)))
+        log_method_call(self, name=name,
+                        info=DeferredFormat(lambda: pprint.pformat(dict(info))))
         uuid = udev.device_get_uuid(info)
         sysfs_path = udev.device_get_sysfs_path(info)
 
@@ -669,8 +680,7 @@ class Populator(object):
                 log.warning("Found device %s, but it turns out not be an md array device after all.", device.name)
                 device = None
 
-        if device and device.isDisk and \
-           blockdev.mpath.is_mpath_member(device.path):
+        if device and device.isDisk and self._isMultipathMember(device):
             # newly added device (eg iSCSI) could make this one a multipath member
             if device.format and device.format.type != "multipath_member":
                 log.debug("%s newly detected as multipath member, dropping old format and removing kids", device.name)
@@ -853,8 +863,8 @@ class Populator(object):
     def handleVgLvs(self, vg_device):
         """ Handle setup of the LV's in the vg_device. """
         vg_name = vg_device.name
-        lv_info = dict((k, v) for (k, v) in iter(self.devicetree.lvInfo.items())
-                                if v.vg_name == vg_name)
+        lvm_info = self.devicetree.lvmInfo
+        lv_info = lvm_info.getVGLVs(vg_name)
 
         self.names.extend(n for n in lv_info.keys() if n not in self.names)
 
@@ -909,7 +919,7 @@ class Populator(object):
 
             if lv_attr[0] in 'Ss':
                 log.info("found lvm snapshot volume '%s'", name)
-                origin_name = blockdev.lvm.lvorigin(vg_name, lv_name)
+                origin_name = lvm_info.getOrigin(lv)
                 if not origin_name:
                     log.error("lvm snapshot '%s-%s' has unknown origin",
                                 vg_name, lv_name)
@@ -959,11 +969,11 @@ class Populator(object):
                 lv_class = LVMThinPoolDevice
             elif lv_attr[0] == 'V':
                 # thin volume
-                pool_name = blockdev.lvm.thlvpoolname(vg_name, lv_name)
+                pool_name = lvm_info.getPoolName(lv)
                 pool_device_name = "%s-%s" % (vg_name, pool_name)
                 addRequiredLV(pool_device_name, "failed to look up thin pool")
 
-                origin_name = blockdev.lvm.lvorigin(vg_name, lv_name)
+                origin_name = lvm_info.getOrigin(lv)
                 if origin_name:
                     origin_device_name = "%s-%s" % (vg_name, origin_name)
                     addRequiredLV(origin_device_name, "failed to locate origin lv")
@@ -1081,7 +1091,7 @@ class Populator(object):
     def handleUdevMDMemberFormat(self, info, device):
         # pylint: disable=unused-argument
         log_method_call(self, name=device.name, type=device.format.type)
-        md_info = blockdev.md.examine(device.path)
+        md_info = self._examineMDMember(device)
 
         # Use mdadm info if udev info is missing
         md_uuid = md_info.uuid
@@ -1259,6 +1269,116 @@ class Populator(object):
                                       exists=True)
                 self.devicetree._addDevice(subvol)
 
+    def _getUdevFormatArgs(self, info, path):
+        """ Return the common format constructor arguments for a device. """
+        return {"uuid": udev.device_get_uuid(info),
+                "label": udev.device_get_label(info),
+                "device": path,
+                "serial": udev.device_get_serial(info),
+                "exists": True}
+
+    def _probeUdevDevice(self, info):
+        """ Gather information about a device that does not depend on the tree.
+
+            :param info: the device's udev information
+            :returns: the gathered information
+            :rtype: dict
+
+            This runs in worker threads, so it must not modify the device
+            tree or the populator. Anything that fails here is simply done
+            again when the device is added to the tree.
+        """
+        probe = {}
+        path = udev.device_get_devname(info)
+        if not path:
+            return probe
+
+        try:
+            probe["mpath_member"] = blockdev.mpath.is_mpath_member(path)
+        except Exception: # pylint: disable=broad-except
+            return probe
+
+        format_type = udev.device_get_format(info)
+        if not format_type or probe["mpath_member"]:
+            return probe
+
+        if format_type in formats.mdraid.MDRaidMember._udevTypes:
+            try:
+                probe["md_info"] = blockdev.md.examine(path)
+            except Exception: # pylint: disable=broad-except
+                pass
+
+        # existing filesystems are examined using external tools when the
+        # format instance gets created, so create it now
+        fmt_class = formats.get_device_format_class(format_type)
+        if fmt_class and issubclass(fmt_class, formats.fs.FS) and \
+           format_type != "btrfs":
+            kwargs = self._getUdevFormatArgs(info, path)
+            try:
+                fmt = formats.getFormat(format_type, **dict(kwargs))
+            except FSError:
+                pass
+            else:
+                probe["format"] = (format_type, kwargs, fmt)
+
+        return probe
+
+    def _probeUdevDevices(self, devices):
+        """ Probe a list of udev devices using :attr:`workers` threads.
+
+            :param devices: the devices' udev information
+            :type devices: list of :class:`pyudev.Device`
+
+            The device tree is not modified. The results are used by
+            :meth:`addUdevDevice`, which still adds the devices one at a
+            time and in order.
+        """
+        self._probes = {}
+        if self.workers < 2:
+            return
+
+        log.info("probing %d devices using %d threads", len(devices),
+                 self.workers)
+        probes = util.parallel_map(self._probeUdevDevice, devices,
+                                   workers=self.workers)
+        for (info, probe) in zip(devices, probes):
+            self._probes[udev.device_get_sysfs_path(info)] = probe
+
+    def _getProbe(self, device):
+        """ Return the information probed for a device.
+
+            The probes are looked up by sysfs path since a device's path (eg:
+            /dev/mapper/vg-lv) is often not the node udev reports for it (eg:
+            /dev/dm-3).
+        """
+        return self._probes.get(device.sysfsPath, {})
+
+    def _isMultipathMember(self, device):
+        probe = self._getProbe(device)
+        if "mpath_member" in probe:
+            return probe["mpath_member"]
+
+        return blockdev.mpath.is_mpath_member(device.path)
+
+    def _examineMDMember(self, device):
+        probe = self._getProbe(device)
+        if "md_info" in probe:
+            return probe["md_info"]
+
+        return blockdev.md.examine(device.path)
+
+    def _getFormat(self, device, designator, kwargs):
+        """ Return a new format instance, using a probed one if it matches. """
+        probed = self._getProbe(device).pop("format", None)
+        if probed and probed[0] == designator:
+            (probed_kwargs, fmt) = probed[1:]
+            # the probe used the node udev reported for the device
+            if dict(probed_kwargs, device=kwargs["device"]) == kwargs:
+                fmt.device = kwargs["device"]
+                return fmt
+
+        return formats.getFormat(designator, **kwargs)
+
     def handleUdevDeviceFormat(self, info, device):
         log_method_call(self, name=getattr(device, "name", None))
 
@@ -1269,13 +1389,14 @@ class Populator(object):
             log.debug("no media present for device %s", device.name)
             return
 
+        sysfs_path = udev.device_get_sysfs_path(info)
+        self._formatSignatures[sysfs_path] = udev.device_get_format_signature(info)
+
         name = udev.device_get_name(info)
         uuid = udev.device_get_uuid(info)
-        label = udev.device_get_label(info)
         format_type = udev.device_get_format(info)
-        serial = udev.device_get_serial(info)
 
-        is_multipath_member = blockdev.mpath.is_mpath_member(device.path)
+        is_multipath_member = self._isMultipathMember(device)
         if is_multipath_member:
             format_type = "multipath_member"
 
@@ -1303,11 +1424,7 @@ class Populator(object):
 
         # set up the common arguments for the format constructor
         format_designator = format_type
-        kwargs = {"uuid": uuid,
-                  "label": label,
-                  "device": device.path,
-                  "serial": serial,
-                  "exists": True}
+        kwargs = self._getUdevFormatArgs(info, device.path)
 
         # set up type-specific arguments for the format constructor
         if format_type == "crypto_LUKS":
@@ -1368,7 +1485,7 @@ class Populator(object):
 
         try:
             log.info("type detected on '%s' is '%s'", name, format_designator)
-            device.format = formats.getFormat(format_designator, **kwargs)
+            device.format = self._getFormat(device, format_designator, kwargs)
             if device.format.type:
                 log.info("got format: %s", device.format)
         except FSError:
@@ -1403,6 +1520,89 @@ class Populator(object):
 
         self.handleUdevDeviceFormat(info, device)
 
+    def handleUdevEvents(self, events):
+        """ Update the device tree to reflect a series of udev events.
+
+            :param events: (action, info) pairs in the order they occurred
+            :type events: iterable of (str, :class:`pyudev.Device`)
+
+            Only the devices the events refer to and the devices built on
+            them are scanned again. Devices involved in scheduled actions
+            are left alone since the tree is expected to differ from the
+            system for them.
+        """
+        events = list(events)
+        for (_action, info) in events:
+            if udev.device_get_format(info) == "LVM2_member":
+                self.devicetree.dropLVMCache()
+            elif udev.device_is_dm_lvm(info):
+                self.devicetree.dropLVMCache(udev.device_get_lv_vg_name(info))
+
+        rescanned = set()
+        for (action, info) in events:
+            self._handleUdevEvent(action, info, rescanned)
+
+    def _handleUdevEvent(self, action, info, rescanned):
+        name = udev.device_get_name(info)
+        sysfs_path = udev.device_get_sysfs_path(info)
+        log.info("handling udev %s event for %s (%s)", action, name, sysfs_path)
+        if action not in ("add", "change", "remove"):
+            return
+
+        if action != "change" and udev.device_is_partition(info):
+            # the disklabel has to be read again to pick up the change
+            disk_path = os.path.dirname(sysfs_path)
+            disk = self.devicetree.getDeviceBySysfsPath(disk_path)
+            disk_info = udev.get_device(disk_path)
+            if disk and disk_info:
+                if disk not in rescanned and self._canUpdateDevice(disk):
+                    rescanned.add(disk)
+                    self._rescanDevice(disk, disk_info)
+
+                return
+
+        device = self.devicetree.getDeviceBySysfsPath(sysfs_path) or \
+                 self.getDeviceByName(name)
+        if action == "remove":
+            if device and self._canUpdateDevice(device):
+                self.devicetree.recursiveRemove(device, actions=False)
+                if self.devicetree._inTree(device):
+                    self.devicetree._removeDevice(device)
+
+            self._formatSignatures.pop(sysfs_path, None)
+        elif device is None:
+            self.addUdevDevice(info)
+        elif self._canUpdateDevice(device):
+            signature = udev.device_get_format_signature(info)
+            if signature != self._formatSignatures.get(sysfs_path):
+                self._rescanDevice(device, info)
+            else:
+                device.updateSize()
+                device.deviceLinks = udev.device_get_symlinks(info)
+
+    def _canUpdateDevice(self, device):
+        for dev in [device] + self.devicetree.getDependentDevices(device):
+            if self.devicetree.actions.find(device=dev):
+                log.warning("not updating %s: actions are scheduled for %s",
+                            device.name, dev.name)
+                return False
+
+        return True
+
+    def _rescanDevice(self, device, info):
+        """ Replace everything built on a device by a fresh scan. """
+        log.info("rescanning %s", device.name)
+        for child in self.devicetree.getChildren(device):
+            self.devicetree.recursiveRemove(child, actions=False)
+
+        device.format = None
+        self.handleUdevDeviceFormat(info, device)
+        device.originalFormat = copy.copy(device.format)
+        device.deviceLinks = udev.device_get_symlinks(info)
+        if device.partitioned:
+            for part_info in udev.device_get_partitions(info):
+                self.addUdevDevice(part_info)
+
     def _handleInconsistencies(self):
         for vg in [d for d in self.devicetree.devices if d.type == "lvmvg"]:
             if vg.complete:
@@ -1541,6 +1741,37 @@ class Populator(object):
             parted.clear_exn_handler()
             self.restoreConfigs()
 
+    def _sortUdevDevices(self, devices):
+        """ Return udev devices ordered so that devices follow their slaves.
+
+            :param devices: the devices' udev information
+            :type devices: list of :class:`pyudev.Device`
+            :returns: the same devices, sorted
+            :rtype: list of :class:`pyudev.Device`
+
+            Partitions are sorted after their disks and all other devices
+            after the devices listed in their sysfs slaves directory. Apart
+            from that the original order is kept.
+        """
+        by_path = dict((udev.device_get_sysfs_path(d), d) for d in devices)
+        paths = [udev.device_get_sysfs_path(d) for d in devices]
+        edges = []
+        for (path, info) in zip(paths, devices):
+            if udev.device_is_partition(info):
+                parents = [os.path.dirname(path)]
+            else:
+                parents = udev.device_get_slaves(info)
+
+            edges.extend((parent, path) for parent in parents
+                         if parent in by_path)
+
+        try:
+            paths = tsort.tsort(tsort.create_graph(paths, edges), stable=True)
+        except tsort.CyclicGraphError:
+            log.error("cycle in device dependencies, scanning in udev order")
+
+        return [by_path[path] for path in paths]
+
     def _populate(self):
         log.info("DeviceTree.populate: ignoredDisks is %s ; exclusiveDisks is %s",
                     self.ignoredDisks, self.exclusiveDisks)
@@ -1577,27 +1808,33 @@ class Populator(object):
             self.liveBackingDevice = live_device_name
             break
 
+        # Take a single snapshot of the block devices and scan them so that
+        # each device's slaves have been scanned before the device itself.
+        # Scanning can activate devices (md arrays, LUKS mappings, LVs), so
+        # look again only if new device nodes have shown up since.
         old_devices = {}
+        sys_names = set(udev.get_device_sys_names())
+        devices = udev.get_devices()
+        while devices:
+            for device in devices:
+                old_devices[udev.device_get_name(device)] = device
 
-        # Now, loop and scan for devices that have appeared since the two above
-        # blocks or since previous iterations.
-        while True:
-            devices = []
-            new_devices = udev.get_devices()
+            devices = self._sortUdevDevices(devices)
+            log.info("devices to scan: %s", [udev.device_get_name(d) for d in devices])
+            self._probeUdevDevices(devices)
+            for dev in devices:
+                self.addUdevDevice(dev)
 
-            for new_device in new_devices:
-                new_name = udev.device_get_name(new_device)
-                if new_name not in old_devices:
-                    old_devices[new_name] = new_device
-                    devices.append(new_device)
+            self._probes = {}
 
-            if len(devices) == 0:
-                # nothing is changing -- we are finished building devices
+            new_sys_names = set(udev.get_device_sys_names())
+            if new_sys_names.issubset(sys_names):
+                # nothing new appeared -- we are finished building devices
                 break
 
-            log.info("devices to scan: %s", [udev.device_get_name(d) for d in devices])
-            for dev in devices:
-                self.addUdevDevice(dev)
+            sys_names |= new_sys_names
+            devices = [d for d in udev.get_devices()
+                       if udev.device_get_name(d) not in old_devices]
 
         self.populated = True
 
@@ -23,11 +23,12 @@ import re
 import string           # pylint: disable=deprecated-module
 import locale
 import sys
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 
 from decimal import Decimal
 from decimal import InvalidOperation
 from decimal import ROUND_DOWN, ROUND_UP, ROUND_HALF_UP
+from threading import Lock
 import six
 
 from .errors import SizePlacesError
@@ -110,6 +111,93 @@ def _makeSpec(prefix, suffix, xlate, lowercase=True):
         word = prefix + suffix
         return _lowerASCII(word) if lowercase else word
 
+class _LRUCache(object):
+    """ A mapping holding a limited number of the most recently used items.
+
+        It is safe to use from multiple threads.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                return default
+
+            self._items[key] = value
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+# Tables of unit spec strings for parsing and formatting, see _getUnitTable
+_UnitTable = namedtuple("_UnitTable", ["specs", "abbrs", "symbols"])
+
+_unitTables = {}
+_parseCache = _LRUCache(1024)
+_humanReadableCache = _LRUCache(4096)
+_localeState = {"locale": None, "radix": "."}
+
+def _checkLocale():
+    """ Drop cached specs and strings if the locale has changed.
+
+        :returns: the current locale's radix character
+        :rtype: str
+    """
+    current = (locale.setlocale(locale.LC_MESSAGES, None),
+               locale.setlocale(locale.LC_NUMERIC, None))
+    if current != _localeState["locale"]:
+        _unitTables.clear()
+        _parseCache.clear()
+        _humanReadableCache.clear()
+        _localeState["radix"] = locale.nl_langinfo(locale.RADIXCHAR)
+        _localeState["locale"] = current
+
+    return _localeState["radix"]
+
+def _getUnitTable(xlate):
+    """ Return the spec strings of all units.
+
+        :param bool xlate: if True, use the current locale's spec strings
+        :rtype: :class:`_UnitTable`
+
+        specs maps lower-cased complete specs to units, abbrs lists the
+        lower-cased binary abbreviations and their units and symbols maps
+        units to the symbols used to display them.
+    """
+    table = _unitTables.get(xlate)
+    if table is None:
+        units = [_EMPTY_PREFIX] + _BINARY_PREFIXES + _DECIMAL_PREFIXES
+        specs = {}
+        # earlier units win where specs coincide
+        for unit in reversed(units):
+            specs[_makeSpec(unit.abbr, _BYTES_SYMBOL, xlate)] = unit
+            for word in _BYTES_WORDS:
+                specs[_makeSpec(unit.prefix, word, xlate)] = unit
+
+        abbrs = [(_makeSpec(p.abbr, "", xlate), p) for p in _BINARY_PREFIXES]
+        symbols = dict((unit, _makeSpec(unit.abbr, _BYTES_SYMBOL, xlate,
+                                        lowercase=False))
+                       for unit in units)
+        table = _UnitTable(specs, abbrs, symbols)
+        _unitTables[xlate] = table
+
+    return table
+
 def unitStr(unit, xlate=False):
     """ Return a string representation of unit.
 
@@ -143,14 +231,16 @@ def parseUnits(spec, xlate):
     else:
         spec = _lowerASCII(spec)
 
+    _checkLocale()
+    table = _getUnitTable(xlate)
+
     # Search for complete matches
-    for unit in [_EMPTY_PREFIX] + _BINARY_PREFIXES + _DECIMAL_PREFIXES:
-        if spec == _makeSpec(unit.abbr, _BYTES_SYMBOL, xlate) or \
-           spec in (_makeSpec(unit.prefix, s, xlate) for s in _BYTES_WORDS):
-            return unit
+    unit = table.specs.get(spec)
+    if unit is not None:
+        return unit
 
     # Search for unambiguous partial match among binary abbreviations
-    matches = [p for p in _BINARY_PREFIXES if _makeSpec(p.abbr, "", xlate).startswith(spec)]
+    matches = [p for (abbr, p) in table.abbrs if abbr.startswith(spec)]
     if len(matches) == 1:
         return matches[0]
 
@@ -167,14 +257,25 @@ def parseSpec(spec):
         :raises ValueError: if spec is unparseable
 
         Tries to parse the spec first as English, if that fails, as
-        a locale specific string.
+        a locale specific string. Results are cached until the locale
+        changes.
     """
+    _checkLocale()
+    size = _parseCache.get(spec)
+    if size is None:
+        size = _parseSpec(spec)
+        _parseCache[spec] = size
+
+    return size
+
+def _parseSpec(spec):
+    """ Parse string representation of size, bypassing the cache. """
 
     if not spec:
         raise ValueError("invalid size specification", spec)
 
     # Replace the localized radix character with a .
-    radix = locale.nl_langinfo(locale.RADIXCHAR)
+    radix = _checkLocale()
     if radix != '.':
         spec = spec.replace(radix, '.')
 
@@ -245,12 +346,13 @@ class Size(Decimal):
             If you want to use a spec value to represent a bytes value,
             you can use the letter 'b' or 'B' or omit the size specifier.
         """
-        if isinstance(value, (six.string_types, bytes)):
+        if isinstance(value, (Size,) + six.integer_types):
+            # already a whole number of bytes
+            return Decimal.__new__(cls, value=value, context=context)
+        elif isinstance(value, (six.string_types, bytes)):
             size = parseSpec(value)
-        elif isinstance(value, (six.integer_types, float, Decimal)):
+        elif isinstance(value, (float, Decimal)):
             size = Decimal(value)
-        elif isinstance(value, Size):
-            size = Decimal(value.convertTo())
         else:
             raise ValueError("invalid value %s for size" % value)
 
@@ -280,17 +382,29 @@ class Size(Decimal):
     def __reduce__(self):
         return (self.__class__, (self.convertTo(),))
 
+    # Sizes are always whole numbers of bytes, so the results of adding,
+    # subtracting, multiplying, floor dividing or taking the remainder of
+    # Sizes and ints are too and need no rounding. Take a shortcut past the
+    # type checks and rounding in __new__ for those.
     def __add__(self, other, context=None):
+        if isinstance(other, _INTEGRAL_TYPES):
+            return Decimal.__new__(Size, Decimal.__add__(self, other))
         return Size(Decimal.__add__(self, other))
 
     # needed to make sum() work with Size arguments
     def __radd__(self, other, context=None):
+        if isinstance(other, _INTEGRAL_TYPES):
+            return Decimal.__new__(Size, Decimal.__radd__(self, other))
         return Size(Decimal.__radd__(self, other))
 
     def __sub__(self, other, context=None):
+        if isinstance(other, _INTEGRAL_TYPES):
+            return Decimal.__new__(Size, Decimal.__sub__(self, other))
         return Size(Decimal.__sub__(self, other))
 
     def __mul__(self, other, context=None):
+        if isinstance(other, _INTEGRAL_TYPES):
+            return Decimal.__new__(Size, Decimal.__mul__(self, other))
         return Size(Decimal.__mul__(self, other))
     __rmul__ = __mul__
 
@@ -306,9 +420,13 @@ class Size(Decimal):
         return Size(Decimal.__truediv__(self, other))
 
     def __floordiv__(self, other, context=None):
+        if isinstance(other, _INTEGRAL_TYPES):
+            return Decimal.__new__(Size, Decimal.__floordiv__(self, other))
         return Size(Decimal.__floordiv__(self, other))
 
     def __mod__(self, other, context=None):
+        if isinstance(other, _INTEGRAL_TYPES):
+            return Decimal.__new__(Size, Decimal.__mod__(self, other))
         return Size(Decimal.__mod__(self, other))
 
     def convertTo(self, spec=None):
@@ -318,7 +436,11 @@ class Size(Decimal):
             :returns: a numeric value in the units indicated by the specifier
             :rtype: Decimal
         """
-        return Decimal(self) / Decimal((spec or B).factor)
+        factor = (spec or B).factor
+        if factor == 1:
+            return Decimal(self)
+
+        return Decimal(self) / Decimal(factor)
 
     def humanReadable(self, max_places=2, strip=True, min_value=1, xlate=True):
         """ Return a string representation of this size with appropriate
@@ -363,6 +485,12 @@ class Size(Decimal):
         if min_value < 0 or not isinstance(min_value, (six.integer_types, Decimal)):
             raise ValueError("min_value must be a precise positive numeric value.")
 
+        radix = _checkLocale()
+        key = (self, max_places, strip, min_value, xlate)
+        retval = _humanReadableCache.get(key)
+        if retval is not None:
+            return retval
+
         # Find the smallest prefix which will allow a number less than
         # _BINARY_FACTOR * min_value to the left of the decimal point.
         # If the number is so large that no prefix will satisfy this
@@ -382,13 +510,13 @@ class Size(Decimal):
         if '.' in retval_str and strip:
             retval_str = retval_str.rstrip("0").rstrip(".")
 
-        if xlate:
-            radix = locale.nl_langinfo(locale.RADIXCHAR)
-            if radix != '.':
-                retval_str = retval_str.replace('.', radix)
+        if xlate and radix != '.':
+            retval_str = retval_str.replace('.', radix)
 
         # pylint: disable=undefined-loop-variable
-        return retval_str + " " + _makeSpec(unit.abbr, _BYTES_SYMBOL, xlate, lowercase=False)
+        retval = retval_str + " " + _getUnitTable(xlate).symbols[unit]
+        _humanReadableCache[key] = retval
+        return retval
 
     def roundToNearest(self, unit, rounding=ROUND_DEFAULT):
         """ Rounds to nearest unit specified as a named constant or a Size.
@@ -416,3 +544,6 @@ class Size(Decimal):
 
         rounded = (Decimal(self) / factor).to_integral_value(rounding=rounding)
         return Size(rounded * factor)
+
+# types whose sums, differences and products with a Size are whole numbers
+_INTEGRAL_TYPES = (Size,) + six.integer_types
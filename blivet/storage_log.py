@@ -1,4 +1,3 @@
-import inspect
 import logging
 import sys
 import traceback
@@ -6,20 +5,45 @@ import traceback
 log = logging.getLogger("blivet")
 log.addHandler(logging.NullHandler())
 
+IGNORED_FUNCS = frozenset(["function_name_and_depth",
+                           "log_method_call",
+                           "log_method_return"])
+
 def function_name_and_depth():
-    IGNORED_FUNCS = ["function_name_and_depth",
-                     "log_method_call",
-                     "log_method_return"]
-    stack = inspect.stack()
+    frame = sys._getframe()  # pylint: disable=protected-access
+    while frame is not None and frame.f_code.co_name in IGNORED_FUNCS:
+        frame = frame.f_back
+
+    if frame is None:
+        return ("unknown function?", 0)
+
+    methodname = frame.f_code.co_name
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+
+    return (methodname, depth)
 
-    for i, frame in enumerate(stack):
-        methodname = frame[3]
-        if methodname not in IGNORED_FUNCS:
-            return (methodname, len(stack) - i)
+class DeferredFormat(object):
+    """ A log message argument that is only formatted if it gets logged.
 
-    return ("unknown function?", 0)
+        :param func: a function returning the argument's text
+        :param args: positional arguments for func
+        :param kwargs: keyword arguments for func
+    """
+    def __init__(self, func, *args, **kwargs):
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+
+    def __str__(self):
+        return str(self._func(*self._args, **self._kwargs))
 
 def log_method_call(d, *args, **kwargs):
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+
     classname = d.__class__.__name__
     (methodname, depth) = function_name_and_depth()
     spaces = depth * ' '
@@ -39,6 +63,9 @@ def log_method_call(d, *args, **kwargs):
     log.debug(fmt, *fmt_args)
 
 def log_method_return(d, retval):
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+
     classname = d.__class__.__name__
     (methodname, depth) = function_name_and_depth()
     spaces = depth * ' '
@@ -20,41 +20,67 @@
 # Red Hat Author(s): Dave Lehman <dlehman@redhat.com>
 #
 
+import heapq
+
 class CyclicGraphError(Exception):
     pass
 
-def tsort(graph):
+def tsort(graph, stable=False):
+    """ Sort the items in a graph so that parents come before their children.
+
+        :param graph: a graph as returned by :func:`create_graph`
+        :type graph: dict
+        :keyword stable: keep items in their original relative order wherever
+                         the edges allow it
+        :type stable: bool
+        :returns: the sorted items
+        :rtype: list
+        :raises: :class:`CyclicGraphError` if the graph contains cycles
+
+        The graph is not modified.
+    """
     order = []  # sorted list of items
 
     if not graph or not graph['items']:
         return order
 
+    incoming = dict(graph['incoming'])
+    children = dict((n, []) for n in graph['items'])
+    for (parent, child) in graph['edges']:
+        children[parent].append(child)
+
     # determine which nodes have no incoming edges
-    roots = [n for n in graph['items'] if graph['incoming'][n] == 0]
+    if stable:
+        position = dict((n, i) for (i, n) in enumerate(graph['items']))
+        roots = [(position[n], n) for n in graph['items'] if incoming[n] == 0]
+        heapq.heapify(roots)
+    else:
+        roots = [n for n in graph['items'] if incoming[n] == 0]
+
     if not roots:
         raise CyclicGraphError("no root nodes")
 
-    visited = []    # list of nodes visited, for cycle detection
     while roots:
         # remove a root, add it to the order
-        root = roots.pop()
-        if root in visited:
-            raise CyclicGraphError("graph contains cycles")
+        if stable:
+            root = heapq.heappop(roots)[1]
+        else:
+            root = roots.pop()
 
-        visited.append(root)
         order.append(root)
         # remove each edge from the root to another node
-        for (parent, child) in [e for e in graph['edges'] if e[0] == root]:
-            graph['incoming'][child] -= 1
-            graph['edges'].remove((parent, child))
+        for child in children[root]:
+            incoming[child] -= 1
             # if destination node is now a root, add it to roots
-            if graph['incoming'][child] == 0:
-                roots.append(child)
+            if incoming[child] == 0:
+                if stable:
+                    heapq.heappush(roots, (position[child], child))
+                else:
+                    roots.append(child)
 
-    if len(graph['items']) != len(visited):
+    if len(graph['items']) != len(order):
         raise CyclicGraphError("graph contains cycles")
 
-
     return order
 
 def create_graph(items, edges):
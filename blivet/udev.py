@@ -23,6 +23,8 @@
 
 import os
 import re
+import time
+from threading import Lock
 
 from . import util
 from .size import Size
@@ -51,11 +53,99 @@ def get_devices(subsystem="block"):
     return [d for d in global_udev.list_devices(subsystem=subsystem)
                         if not __is_blacklisted_blockdev(d.sys_name)]
 
-def settle():
+def get_device_sys_names(subsystem="block"):
+    """ Return the sysfs names of the devices currently in a subsystem.
+
+        This only lists a sysfs directory, so unlike :func:`get_devices` it
+        neither waits for udev nor reads the udev database.
+    """
+    try:
+        return os.listdir("/sys/class/%s" % subsystem)
+    except OSError:
+        return []
+
+def get_monitor(subsystem="block"):
+    """ Return a monitor for the kernel's udev events in a subsystem.
+
+        The monitor has to be started before it delivers any events. The
+        events it delivers can be passed to
+        :meth:`~.devicetree.DeviceTree.handleUdevEvents`.
+    """
+    monitor = pyudev.Monitor.from_netlink(global_udev)
+    monitor.filter_by(subsystem)
+    return monitor
+
+class SettleStats(object):
+    """ Counts of udev settles and of the time spent waiting for them. """
+
+    def __init__(self):
+        self.calls = 0          # settles that ran udevadm
+        self.skipped = 0        # settles skipped as redundant
+        self.time = 0.0         # seconds spent waiting in udevadm settle
+
+    def reset(self):
+        self.calls = 0
+        self.skipped = 0
+        self.time = 0.0
+
+    def copy(self):
+        stats = SettleStats()
+        stats.calls = self.calls
+        stats.skipped = self.skipped
+        stats.time = self.time
+        return stats
+
+    def __str__(self):
+        return "%d udev settles (%d skipped) took %.2f seconds" % \
+               (self.calls, self.skipped, self.time)
+
+settle_stats = SettleStats()
+
+UEVENT_SEQNUM = "/sys/kernel/uevent_seqnum"
+
+_settle_lock = Lock()
+_settled_seqnum = [None]
+
+def uevent_seqnum():
+    """ Return the sequence number of the last uevent sent by the kernel.
+
+        :returns: the sequence number, or None if it cannot be read
+        :rtype: int or NoneType
+    """
+    try:
+        with open(UEVENT_SEQNUM) as f:
+            return int(f.read())
+    except (IOError, ValueError):
+        return None
+
+def settle(force=False):
+    """ Wait for udev to finish processing the queued uevents.
+
+        :keyword bool force: run udevadm settle even if the kernel has not
+                             sent any uevents since the last settle
+
+        Once a settle has finished, every uevent up to the sequence number
+        read before it started has been processed, so another settle is
+        redundant until the kernel sends a new uevent.
+    """
+    seqnum = uevent_seqnum()
+    with _settle_lock:
+        if not force and seqnum is not None and seqnum == _settled_seqnum[0]:
+            settle_stats.skipped += 1
+            return
+
     # wait maximal 300 seconds for udev to be done running blkid, lvm,
     # mdadm etc. This large timeout is needed when running on machines with
     # lots of disks, or with slow disks
-    util.run_program(["udevadm", "settle", "--timeout=300"])
+    start = time.time()
+    rc = util.run_program(["udevadm", "settle", "--timeout=300"])
+    elapsed = time.time() - start
+
+    with _settle_lock:
+        settle_stats.calls += 1
+        settle_stats.time += elapsed
+        if rc == 0 and seqnum is not None:
+            _settled_seqnum[0] = max(seqnum, _settled_seqnum[0] or 0)
 
 def trigger(subsystem=None, action="add", name=None):
     argv = ["trigger", "--action=%s" % action]
@@ -163,6 +253,19 @@ def device_get_uuid(udev_info):
     """
     return udev_info.get("ID_FS_UUID")
 
+def device_get_format_signature(udev_info):
+    """ Get the udev properties that identify a device's formatting.
+
+        Two signatures of the same device only differ if the formatting
+        changed in some way that requires it to be scanned again.
+    """
+    return tuple(udev_info.get(key) for key in ("ID_FS_TYPE",
+                                                "ID_FS_UUID",
+                                                "ID_FS_UUID_SUB",
+                                                "ID_FS_LABEL",
+                                                "ID_PART_TABLE_TYPE",
+                                                "ID_PART_TABLE_UUID"))
+
 def device_get_label(udev_info):
     """ Get the label from the device's format as reported by udev. """
     return udev_info.get("ID_FS_LABEL")
@@ -315,6 +418,47 @@ def device_get_by_path(info):
 def device_get_sysfs_path(info):
     return info.sys_path
 
+def device_get_slaves(info):
+    """ Get the sysfs paths of the devices a device is built on.
+
+        :param info: a :class:`pyudev.Device` instance
+        :returns: sysfs paths of the device's slaves
+        :rtype: list of str
+    """
+    slave_dir = os.path.normpath("%s/slaves" % device_get_sysfs_path(info))
+    try:
+        slave_names = os.listdir(slave_dir)
+    except OSError:
+        return []
+
+    return [os.path.realpath("%s/%s" % (slave_dir, slave_name))
+            for slave_name in slave_names]
+
+def device_get_partitions(info):
+    """ Get the udev information of a disk's partitions.
+
+        :param info: a :class:`pyudev.Device` instance
+        :returns: the partitions' udev information
+        :rtype: list of :class:`pyudev.Device`
+    """
+    sysfs_path = device_get_sysfs_path(info)
+    try:
+        names = sorted(os.listdir(sysfs_path))
+    except OSError:
+        return []
+
+    partitions = []
+    for name in names:
+        path = os.path.normpath("%s/%s" % (sysfs_path, name))
+        if not os.path.exists("%s/start" % path):
+            continue
+
+        part_info = get_device(path)
+        if part_info:
+            partitions.append(part_info)
+
+    return partitions
+
 def device_get_major(info):
     return int(info["MAJOR"])
 
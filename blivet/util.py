@@ -21,59 +21,115 @@ import logging
 log = logging.getLogger("blivet")
 program_log = logging.getLogger("program")
 
-from threading import Lock
+from threading import BoundedSemaphore, Lock, Thread, Timer
 # this will get set to anaconda's program_log_lock in enable_installer_mode
 program_log_lock = Lock()
 
+# limits the number of external programs running at once
+_program_slots = None
 
-def _run_program(argv, root='/', stdin=None, env_prune=None, stderr_to_stdout=False, binary_output=False):
+def set_program_concurrency(limit=None):
+    """ Limit the number of external programs that run at the same time.
+
+        :keyword limit: the maximum number of programs or None for no limit
+        :type limit: int or NoneType
+    """
+    global _program_slots # pylint: disable=global-statement
+    _program_slots = BoundedSemaphore(limit) if limit else None
+
+def _run_program(argv, root='/', stdin=None, env_prune=None, stderr_to_stdout=False, binary_output=False, timeout=None):
+    """ Run an external program and log its output.
+
+        :keyword timeout: seconds after which the program gets killed
+        :type timeout: int or float or NoneType
+
+        program_log_lock is only held while logging, so programs run from
+        different threads run in parallel. A program's output is logged
+        in one piece once it has finished, together with the command line
+        since other programs may have been started in the meantime. A
+        program that gets killed because of the timeout returns the
+        negative signal number.
+    """
     if env_prune is None:
         env_prune = []
 
     def chroot():
-        if root and root != '/':
-            os.chroot(root)
+        os.chroot(root)
 
+    cmd = " ".join(argv)
     with program_log_lock:
-        program_log.info("Running... %s", " ".join(argv))
+        program_log.info("Running... %s", cmd)
 
-        env = os.environ.copy()
-        env.update({"LC_ALL": "C",
-                    "INSTALL_PATH": root})
-        for var in env_prune:
-            env.pop(var, None)
+    env = os.environ.copy()
+    env.update({"LC_ALL": "C",
+                "INSTALL_PATH": root})
+    for var in env_prune:
+        env.pop(var, None)
 
-        if stderr_to_stdout:
-            stderr_dir = subprocess.STDOUT
-        else:
-            stderr_dir = subprocess.PIPE
-        try:
-            proc = subprocess.Popen(argv,
-                                    stdin=stdin,
-                                    stdout=subprocess.PIPE,
-                                    stderr=stderr_dir,
-                                    close_fds=True,
-                                    preexec_fn=chroot, cwd=root, env=env)
+    if stderr_to_stdout:
+        stderr_dir = subprocess.STDOUT
+    else:
+        stderr_dir = subprocess.PIPE
 
+    # preexec_fn is not safe to use with threads, so avoid it if possible
+    preexec_fn = chroot if root and root != '/' else None
+
+    timed_out = []
+    slots = _program_slots
+    if slots:
+        slots.acquire()
+    try:
+        proc = subprocess.Popen(argv,
+                                stdin=stdin,
+                                stdout=subprocess.PIPE,
+                                stderr=stderr_dir,
+                                close_fds=True,
+                                preexec_fn=preexec_fn, cwd=root, env=env)
+
+        def kill():
+            timed_out.append(True)
+            proc.kill()
+
+        timer = None
+        if timeout:
+            timer = Timer(timeout, kill)
+            timer.daemon = True
+            timer.start()
+
+        try:
             out, err = proc.communicate()
-            if not binary_output and six.PY3:
-                out = out.decode("utf-8")
-            if out:
-                if not stderr_to_stdout:
-                    program_log.info("stdout:")
-                for line in out.splitlines():
-                    program_log.info("%s", line)
-
-            if not stderr_to_stdout and err:
-                program_log.info("stderr:")
-                for line in err.splitlines():
-                    program_log.info("%s", line)
-
-        except OSError as e:
+        finally:
+            if timer:
+                timer.cancel()
+    except OSError as e:
+        with program_log_lock:
             program_log.error("Error running %s: %s", argv[0], e.strerror)
-            raise
+        raise
+    finally:
+        if slots:
+            slots.release()
+
+    if not binary_output and six.PY3:
+        out = out.decode("utf-8")
+
+    with program_log_lock:
+        if out:
+            if stderr_to_stdout:
+                program_log.info("%s: output:", cmd)
+            else:
+                program_log.info("%s: stdout:", cmd)
+            for line in out.splitlines():
+                program_log.info("%s", line)
+
+        if not stderr_to_stdout and err:
+            program_log.info("%s: stderr:", cmd)
+            for line in err.splitlines():
+                program_log.info("%s", line)
 
-        program_log.debug("Return code: %d", proc.returncode)
+        if timed_out:
+            program_log.error("%s killed after %s seconds", argv[0], timeout)
+
+        program_log.debug("%s: return code: %d", cmd, proc.returncode)
 
     return (proc.returncode, out)
 
@@ -620,3 +676,53 @@ def eintr_retry_call(func, *args):
             if e.errno == errno.EINTR:
                 continue
             raise
+
+def parallel_map(func, items, workers=1):
+    """ Call a function for each of a list of items using a pool of threads.
+
+        :param func: the function to call with each item
+        :type func: callable
+        :param items: the items
+        :type items: iterable
+        :keyword int workers: the maximum number of threads to use
+        :returns: the return values of func in the order of the items
+        :rtype: list
+
+        If any of the calls raise an exception, the one raised for the
+        earliest item is re-raised once all calls have finished. With fewer
+        than two workers func is simply called for each item in turn.
+    """
+    items = list(items)
+    if workers < 2 or len(items) < 2:
+        return [func(item) for item in items]
+
+    results = [None] * len(items)
+    errors = []
+    pending = six.moves.queue.Queue()
+    for idx in range(len(items)):
+        pending.put(idx)
+
+    def worker():
+        while True:
+            try:
+                idx = pending.get_nowait()
+            except six.moves.queue.Empty:
+                return
+
+            try:
+                results[idx] = func(items[idx])
+            except Exception: # pylint: disable=broad-except
+                errors.append((idx, sys.exc_info()))
+
+    threads = [Thread(target=worker) for _i in range(min(workers, len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        six.reraise(*min(errors, key=lambda e: e[0])[1])
+
+    return results
@@ -0,0 +1,367 @@
+#!/usr/bin/python
+
+import threading
+import time
+import unittest
+import mock
+import parted
+
+from blivet import tsort
+from blivet.actionlist import ActionList
+from blivet.callbacks import event_callbacks
+from blivet.deviceaction import ActionCreateDevice
+from blivet.deviceaction import ActionCreateFormat
+from blivet.deviceaction import ActionDestroyDevice
+from blivet.deviceaction import ActionDestroyFormat
+from blivet.deviceaction import ActionAddMember
+from blivet.deviceaction import ACTION_TYPE_CREATE, ACTION_TYPE_DESTROY
+from blivet.devices import DiskDevice, PartitionDevice, StorageDevice
+from blivet.errors import DiskLabelCommitError
+from blivet.devices import LVMLogicalVolumeDevice, LVMVolumeGroupDevice
+from blivet.formats import getFormat
+from blivet.size import Size
+
+def makeActions(vgs=2, lvs=4):
+    """ Return a list of actions reworking a synthetic set of volume groups.
+
+        Every volume group gets a new member. Half of each volume group's
+        logical volumes are destroyed and replaced by new ones.
+    """
+    actions = []
+    for i in range(vgs):
+        pv = StorageDevice("pv%d" % i, size=Size("10 GiB"), exists=True,
+                           fmt=getFormat("lvmpv", exists=True))
+        vg = LVMVolumeGroupDevice("vg%d" % i, parents=[pv], exists=True)
+        new_pv = StorageDevice("newpv%d" % i, size=Size("10 GiB"),
+                               exists=True)
+        actions.append(ActionCreateFormat(new_pv, getFormat("lvmpv")))
+        actions.append(ActionAddMember(vg, new_pv))
+        for j in range(lvs):
+            lv = LVMLogicalVolumeDevice("lv%d" % j, parents=[vg], exists=True,
+                                        size=Size("1 GiB"),
+                                        fmt=getFormat("ext4", exists=True))
+            if j % 2:
+                continue
+
+            actions.append(ActionDestroyFormat(lv))
+            actions.append(ActionDestroyDevice(lv))
+            lv = LVMLogicalVolumeDevice("new%d" % j, parents=[vg],
+                                        size=Size("1 GiB"))
+            actions.append(ActionCreateDevice(lv))
+            actions.append(ActionCreateFormat(lv, getFormat("xfs")))
+
+    return actions
+
+def requiredEdges(actions):
+    """ Return every (required, requiring) pair of action indices. """
+    return [(i, j) for (i, action) in enumerate(actions)
+                   for (j, _action) in enumerate(actions)
+                   if i != j and _action.requires(action)]
+
+def legacySort(actions):
+    """ Sort actions by comparing every pair of them. """
+    graph = tsort.create_graph(list(range(len(actions))), requiredEdges(actions))
+    return [actions[idx] for idx in tsort.tsort(graph)]
+
+class ActionListTestCase(unittest.TestCase):
+    def setUp(self):
+        self.actions = makeActions(vgs=2, lvs=2)
+        self.action_list = ActionList()
+        for action in self.actions:
+            self.action_list.append(action)
+
+    def testFind(self):
+        action_list = self.action_list
+        self.assertEqual(action_list.find(), self.actions)
+
+        destroys = [a for a in self.actions if a.isDestroy]
+        self.assertEqual(action_list.find(action_type="destroy"), destroys)
+        self.assertEqual(action_list.find(action_type="destroy",
+                                          object_type="device"),
+                         [a for a in destroys if a.isDevice])
+
+        lv = destroys[0].device
+        self.assertEqual(action_list.find(device=lv), destroys[:2])
+        self.assertEqual(action_list.find(devid=lv.id,
+                                          object_type="format"),
+                         destroys[:1])
+        self.assertEqual(action_list.find(path=lv.path), destroys[:2])
+        self.assertEqual(action_list.find(device=lv, devid=lv.id + 1), [])
+
+        action_list.remove(destroys[0])
+        self.assertEqual(action_list.find(device=lv), destroys[1:2])
+        self.assertNotIn(destroys[0], action_list.find(action_type="destroy"))
+        self.assertEqual(len(list(action_list)), len(self.actions) - 1)
+
+    def testPrune(self):
+        # destroying a device that does not exist yet obsoletes all actions
+        # on it, including the destroy action itself
+        created = [a for a in self.actions if a.isCreate and a.isDevice]
+        lv = created[0].device
+        self.action_list.append(ActionDestroyDevice(lv))
+        self.action_list.prune()
+
+        self.assertEqual(self.action_list.find(device=lv), [])
+        self.assertEqual(list(self.action_list),
+                         [a for a in self.actions if a.device is not lv])
+
+    def testPruneContainer(self):
+        # destroying a container obsoletes the addition of members to it
+        add = [a for a in self.actions if a.isAdd][0]
+        vg = add.container
+        self.action_list.append(ActionDestroyDevice(vg))
+        self.action_list.prune()
+
+        self.assertNotIn(add, list(self.action_list))
+        self.assertEqual(self.action_list.find(device=add.device),
+                         [a for a in self.actions
+                          if a.device is add.device and a is not add])
+
+class ActionSortTestCase(unittest.TestCase):
+    def _sort(self, actions):
+        action_list = ActionList()
+        for action in actions:
+            action_list.append(action)
+
+        action_list.sort()
+        return list(action_list)
+
+    def testSort(self):
+        actions = makeActions()
+        order = self._sort(actions)
+        self.assertEqual(sorted(a.id for a in order),
+                         sorted(a.id for a in actions))
+
+        # every requirement found by comparing all pairs of actions must hold
+        for (i, j) in requiredEdges(actions):
+            self.assertLess(order.index(actions[i]), order.index(actions[j]),
+                            "%s should precede %s" % (actions[i], actions[j]))
+
+    def testSortStable(self):
+        actions = makeActions()
+        destroys = [a for a in actions if a.isDestroy]
+        self.assertEqual([a for a in self._sort(actions) if a.isDestroy],
+                         destroys)
+
+class ActionProcessTestCase(unittest.TestCase):
+    """ Verify parallel execution of independent actions. """
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = []
+        self.intervals = {}
+        self.failing = None
+        self.actions = []
+        self.action_list = ActionList()
+        for i in range(4):
+            disk = DiskDevice("sd%s" % "abcd"[i], size=Size("10 GiB"))
+            for j in range(2):
+                device = StorageDevice("%s%d" % (disk.name, j), exists=True,
+                                       parents=[disk], size=Size("1 GiB"))
+                action = ActionCreateFormat(device, getFormat("ext4"))
+                self.actions.append(action)
+                self.action_list.append(action)
+
+        test = self
+        def execute(action, callbacks=None):
+            # pylint: disable=unused-argument
+            start = time.time()
+            with test.lock:
+                test.running.append(action)
+                test.intervals[action] = [start, None]
+
+            time.sleep(0.1)
+            with test.lock:
+                test.running.remove(action)
+                test.intervals[action][1] = time.time()
+
+            if action is test.failing:
+                raise RuntimeError("failed")
+
+        patcher = mock.patch.object(ActionCreateFormat, "execute", execute)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def testParallel(self):
+        start = time.time()
+        self.action_list.process(workers=4)
+        self.assertLess(time.time() - start, 0.6)
+        self.assertEqual(self.action_list._completed_actions, self.actions)
+        self.assertEqual(list(self.action_list), [])
+
+        # actions on the same disk do not overlap and keep their order
+        for (first, second) in zip(self.actions[::2], self.actions[1::2]):
+            self.assertLessEqual(self.intervals[first][1],
+                                 self.intervals[second][0])
+
+    def testFailure(self):
+        self.failing = self.actions[0]
+        with self.assertRaises(RuntimeError):
+            self.action_list.process(workers=4)
+
+        # no actions are started after a failure
+        completed = self.action_list._completed_actions
+        self.assertNotIn(self.actions[1], self.intervals)
+        self.assertNotIn(self.actions[0], completed)
+        self.assertEqual(completed, [a for a in self.actions
+                                     if a in self.intervals and
+                                     a is not self.actions[0]])
+        self.assertEqual(list(self.action_list),
+                         [a for a in self.actions if a not in completed])
+
+class ActionBatchTestCase(unittest.TestCase):
+    """ Verify batching of disklabel commits for runs of partition actions. """
+    def setUp(self):
+        self.events = []
+        patcher = mock.patch("blivet.formats.disklabel.udev")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(ActionList, "_preProcess")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        def executed(action):
+            self.events.append("executed %d" % action.device.id)
+
+        event_callbacks.action_executed.add(executed)
+        self.addCleanup(event_callbacks.action_executed.remove, executed)
+
+    def _disk(self, name, failures=0):
+        label = getFormat("disklabel", device="/dev/%s" % name, labelType="gpt")
+        label._partedDisk = mock.Mock(partitions=[])
+        failures = [failures]
+
+        def commit():
+            self.events.append("commit")
+            if failures[0]:
+                failures[0] -= 1
+                raise parted.DiskException("failed")
+
+        label._partedDisk.commit.side_effect = commit
+        return mock.Mock(format=label, originalFormat=label)
+
+    def _action(self, disk, action_type, isDevice=True, num=0, failing=False):
+        device = mock.Mock(spec=PartitionDevice, disk=disk, disks=[disk],
+                           id=num, exists=False, dependents=[])
+        action = mock.Mock(type=action_type, device=device,
+                           isDevice=isDevice, isFormat=not isDevice,
+                           isContainer=False,
+                           isCreate=action_type == ACTION_TYPE_CREATE,
+                           isDestroy=action_type == ACTION_TYPE_DESTROY)
+        action.requires.return_value = False
+
+        def execute(callbacks=None):
+            # pylint: disable=unused-argument
+            self.events.append("execute %d" % num)
+            if failing:
+                raise RuntimeError("failed")
+
+            if not isDevice:
+                # wiping a format leaves the disklabel alone
+                return
+
+            disk.format.commit(undo=lambda: self.events.append("undo %d" % num))
+            disk.format.afterCommit(lambda: self.events.append("post %d" % num))
+
+        action.execute.side_effect = execute
+        return action
+
+    def testRuns(self):
+        (sda, sdb) = (self._disk("sda"), self._disk("sdb"))
+        actions = [self._action(sda, ACTION_TYPE_DESTROY, isDevice=False),
+                   self._action(sda, ACTION_TYPE_DESTROY),
+                   self._action(sda, ACTION_TYPE_DESTROY, isDevice=False),
+                   self._action(sda, ACTION_TYPE_DESTROY),
+                   self._action(sdb, ACTION_TYPE_DESTROY),
+                   self._action(sda, ACTION_TYPE_CREATE),
+                   self._action(sda, ACTION_TYPE_CREATE),
+                   self._action(sda, ACTION_TYPE_CREATE, isDevice=False),
+                   self._action(sda, ACTION_TYPE_CREATE)]
+        runs = ActionList._batchRuns(actions)
+        self.assertEqual(runs, {1: (1, 3), 2: (1, 3), 3: (1, 3),
+                                5: (5, 6), 6: (5, 6)})
+
+    def testBatchedCommit(self):
+        sda = self._disk("sda")
+        action_list = ActionList()
+        for num in range(3):
+            action_list.append(self._action(sda, ACTION_TYPE_CREATE, num=num))
+
+        action_list.process()
+        # the actions are only reported as executed once they are committed
+        self.assertEqual(self.events,
+                         ["execute 0", "execute 1", "execute 2", "commit",
+                          "post 0", "post 1", "post 2",
+                          "executed 0", "executed 1", "executed 2"])
+        self.assertFalse(sda.format.batching)
+
+        # without batching each commit happens right away
+        del self.events[:]
+        sda.format.commit()
+        sda.format.afterCommit(lambda: self.events.append("post"))
+        self.assertEqual(self.events, ["commit", "post"])
+
+    def testBatchFailure(self):
+        sda = self._disk("sda")
+        action_list = ActionList()
+        for num in range(3):
+            action_list.append(self._action(sda, ACTION_TYPE_CREATE, num=num,
+                                            failing=num == 1))
+
+        with self.assertRaises(RuntimeError):
+            action_list.process()
+
+        # the run's changes are reverted and none of its actions are done
+        self.assertEqual(self.events,
+                         ["execute 0", "execute 1", "undo 0"])
+        self.assertFalse(sda.format.batching)
+        self.assertEqual(action_list._completed_actions, [])
+        self.assertEqual(len(list(action_list)), 3)
+
+    def testFormatDestroyInRun(self):
+        for workers in (1, 2):
+            del self.events[:]
+            sda = self._disk("sda")
+            action_list = ActionList()
+            actions = [self._action(sda, ACTION_TYPE_DESTROY, num=0),
+                       self._action(sda, ACTION_TYPE_DESTROY, isDevice=False,
+                                    num=1),
+                       self._action(sda, ACTION_TYPE_DESTROY, num=2,
+                                    failing=True)]
+            for action in actions:
+                action_list.append(action)
+
+            with self.assertRaises(RuntimeError):
+                action_list.process(workers=workers)
+
+            # the partition is back but the wiped format is gone for good
+            self.assertEqual(self.events,
+                             ["execute 0", "execute 1", "executed 1",
+                              "execute 2", "undo 0"])
+            self.assertEqual(action_list._completed_actions, [actions[1]])
+            self.assertEqual(list(action_list), [actions[0], actions[2]])
+
+    def testCommitFailure(self):
+        sda = self._disk("sda", failures=2)
+        action_list = ActionList()
+        for num in range(3):
+            action_list.append(self._action(sda, ACTION_TYPE_CREATE, num=num))
+
+        with self.assertRaises(DiskLabelCommitError):
+            action_list.process()
+
+        # the commit is retried once, then the changes are reverted
+        self.assertEqual(self.events,
+                         ["execute 0", "execute 1", "execute 2", "commit",
+                          "commit", "undo 2", "undo 1", "undo 0"])
+        self.assertFalse(sda.format.batching)
+        self.assertEqual(action_list._completed_actions, [])
+
+        # a single commit that fails is reverted right away
+        del self.events[:]
+        sda = self._disk("sda", failures=1)
+        with self.assertRaises(DiskLabelCommitError):
+            sda.format.commit(undo=lambda: self.events.append("undo"))
+        self.assertEqual(self.events, ["commit", "undo"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+import unittest
+
+from mock import patch
+
+from blivet import arch
+from blivet.arch import HardwareInfo
+
+PMAC_CPUINFO = """\
+processor	: 0
+cpu		: 7447A, altivec supported
+pmac-generation	: NewWorld
+
+platform	: PowerMac
+model		: PowerBook5,8
+machine		: PowerBook5,8
+"""
+
+class HardwareInfoTestCase(unittest.TestCase):
+    def tearDown(self):
+        arch.setHardwareInfo(None)
+
+    def testOverride(self):
+        arch.setHardwareInfo(HardwareInfo(machine="ppc", cpuinfo=PMAC_CPUINFO))
+        self.assertTrue(arch.isPPC(bits=32))
+        self.assertFalse(arch.isX86())
+        self.assertEqual(arch.getArch(), "ppc")
+        self.assertEqual(arch.getPPCMachine(), "PMac")
+        self.assertEqual(arch.getPPCMacID(), "PowerBook5,8")
+        self.assertEqual(arch.getPPCMacGen(), "NewWorld")
+        self.assertTrue(arch.getPPCMacBook())
+        self.assertFalse(arch.isCell())
+
+        arch.setHardwareInfo(HardwareInfo(machine="x86_64",
+                                          dmiChassisVendor="Apple Inc.",
+                                          efi=True))
+        self.assertEqual(arch.getArch(), "x86_64")
+        self.assertTrue(arch.isMactel())
+        self.assertTrue(arch.isEfi())
+        self.assertIsNone(arch.getPPCMachine())
+
+        arch.setHardwareInfo(HardwareInfo(machine="armv7l",
+                                          kernelRelease="4.2.0-1.fc23.armv7hl.omap"))
+        self.assertEqual(arch.getArch(), "arm")
+        self.assertEqual(arch.getARMMachine(), "omap")
+
+    def testReadOnce(self):
+        info = HardwareInfo()
+        arch.setHardwareInfo(info)
+        with patch("blivet.arch.os.uname",
+                   return_value=("Linux", "host", "4.2.0", "#1", "ppc64")) as uname:
+            self.assertTrue(arch.isPPC(bits=64))
+            self.assertEqual(arch.getArch(), "ppc64")
+            self.assertEqual(info.kernelRelease, "4.2.0")
+            self.assertEqual(uname.call_count, 1)
+
+        self.assertIs(info.cpuinfo, info.cpuinfo)
+
+        # the default description is created on first use
+        arch.setHardwareInfo(None)
+        self.assertIs(arch.getHardwareInfo(), arch.getHardwareInfo())
+        self.assertIsNot(arch.getHardwareInfo(), info)
+
+if __name__ == "__main__":
+    unittest.main()
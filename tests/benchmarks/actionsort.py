@@ -0,0 +1,33 @@
+#!/usr/bin/python
+""" Compare the pairwise action sort with :meth:`~.ActionList.sort`.
+
+    Run from the top of the source tree:
+
+        PYTHONPATH=.:tests/ python tests/benchmarks/actionsort.py
+"""
+
+import timeit
+
+from blivet.actionlist import ActionList
+from actionlist_test import makeActions, legacySort
+
+def sortActions(actions):
+    action_list = ActionList()
+    for action in actions:
+        action_list.append(action)
+
+    action_list.sort()
+    return list(action_list)
+
+def main():
+    print("%8s %8s %12s %12s" % ("vgs", "actions", "pairwise", "bucketed"))
+    for vgs in (4, 16, 64):
+        actions = makeActions(vgs=vgs, lvs=8)
+        legacy = min(timeit.repeat(lambda: legacySort(actions),
+                                   number=1, repeat=3))
+        current = min(timeit.repeat(lambda: sortActions(actions),
+                                    number=1, repeat=3))
+        print("%8d %8d %11.3fs %11.3fs" % (vgs, len(actions), legacy, current))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+""" Time allocatePartitions for many growable requests over many disks.
+
+    Each layout spreads a number of partition requests, most of them
+    growable, over a set of disk image files. The number of per-disk growth
+    simulations is reported along with the time. Run from the top of the
+    source tree:
+
+        PYTHONPATH=.:tests/ python tests/benchmarks/allocate.py
+"""
+
+import contextlib
+import os
+import time
+
+from mock import Mock
+
+from blivet import partitioning
+from blivet import util
+from blivet.devices import DiskFile, PartitionDevice
+from blivet.formats import getFormat
+from blivet.size import Size
+
+@contextlib.contextmanager
+def diskFiles(count, size):
+    disks = []
+    try:
+        for i in range(count):
+            path = util.create_sparse_tempfile("bench%d" % i, size)
+            disk = DiskFile(path)
+            disk.format = getFormat("disklabel", device=disk.path,
+                                    exists=False, labelType="gpt")
+            disks.append(disk)
+
+        yield disks
+    finally:
+        for disk in disks:
+            os.unlink(disk.path)
+
+def allocate(disks, count):
+    partitions = []
+    for i in range(count):
+        partitions.append(PartitionDevice("req%d" % i,
+                                          size=Size("%d MiB" % (500 + 100 * (i % 7))),
+                                          grow=(i % 5 != 0),
+                                          maxsize=Size("20 GiB") if i % 3 else None))
+
+    storage = Mock(bootDisk=None, compareDisksKey=lambda d: d.name)
+    free = partitioning.getFreeRegions(disks)
+
+    calls = [0]
+    getDiskGrowth = partitioning.getDiskGrowth
+    def countingGetDiskGrowth(*args):
+        calls[0] += 1
+        return getDiskGrowth(*args)
+
+    partitioning.getDiskGrowth = countingGetDiskGrowth
+    try:
+        start = time.time()
+        partitioning.allocatePartitions(storage, disks, partitions, free)
+        elapsed = time.time() - start
+    finally:
+        partitioning.getDiskGrowth = getDiskGrowth
+        partitioning.removeNewPartitions(disks, partitions, partitions)
+
+    return (elapsed, calls[0])
+
+def main():
+    print("%8s %8s %12s %12s" % ("disks", "requests", "simulations", "time"))
+    for (disk_count, request_count) in ((4, 10), (12, 25), (24, 50)):
+        with diskFiles(disk_count, Size("500 GiB")) as disks:
+            (elapsed, calls) = allocate(disks, request_count)
+            print("%8d %8d %12d %11.3fs" % (disk_count, request_count, calls,
+                                            elapsed))
+
+if __name__ == "__main__":
+    main()
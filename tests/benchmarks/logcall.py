@@ -0,0 +1,61 @@
+#!/usr/bin/python
+""" Measure the overhead of log_method_call with and without debug logging.
+
+    The inspect.stack based implementation is included for comparison. Run
+    from the top of the source tree:
+
+        PYTHONPATH=.:tests/ python tests/benchmarks/logcall.py
+"""
+
+import inspect
+import logging
+import timeit
+
+from blivet import storage_log
+from blivet.storage_log import log_method_call
+
+def legacy_log_method_call(d, *args, **kwargs):
+    stack = inspect.stack()
+    depth = len(stack) - 1
+    fmt = "%s%s.%s:"
+    fmt_args = [depth * ' ', d.__class__.__name__, stack[1][3]]
+    for arg in args:
+        fmt += " %s ;"
+        fmt_args.append(arg)
+
+    for k, v in kwargs.items():
+        fmt += " %s: %s ;"
+        fmt_args.extend([k, v])
+
+    storage_log.log.debug(fmt, *fmt_args)
+
+class Device(object):
+    name = "sda1"
+    status = False
+
+    def legacy(self, depth=20):
+        if depth:
+            return self.legacy(depth - 1)
+
+        legacy_log_method_call(self, self.name, status=self.status)
+
+    def current(self, depth=20):
+        if depth:
+            return self.current(depth - 1)
+
+        log_method_call(self, self.name, status=self.status)
+
+def main():
+    device = Device()
+    number = 2000
+    print("%8s %14s %14s" % ("level", "inspect.stack", "current"))
+    for level in (logging.INFO, logging.DEBUG):
+        storage_log.log.setLevel(level)
+        legacy = min(timeit.repeat(device.legacy, number=number, repeat=3))
+        current = min(timeit.repeat(device.current, number=number, repeat=3))
+        print("%8s %12.1fus %12.1fus" % (logging.getLevelName(level),
+                                         legacy / number * 1e6,
+                                         current / number * 1e6))
+
+if __name__ == "__main__":
+    main()
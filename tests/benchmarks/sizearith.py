@@ -0,0 +1,49 @@
+#!/usr/bin/python
+""" Compare Size arithmetic with and without the integral shortcut.
+
+    The workload mimics the partition and LV growth loops, which add up,
+    subtract and scale many Sizes. Run from the top of the source tree:
+
+        PYTHONPATH=.:tests/ python tests/benchmarks/sizearith.py
+"""
+
+import timeit
+from decimal import Decimal
+
+from blivet.size import Size
+
+def legacyGrow(sizes, extent):
+    """ The growth workload, rebuilding every result through Size(). """
+    total = Size(0)
+    for size in sizes:
+        total = Size(Decimal.__add__(total, size))
+        grown = Size(Decimal.__mul__(size, 2))
+        grown = Size(Decimal.__sub__(grown, Size(Decimal.__mod__(grown, extent))))
+        total = Size(Decimal.__sub__(total, Size(Decimal.__floordiv__(grown, 4))))
+
+    return total
+
+def grow(sizes, extent):
+    total = Size(0)
+    for size in sizes:
+        total = total + size
+        grown = size * 2
+        grown = grown - grown % extent
+        total = total - grown // 4
+
+    return total
+
+def main():
+    extent = Size("4 MiB")
+    print("%8s %12s %12s" % ("sizes", "legacy", "current"))
+    for count in (1000, 10000, 100000):
+        sizes = [Size("%d MiB" % (i % 1000 + 1)) for i in range(count)]
+        assert legacyGrow(sizes, extent) == grow(sizes, extent)
+        legacy = min(timeit.repeat(lambda: legacyGrow(sizes, extent),
+                                   number=1, repeat=3))
+        current = min(timeit.repeat(lambda: grow(sizes, extent),
+                                    number=1, repeat=3))
+        print("%8d %11.3fs %11.3fs" % (count, legacy, current))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import gc
+import unittest
+
+from blivet.callbacks import CallbackList
+
+class Handler(object):
+    def __init__(self):
+        self.calls = 0
+
+    def handle(self):
+        self.calls += 1
+
+class CallbackListTestCase(unittest.TestCase):
+    def testDeadRef(self):
+        cb_list = CallbackList()
+        handler = Handler()
+        cb_list.add(handler.handle)
+        cb_list()
+        self.assertEqual(handler.calls, 1)
+
+        del handler
+        gc.collect()
+        cb_list()
+        self.assertEqual(cb_list._cb_list, [])
+
+    def testDeadRefRemovedTwice(self):
+        cb_list = CallbackList()
+        nested = []
+
+        def fire():
+            # like another thread firing the event at the same time
+            if not nested:
+                nested.append(True)
+                cb_list()
+
+        cb_list.add(fire)
+        handler = Handler()
+        cb_list.add(handler.handle)
+        del handler
+        gc.collect()
+
+        # both calls drop the dead handler
+        cb_list()
+        self.assertEqual(len(cb_list._cb_list), 1)
+
+if __name__ == "__main__":
+    unittest.main()
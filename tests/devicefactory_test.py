@@ -9,6 +9,7 @@ from blivet.devicelibs import raid
 from blivet.devices import DiskDevice
 from blivet.errors import RaidError
 from blivet.formats import getFormat
+from blivet.osinstall import Root
 from blivet.size import Size
 
 class MDFactoryTestCase(unittest.TestCase):
@@ -59,5 +60,23 @@ class MDFactoryTestCase(unittest.TestCase):
 
         self.assertIsNone(self.factory2.get_container())
 
+    def testRevertRoots(self):
+        disk = DiskDevice("name1", fmt=getFormat("ext4", exists=True),
+                          exists=True, size=Size("10 GiB"))
+        swap = DiskDevice("name2", fmt=getFormat("swap", exists=True),
+                          exists=True, size=Size("1 GiB"))
+        root = Root(mounts={"/": disk}, swaps=[swap], name="test")
+        self.b.roots = [root]
+
+        self.factory1._save_devicetree()
+        root.mounts.pop("/")
+        root.swaps.remove(swap)
+        self.b.roots = []
+        self.factory1._revert_devicetree()
+
+        self.assertEqual(self.b.roots, [root])
+        self.assertEqual(root.mounts, {"/": disk})
+        self.assertEqual(root.swaps, [swap])
+
 if __name__ == "__main__":
     unittest.main()
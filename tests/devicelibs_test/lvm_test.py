@@ -0,0 +1,74 @@
+#!/usr/bin/python
+import unittest
+import mock
+
+from collections import namedtuple
+
+from blivet.devicelibs import lvm
+
+LVInfo = namedtuple("LVInfo", ["vg_name", "lv_name", "origin", "pool_lv"])
+
+class LVMError(Exception):
+    pass
+
+class LVMInfoCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.lvs = [LVInfo("vg1", "root", "", ""),
+                    LVInfo("vg1", "snap", "root", ""),
+                    LVInfo("vg2", "home", "", "pool")]
+        patcher = mock.patch("blivet.devicelibs.lvm.blockdev")
+        self.blockdev = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.blockdev.lvm.lvs.side_effect = self._lvs
+        self.blockdev.lvm.pvs.return_value = []
+        self.blockdev.LVMError = LVMError
+        self.cache = lvm.LVMInfoCache()
+
+    def _lvs(self, vg_name=None):
+        if vg_name and not any(lv.vg_name == vg_name for lv in self.lvs):
+            raise LVMError("Volume group \"%s\" not found" % vg_name)
+
+        return [lv for lv in self.lvs if vg_name in (None, lv.vg_name)]
+
+    def testIndexes(self):
+        cache = self.cache
+        self.assertEqual(sorted(cache.lvs), ["vg1-root", "vg1-snap", "vg2-home"])
+        self.assertEqual(sorted(cache.getVGLVs("vg1")), ["vg1-root", "vg1-snap"])
+        self.assertEqual(cache.getVGLVs("vg3"), {})
+        self.assertEqual(cache.getOrigin(cache.lvs["vg1-snap"]), "root")
+        self.assertEqual(cache.getPoolName(cache.lvs["vg2-home"]), "pool")
+
+        # everything came from a single query
+        self.assertEqual(self.blockdev.lvm.lvs.call_count, 1)
+        self.assertFalse(self.blockdev.lvm.lvorigin.called)
+
+    def testDropVG(self):
+        cache = self.cache
+        cache.getVGLVs("vg1")
+        self.lvs.append(LVInfo("vg1", "new", "", ""))
+        self.lvs.append(LVInfo("vg2", "ignored", "", ""))
+        cache.drop("vg1")
+
+        self.assertEqual(sorted(cache.getVGLVs("vg1")),
+                         ["vg1-new", "vg1-root", "vg1-snap"])
+        self.assertEqual(sorted(cache.getVGLVs("vg2")), ["vg2-home"])
+        self.blockdev.lvm.lvs.assert_called_with("vg1")
+
+        cache.drop()
+        self.assertEqual(sorted(cache.getVGLVs("vg2")),
+                         ["vg2-home", "vg2-ignored"])
+        self.assertEqual(self.blockdev.lvm.lvs.call_count, 3)
+
+    def testDropRemovedVG(self):
+        cache = self.cache
+        cache.getVGLVs("vg1")
+        self.lvs = [lv for lv in self.lvs if lv.vg_name != "vg1"]
+        cache.drop("vg1")
+
+        # the VG no longer exists, so it has no LVs
+        self.assertEqual(cache.getVGLVs("vg1"), {})
+        self.assertEqual(sorted(cache.lvs), ["vg2-home"])
+        self.blockdev.lvm.lvs.assert_called_with("vg1")
+
+if __name__ == "__main__":
+    unittest.main()
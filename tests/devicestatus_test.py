@@ -0,0 +1,133 @@
+#!/usr/bin/python
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from blivet.devicestatus import StatusCache, StatusSnapshot, _lvmVGName
+from blivet.devicestatus import statusCache
+from blivet.devices import DMDevice, LUKSDevice, StorageDevice
+from blivet.formats import getFormat
+from blivet.size import Size
+
+MDSTAT = """\
+Personalities : [raid1]
+md127 : active raid1 sdb1[1] sda1[0]
+      1048512 blocks super 1.2 [2/2] [UU]
+
+md126 : inactive sdc1[0](S)
+      1048512 blocks super 1.2
+
+unused devices: <none>
+"""
+
+SWAPS = """\
+Filename				Type		Size	Used	Priority
+/dev/dm-1                               partition	2097148	0	-1
+"""
+
+MOUNTINFO = """\
+22 1 253:0 / / rw,relatime shared:1 - ext4 /dev/mapper/vg-root rw
+"""
+
+class StatusSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sysfs = os.path.join(self.tmpdir, "block")
+        self.proc = os.path.join(self.tmpdir, "proc")
+        os.makedirs(os.path.join(self.proc, "self"))
+        for (name, contents) in (("mdstat", MDSTAT), ("swaps", SWAPS),
+                                 ("self/mountinfo", MOUNTINFO)):
+            with open(os.path.join(self.proc, name), "w") as f:
+                f.write(contents)
+
+        # name, uuid, suspended, size
+        self.addMap("dm-0", "vg-root", "LVM-abcdef", "0", "1024")
+        self.addMap("dm-1", "my--vg-swap", "LVM-ghijkl", "0", "1024")
+        self.addMap("dm-2", "luks-1234", "CRYPT-LUKS1-1234", "1", "1024")
+        self.addMap("dm-3", "empty", "", "0", "0")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def addMap(self, entry, name, uuid, suspended, size):
+        path = os.path.join(self.sysfs, entry)
+        os.makedirs(os.path.join(path, "dm"))
+        for (attr, value) in (("dm/name", name), ("dm/uuid", uuid),
+                              ("dm/suspended", suspended), ("size", size)):
+            with open(os.path.join(path, attr), "w") as f:
+                f.write(value + "\n")
+
+    def testSnapshot(self):
+        snapshot = StatusSnapshot(sysfs=self.sysfs, proc=self.proc)
+        self.assertEqual(snapshot.dmNames,
+                         set(["vg-root", "my--vg-swap", "luks-1234", "empty"]))
+        self.assertEqual(snapshot.dmActive, set(["vg-root", "my--vg-swap"]))
+        self.assertEqual(snapshot.vgNames, set(["vg", "my-vg"]))
+        self.assertEqual(snapshot.mdActive, set(["md127"]))
+        self.assertEqual(snapshot.swaps, set(["/dev/dm-1"]))
+        self.assertEqual(snapshot.getMountpoints("/dev/mapper/vg-root"), ["/"])
+        self.assertEqual(snapshot.getMountpoints("/dev/sda1"), [])
+
+        # missing files leave the snapshot empty
+        snapshot = StatusSnapshot(sysfs=self.proc, proc=self.sysfs)
+        self.assertEqual(snapshot.dmNames, set())
+        self.assertEqual(snapshot.swaps, set())
+
+    def testLVMVGName(self):
+        self.assertEqual(_lvmVGName("vg-lv"), "vg")
+        self.assertEqual(_lvmVGName("my--vg-my--lv"), "my-vg")
+        self.assertEqual(_lvmVGName("vg----x-lv"), "vg--x")
+        self.assertIsNone(_lvmVGName("novg"))
+
+    def testStatus(self):
+        snapshot = StatusSnapshot(sysfs=self.sysfs, proc=self.proc)
+        dm = DMDevice("vg-root", exists=True)
+        luks = LUKSDevice("luks-1234", exists=True,
+                          parents=[StorageDevice("sda2", exists=True,
+                                                 size=Size("1 GiB"))])
+        swap = getFormat("swap", device="/dev/dm-1", exists=True)
+        fs = getFormat("ext4", device="/dev/mapper/vg-root", exists=True)
+        pv = getFormat("lvmpv", device="/dev/sda3", vgName="my-vg", exists=True)
+        luksFmt = getFormat("luks", device="/dev/sda2", name="luks-1234",
+                            exists=True)
+
+        with patch("blivet.devicestatus.StatusSnapshot",
+                   return_value=snapshot) as snapshotClass, \
+             patch("blivet.devices.dm.blockdev") as blockdev:
+            with statusCache.snapshot():
+                self.assertTrue(dm.status)
+                self.assertFalse(luks.status)
+                self.assertTrue(swap.status)
+                self.assertTrue(fs.status)
+                self.assertTrue(pv.status)
+                self.assertTrue(luksFmt.status)
+
+                # the snapshot is read once and dropped after a change
+                self.assertEqual(snapshotClass.call_count, 1)
+                statusCache.invalidate()
+                self.assertTrue(dm.status)
+                self.assertEqual(snapshotClass.call_count, 2)
+
+            self.assertFalse(blockdev.dm.map_exists.called)
+            self.assertIsNone(statusCache.current())
+
+            dm.status # pylint: disable=pointless-statement
+            self.assertTrue(blockdev.dm.map_exists.called)
+
+    def testNesting(self):
+        cache = StatusCache()
+        with patch("blivet.devicestatus.StatusSnapshot") as snapshotClass:
+            with cache.snapshot():
+                with cache.snapshot():
+                    snapshot = cache.current()
+
+                self.assertIs(cache.current(), snapshot)
+
+            self.assertIsNone(cache.current())
+            self.assertEqual(snapshotClass.call_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,23 @@
 import unittest
+import mock
 
 from tests.imagebackedtestcase import ImageBackedTestCase
 
 from blivet.size import Size
 from blivet import devicelibs
 from blivet import devicefactory
+from blivet import udev
 from blivet import util
 from blivet.udev import trigger
 from blivet.devices import LVMSnapShotDevice, LVMThinSnapShotDevice
+from blivet.devices import DiskDevice, DMDevice, PartitionDevice, StorageDevice
+from blivet.devices import LVMLogicalVolumeDevice, LVMVolumeGroupDevice
+from blivet.devicetree import DeviceTree
+from blivet.deviceaction import ActionAddMember, ActionCreateDevice, ActionDestroyFormat
+from blivet.deviceaction import ActionRemoveMember
+from blivet.flags import flags
+from blivet.formats import getFormat
+from blivet.formats.fs import FS
 
 """
     TODO:
@@ -18,6 +28,353 @@ from blivet.devices import LVMSnapShotDevice, LVMThinSnapShotDevice
             - raid thin pool
 """
 
+class DeviceTreeLookupTestCase(unittest.TestCase):
+    """ Verify that device lookups track changes to the devices. """
+    def setUp(self):
+        self.tree = DeviceTree()
+        self.pv = StorageDevice("pv1", fmt=getFormat("lvmpv", uuid="pv1-uuid"),
+                                size=Size("1 GiB"), uuid="dev-uuid")
+        self.tree._addDevice(self.pv)
+        self.vg = LVMVolumeGroupDevice("testvg", parents=[self.pv])
+        self.tree._addDevice(self.vg)
+        self.lv = LVMLogicalVolumeDevice("test-lv", parents=[self.vg],
+                                         size=Size("512 MiB"),
+                                         fmt=getFormat("xfs", label="data"))
+        self.tree._addDevice(self.lv)
+
+    def testLookups(self):
+        tree = self.tree
+        self.assertEqual(tree.getDeviceByName("pv1"), self.pv)
+        self.assertEqual(tree.getDeviceByName("testvg-test--lv"), self.lv)
+        self.assertEqual(tree.getDeviceByPath("/dev/mapper/testvg-test--lv"), self.lv)
+        self.assertEqual(tree.getDeviceByUuid("dev-uuid"), self.pv)
+        self.assertEqual(tree.getDeviceByUuid("pv1-uuid"), self.pv)
+        self.assertEqual(tree.getDeviceByLabel("data"), self.lv)
+        self.assertEqual(tree.getDeviceByID(self.vg.id), self.vg)
+        self.assertIsNone(tree.getDeviceByName("sda"))
+        self.assertIsNone(tree.getDeviceBySysfsPath("/devices/virtual/block/pv1"))
+
+    def testChanges(self):
+        tree = self.tree
+        self.vg.name = "newvg"
+        self.assertIsNone(tree.getDeviceByName("testvg"))
+        self.assertEqual(tree.getDeviceByName("newvg"), self.vg)
+        self.assertEqual(tree.getDeviceByName("newvg-test-lv"), self.lv)
+        self.assertIsNone(tree.getDeviceByName("testvg-test-lv"))
+
+        self.lv.format = getFormat("ext4", uuid="fs-uuid")
+        self.assertIsNone(tree.getDeviceByLabel("data"))
+        self.assertEqual(tree.getDeviceByUuid("fs-uuid"), self.lv)
+
+        self.lv.format.label = "root"
+        self.assertEqual(tree.getDeviceByLabel("root"), self.lv)
+
+        self.pv.sysfsPath = "/devices/virtual/block/pv1"
+        self.assertEqual(tree.getDeviceBySysfsPath("/devices/virtual/block/pv1"),
+                         self.pv)
+
+    def testDependents(self):
+        tree = self.tree
+        self.assertEqual(tree.getChildren(self.pv), [self.vg])
+        self.assertEqual(tree.getChildren(self.vg), [self.lv])
+        self.assertEqual(tree.getDependentDevices(self.pv), [self.vg, self.lv])
+        self.assertEqual(tree.getDependentDevices(self.lv), [])
+
+        tree._removeDevice(self.lv)
+        self.assertEqual(tree.getChildren(self.vg), [])
+        self.assertEqual(tree.getDependentDevices(self.pv), [self.vg])
+
+    def testHidden(self):
+        tree = self.tree
+        tree._removeDevice(self.lv)
+        self.assertIsNone(tree.getDeviceByName("testvg-test-lv"))
+
+        self.pv.exists = True
+        self.vg.exists = True
+        tree.hide(self.vg)
+        self.assertIsNone(tree.getDeviceByName("testvg", incomplete=True))
+        self.assertEqual(tree.getDeviceByName("testvg", incomplete=True,
+                                              hidden=True),
+                         self.vg)
+
+        tree.unhide(self.vg)
+        self.assertEqual(tree.getDeviceByName("testvg", incomplete=True),
+                         self.vg)
+
+class DeviceTreeCheckpointTestCase(unittest.TestCase):
+    """ Verify that a rollback restores the checkpointed devices. """
+    def setUp(self):
+        self.tree = DeviceTree()
+        self.pv = StorageDevice("pv1", exists=True, size=Size("1 GiB"),
+                                fmt=getFormat("lvmpv", exists=True))
+        self.tree._addDevice(self.pv)
+        self.vg = LVMVolumeGroupDevice("testvg", parents=[self.pv],
+                                       exists=True)
+        self.tree._addDevice(self.vg)
+        self.lv = LVMLogicalVolumeDevice("lv1", parents=[self.vg],
+                                         size=Size("512 MiB"), exists=True,
+                                         fmt=getFormat("xfs", label="data",
+                                                       exists=True))
+        self.tree._addDevice(self.lv)
+        self.other = StorageDevice("sdb", exists=True, size=Size("1 GiB"))
+        self.tree._addDevice(self.other)
+
+    def testScope(self):
+        checkpoint = self.tree.checkpoint(devices=[self.vg])
+        self.assertEqual(set(checkpoint.deviceStates),
+                         set([self.pv, self.vg, self.lv]))
+
+        checkpoint = self.tree.checkpoint()
+        self.assertEqual(checkpoint.deviceStates, {})
+
+    def testScopeAnyDisk(self):
+        sdc = DiskDevice("sdc", exists=True, size=Size("10 GiB"))
+        self.tree._addDevice(sdc)
+        part = PartitionDevice("req0", size=Size("1 GiB"))
+        self.tree._addDevice(part)
+
+        # a partition without requested disks can end up on any disk
+        checkpoint = self.tree.checkpoint()
+        self.assertIn(sdc, checkpoint.deviceStates)
+        self.assertIn(part, checkpoint.deviceStates)
+
+        part.req_disks = [sdc]
+        sdd = DiskDevice("sdd", exists=True, size=Size("10 GiB"))
+        self.tree._addDevice(sdd)
+        checkpoint = self.tree.checkpoint()
+        self.assertIn(sdc, checkpoint.deviceStates)
+        self.assertNotIn(sdd, checkpoint.deviceStates)
+
+    def testRollback(self):
+        tree = self.tree
+        fmt = self.lv.format
+        checkpoint = tree.checkpoint(devices=[self.vg])
+
+        tree.registerAction(ActionDestroyFormat(self.lv))
+        new_lv = LVMLogicalVolumeDevice("lv2", parents=[self.vg],
+                                        size=Size("256 MiB"))
+        tree.registerAction(ActionCreateDevice(new_lv))
+        fmt.mountpoint = "/data"
+        fmt.label = "other"
+        tree.names.append("lv2")
+        self.assertEqual(tree.getDeviceByName("testvg-lv2"), new_lv)
+        self.assertIn(new_lv, self.vg.lvs)
+        self.assertIsNot(self.lv.format, fmt)
+
+        tree.rollback(checkpoint)
+        self.assertEqual(tree.actions.find(), [])
+        self.assertEqual(tree.devices, [self.pv, self.vg, self.lv, self.other])
+        self.assertNotIn("lv2", tree.names)
+        self.assertIsNone(tree.getDeviceByName("testvg-lv2"))
+        self.assertEqual(self.vg.lvs, [self.lv])
+        self.assertEqual(self.vg.children, [self.lv])
+        self.assertIs(self.lv.format, fmt)
+        self.assertIsNone(fmt.mountpoint)
+        self.assertEqual(tree.getDeviceByLabel("data"), self.lv)
+        self.assertIsNone(tree.getDeviceByLabel("other"))
+
+class UdevInfo(dict):
+    """ A minimal stand-in for :class:`pyudev.Device`. """
+    def __init__(self, sys_path, slaves=None, **kwargs):
+        dict.__init__(self, **kwargs)
+        self.sys_path = sys_path
+        self.sys_name = sys_path.split("/")[-1]
+        self.slaves = slaves or []
+
+class PopulatorSortTestCase(unittest.TestCase):
+    def testSortUdevDevices(self):
+        sda = UdevInfo("/sys/block/sda", DEVTYPE="disk")
+        sda1 = UdevInfo("/sys/block/sda/sda1", DEVTYPE="partition")
+        sdb = UdevInfo("/sys/block/sdb", DEVTYPE="disk")
+        md0 = UdevInfo("/sys/block/md0",
+                       slaves=["/sys/block/sda/sda1", "/sys/block/sdb"])
+        dm0 = UdevInfo("/sys/block/dm-0", slaves=["/sys/block/md0"])
+        # a slave that is not part of the snapshot is ignored
+        dm1 = UdevInfo("/sys/block/dm-1", slaves=["/sys/block/sdc"])
+
+        populator = DeviceTree()._populator
+        with mock.patch("blivet.udev.device_get_slaves",
+                        side_effect=lambda info: info.slaves):
+            devices = populator._sortUdevDevices([dm0, dm1, md0, sda1,
+                                                  sdb, sda])
+
+        self.assertEqual(devices, [dm1, sdb, sda, sda1, md0, dm0])
+
+class PopulatorProbeTestCase(unittest.TestCase):
+    def testDMProbe(self):
+        info = UdevInfo("/sys/devices/virtual/block/dm-3", DEVNAME="/dev/dm-3",
+                        ID_FS_TYPE="ext4", ID_FS_UUID="1234")
+        device = DMDevice("vg-lv", exists=True, size=Size("1 GiB"),
+                          sysfsPath=info.sys_path)
+        populator = DeviceTree()._populator
+        populator.workers = 2
+        with mock.patch("blivet.populator.blockdev") as blockdev:
+            blockdev.mpath.is_mpath_member.return_value = False
+            populator._probeUdevDevices([info])
+            blockdev.mpath.is_mpath_member.assert_called_once_with("/dev/dm-3")
+
+            # the results are found under the device's own path
+            self.assertFalse(populator._isMultipathMember(device))
+            self.assertEqual(blockdev.mpath.is_mpath_member.call_count, 1)
+
+        kwargs = populator._getUdevFormatArgs(info, device.path)
+        with mock.patch("blivet.formats.getFormat") as get_format:
+            fmt = populator._getFormat(device, "ext4", kwargs)
+            self.assertFalse(get_format.called)
+
+        self.assertEqual(fmt.type, "ext4")
+        self.assertEqual(fmt.uuid, "1234")
+        self.assertEqual(fmt.device, "/dev/mapper/vg-lv")
+
+class SizeInfoPrefetchTestCase(unittest.TestCase):
+    """ Verify that filesystems on LVs are probed while the LVs are active. """
+    def setUp(self):
+        self._installer_mode = flags.installer_mode
+        flags.installer_mode = True
+        self.addCleanup(setattr, flags, "installer_mode", self._installer_mode)
+
+        self.events = []
+        def updateSizeInfo(fmt, useCache=True):
+            # pylint: disable=unused-argument
+            fmt._sizeInfoPending = False
+            self.events.append(("probe", fmt.device))
+            fmt._size = Size("256 MiB")
+            fmt._resizable = True
+
+        patcher = mock.patch.object(FS, "updateSizeInfo", updateSizeInfo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.tree = DeviceTree()
+        pv = StorageDevice("sdc1", exists=True, size=Size("1 GiB"),
+                           fmt=getFormat("lvmpv", exists=True))
+        self.tree._addDevice(pv)
+        vg = LVMVolumeGroupDevice("testvg", parents=[pv], exists=True)
+        self.tree._addDevice(vg)
+        self.lv = LVMLogicalVolumeDevice("lv1", parents=[vg], exists=True,
+                                         size=Size("512 MiB"))
+        self.lv.format = getFormat("ext4", exists=True)
+        self.tree._addDevice(self.lv)
+        self.assertTrue(self.lv.format.sizeInfoPending)
+
+        self.active = True
+        for name in ("setup", "teardown"):
+            patcher = mock.patch.object(self.lv, name,
+                                        side_effect=self._record(name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(LVMLogicalVolumeDevice, "status",
+                                    new_callable=mock.PropertyMock,
+                                    side_effect=lambda: self.active)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _record(self, name):
+        def record(*args, **kwargs):
+            # pylint: disable=unused-argument
+            self.events.append((name, self.lv.path))
+            self.active = name == "setup"
+
+        return record
+
+    def testPopulate(self):
+        with mock.patch.object(self.tree._populator, "populate"), \
+             mock.patch("blivet.devicetree.udev"), \
+             mock.patch.object(self.tree, "teardownAll",
+                               side_effect=lambda: self.lv.teardown()):
+            self.tree.populate()
+
+        # populate leaves the probe until the size info is used
+        self.assertEqual(self.events, [("teardown", self.lv.path)])
+        self.assertTrue(self.lv.format.sizeInfoPending)
+
+        # the LV is set up again for the probe
+        self.assertEqual(self.lv.format.size, Size("256 MiB"))
+        self.assertTrue(self.lv.format.resizable)
+        self.assertEqual(self.events, [("teardown", self.lv.path),
+                                       ("setup", self.lv.path),
+                                       ("probe", self.lv.path),
+                                       ("teardown", self.lv.path)])
+        self.assertFalse(self.active)
+
+    def testPrefetchInactive(self):
+        self.active = False
+        self.tree.prefetchSizeInfo()
+        self.assertEqual(self.events, [("setup", self.lv.path),
+                                       ("probe", self.lv.path),
+                                       ("teardown", self.lv.path)])
+        self.assertFalse(self.active)
+        self.assertEqual(self.lv.format.size, Size("256 MiB"))
+
+class LVMCacheTestCase(unittest.TestCase):
+    """ Verify that executed actions drop the stale lvm information. """
+    def testMemberActions(self):
+        tree = DeviceTree()
+        pv = StorageDevice("sdc1", exists=True, size=Size("1 GiB"),
+                           fmt=getFormat("lvmpv", exists=True))
+        vg = LVMVolumeGroupDevice("testvg", parents=[pv], exists=True)
+        new_pv = StorageDevice("sdd1", exists=True, size=Size("1 GiB"),
+                               fmt=getFormat("lvmpv", exists=True))
+        with mock.patch.object(tree, "_lvm_info") as lvm_info:
+            tree._actionExecuted(action=ActionAddMember(vg, new_pv))
+            lvm_info.drop.assert_called_once_with("testvg")
+
+            lvm_info.reset_mock()
+            tree._actionExecuted(action=ActionRemoveMember(vg, pv))
+            lvm_info.drop.assert_called_once_with("testvg")
+
+class UdevEventTestCase(unittest.TestCase):
+    """ Verify that udev events only update the affected devices. """
+    def setUp(self):
+        self.tree = DeviceTree()
+        self.pv = StorageDevice("sdc1", exists=True, size=Size("1 GiB"),
+                                sysfsPath="/sys/block/sdc/sdc1",
+                                fmt=getFormat("lvmpv", exists=True))
+        self.tree._addDevice(self.pv)
+        self.vg = LVMVolumeGroupDevice("testvg", parents=[self.pv],
+                                       exists=True)
+        self.tree._addDevice(self.vg)
+        self.lv = LVMLogicalVolumeDevice("lv1", parents=[self.vg],
+                                         size=Size("512 MiB"), exists=True)
+        self.tree._addDevice(self.lv)
+        self.other = StorageDevice("sdb", exists=True, size=Size("1 GiB"),
+                                   sysfsPath="/sys/block/sdb")
+        self.tree._addDevice(self.other)
+        self.populator = self.tree._populator
+        self.populator._formatSignatures["/sys/block/sdb"] = \
+            udev.device_get_format_signature({})
+
+    def testRemove(self):
+        self.tree.handleUdevEvents([("remove",
+                                     UdevInfo("/sys/block/sdc/sdc1"))])
+        self.assertEqual(self.tree.devices, [self.other])
+
+    def testRemoveWithActions(self):
+        self.tree.registerAction(ActionDestroyFormat(self.lv))
+        self.tree.handleUdevEvents([("remove",
+                                     UdevInfo("/sys/block/sdc/sdc1"))])
+        self.assertEqual(self.tree.devices,
+                         [self.pv, self.vg, self.lv, self.other])
+
+    def testChange(self):
+        info = UdevInfo("/sys/block/sdb")
+        with mock.patch.object(self.populator, "_rescanDevice") as rescan:
+            with mock.patch.object(self.other, "updateSize") as update_size:
+                self.tree.handleUdevEvents([("change", info)])
+                self.assertTrue(update_size.called)
+                self.assertFalse(rescan.called)
+
+            info["ID_FS_TYPE"] = "xfs"
+            self.tree.handleUdevEvents([("change", info)])
+            rescan.assert_called_once_with(self.other, info)
+
+    def testAdd(self):
+        info = UdevInfo("/sys/block/sdd")
+        with mock.patch.object(self.populator, "addUdevDevice") as add:
+            self.tree.handleUdevEvents([("add", info)])
+            add.assert_called_once_with(info)
+
 def recursive_getattr(x, attr, default=None):
     """ Resolve a possibly-dot-containing attribute name. """
     val = x
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+import copy
+import unittest
+
+import mock
+
+from blivet.formats import getFormat
+from blivet.formats.disklabel import SharedPartedDisk
+
+class DiskLabelCopyTestCase(unittest.TestCase):
+    def _disk(self):
+        disk = mock.Mock()
+        disk.duplicate.side_effect = self._disk
+        return disk
+
+    def _label(self, exists=True):
+        fmt = getFormat("disklabel", device="/dev/does-not-exist",
+                        exists=exists)
+        fmt._partedDevice = mock.Mock()
+        fmt._partedDisk = self._disk()
+        fmt._origPartedDisk = SharedPartedDisk(self._disk())
+        return fmt
+
+    def testLazyNewLabel(self):
+        fmt = getFormat("disklabel", device="/dev/does-not-exist",
+                        labelType="gpt")
+        self.assertIsNone(fmt._partedDisk)
+        self.assertIsNone(fmt._origPartedDisk)
+
+        # resetting a new label starts over with an empty parted.Disk
+        fmt._partedDisk = self._disk()
+        fmt.resetPartedDisk()
+        self.assertIsNone(fmt._partedDisk)
+
+    def testCopyOnWrite(self):
+        fmt = self._label()
+        working = fmt._partedDisk
+        orig = fmt._origPartedDisk.disk
+        fmt2 = copy.copy(fmt)   # like a device's originalFormat
+
+        (new, new2) = copy.deepcopy([fmt, fmt2])
+        self.assertIs(new._partedDevice, fmt._partedDevice)
+
+        # the working copy is duplicated once, the original is shared
+        self.assertEqual(working.duplicate.call_count, 1)
+        self.assertIsNot(new._partedDisk, working)
+        self.assertIs(new2._partedDisk, new._partedDisk)
+        self.assertFalse(orig.duplicate.called)
+        self.assertIs(new._origPartedDisk.disk, orig)
+        self.assertIs(new2._origPartedDisk, new._origPartedDisk)
+
+        # each tree gets its own parted.Disk when it starts modifying it
+        new.resetPartedDisk()
+        new2.resetPartedDisk()
+        self.assertEqual(orig.duplicate.call_count, 1)
+        self.assertIsNot(new._partedDisk, orig)
+        self.assertIs(new2._partedDisk, new._partedDisk)
+
+        fmt.resetPartedDisk()
+        self.assertEqual(orig.duplicate.call_count, 2)
+        self.assertIsNot(fmt._partedDisk, orig)
+        self.assertIsNot(fmt._partedDisk, new._partedDisk)
+
+    def testCopyAfterReset(self):
+        fmt = self._label()
+        fmt.resetPartedDisk()
+        working = fmt._partedDisk
+        self.assertIs(working, fmt._origPartedDisk.disk)
+
+        # the original is being modified, so the copy gets a snapshot of it
+        new = copy.deepcopy(fmt)
+        self.assertEqual(working.duplicate.call_count, 1)
+        self.assertIs(new._origPartedDisk.disk, new._partedDisk)
+        self.assertIsNot(new._partedDisk, working)
+
+        # the copy's original is its working copy too, so copying the copy
+        # must not share it
+        new2 = copy.deepcopy(new)
+        self.assertIs(new2._origPartedDisk.disk, new2._partedDisk)
+        self.assertIsNot(new2._partedDisk, new._partedDisk)
+        self.assertIsNot(new2._origPartedDisk.disk, new._partedDisk)
+
+if __name__ == "__main__":
+    unittest.main()
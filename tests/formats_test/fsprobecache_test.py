@@ -0,0 +1,131 @@
+#!/usr/bin/python
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import blivet.formats.fs as fs
+from blivet.formats.fsprobecache import FSProbeCache, fsProbeCache
+from blivet.size import Size
+
+class FSProbeCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "fsprobe.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testDisabled(self):
+        cache = FSProbeCache()
+        self.assertFalse(cache.enabled)
+        cache.store("/dev/sda1:2049:ext4:uuid:1024:abc", {"size": 1})
+        self.assertIsNone(cache.lookup("/dev/sda1:2049:ext4:uuid:1024:abc"))
+
+    def testPersistence(self):
+        cache = FSProbeCache(path=self.path)
+        key = "/dev/sda1:2049:ext4:uuid:1024:abc"
+        cache.store(key, {"size": 1024})
+        self.assertEqual(cache.lookup(key), {"size": 1024})
+        self.assertIsNone(cache.lookup(None))
+
+        # nothing is written until the cache is flushed
+        self.assertFalse(os.path.exists(self.path))
+        cache.flush()
+
+        # a new instance reads the results back from disk
+        self.assertEqual(FSProbeCache(path=self.path).lookup(key),
+                         {"size": 1024})
+
+        # a changed filesystem replaces the stale entry for the device
+        cache.store("/dev/sda10:2058:ext4:uuid2:1024:abc", {"size": 10})
+        cache.store("/dev/sda1:2049:ext4:uuid:1024:def", {"size": 2048})
+        cache.flush()
+        cache = FSProbeCache(path=self.path)
+        self.assertIsNone(cache.lookup(key))
+        self.assertEqual(cache.lookup("/dev/sda1:2049:ext4:uuid:1024:def"),
+                         {"size": 2048})
+        self.assertEqual(cache.lookup("/dev/sda10:2058:ext4:uuid2:1024:abc"),
+                         {"size": 10})
+
+        cache.clear()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(cache.lookup("/dev/sda1:2049:ext4:uuid:1024:def"))
+
+    def testFlush(self):
+        cache = FSProbeCache(path=self.path)
+        with mock.patch.object(cache, "_save") as save:
+            cache.flush()
+            self.assertFalse(save.called)
+
+            cache.store("/dev/sda1:2049:ext4:uuid:1024:abc", {"size": 1})
+            cache.store("/dev/sda2:2050:ext4:uuid2:1024:abc", {"size": 2})
+            self.assertFalse(save.called)
+
+            # the results of all probes are written at once
+            cache.flush()
+            self.assertEqual(save.call_count, 1)
+            cache.flush()
+            self.assertEqual(save.call_count, 1)
+
+    def testPrefetchFlush(self):
+        fmt = fs.Ext4FS(device="/dev/sda1", uuid="uuid", exists=True)
+        fmt._sizeInfoPending = True
+        with mock.patch.object(fs.Ext4FS, "updateSizeInfo") as update, \
+             mock.patch.object(fsProbeCache, "flush") as flush:
+            fs.prefetchSizeInfo([fmt])
+            self.assertTrue(update.called)
+            self.assertTrue(flush.called)
+
+    def testCorruptFile(self):
+        with open(self.path, "w") as f:
+            f.write("not json")
+        cache = FSProbeCache(path=self.path)
+        self.assertIsNone(cache.lookup("/dev/sda1:2049:ext4:uuid:1024:abc"))
+
+    def testGetKey(self):
+        fmt = mock.Mock(exists=True, uuid="uuid", device=self.path,
+                        status=False, type="ext4")
+        with open(self.path, "w") as f:
+            f.write("data")
+
+        # regular files are never cached
+        self.assertIsNone(FSProbeCache.getKey(fmt))
+
+        fmt.device = "/dev/does-not-exist"
+        self.assertIsNone(FSProbeCache.getKey(fmt))
+
+        fmt.status = True
+        self.assertIsNone(FSProbeCache.getKey(fmt))
+
+    def testUpdateSizeInfo(self):
+        fmt = fs.Ext4FS(device="/dev/sda1", uuid="uuid", exists=True)
+        key = "/dev/sda1:2049:ext4:uuid:1024:abc"
+        cached = {"size": int(Size("10 GiB")), "minSize": int(Size("10 GiB")),
+                  "minInstanceSize": int(Size("2 GiB")), "resizable": True,
+                  "label": "root"}
+        with mock.patch.object(fsProbeCache, "_path", self.path), \
+             mock.patch.object(FSProbeCache, "getKey", return_value=key), \
+             mock.patch.object(fs.Ext4FS, "doCheck") as doCheck:
+            fsProbeCache.store(key, cached)
+            fmt.updateSizeInfo()
+            self.assertFalse(doCheck.called)
+            self.assertEqual(fmt.currentSize, Size("10 GiB"))
+            self.assertEqual(fmt.minSize, Size("2 GiB"))
+            self.assertTrue(fmt.resizable)
+            self.assertEqual(fmt.label, "root")
+
+            # bypassing the cache probes again
+            with mock.patch.object(fs.Ext4FS, "_getFSInfo", return_value=""), \
+                 mock.patch.object(fs.Ext4FS, "_getMinSize"):
+                fmt.updateSizeInfo(useCache=False)
+            self.assertTrue(doCheck.called)
+            self.assertEqual(fmt.currentSize, Size(0))
+            self.assertEqual(fsProbeCache.lookup(key)["size"], 0)
+
+        fsProbeCache._entries = None
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/python
+import unittest
+
+import mock
+
+import blivet.formats.fs as fs
+from blivet.flags import flags
+from blivet.formats import getFormat
+from blivet.size import Size
+
+class LazySizeInfoTestCase(unittest.TestCase):
+    def setUp(self):
+        self._installer_mode = flags.installer_mode
+        flags.installer_mode = True
+
+        def updateSizeInfo(fmt, useCache=True):
+            # pylint: disable=unused-argument
+            fmt._sizeInfoPending = False
+            self.probed.append(fmt.device)
+            fmt._size = Size("10 GiB")
+            fmt._minInstanceSize = Size("2 GiB")
+            fmt._resizable = True
+
+        self.probed = []
+        patcher = mock.patch.object(fs.FS, "updateSizeInfo", updateSizeInfo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        flags.installer_mode = self._installer_mode
+
+    def testLazy(self):
+        fmt = fs.Ext4FS(device="/dev/sda1", exists=True)
+        self.assertEqual(self.probed, [])
+
+        self.assertEqual(fmt.currentSize, Size("10 GiB"))
+        self.assertEqual(fmt.targetSize, Size("10 GiB"))
+        self.assertEqual(fmt.minSize, Size("2 GiB"))
+        self.assertEqual(self.probed, ["/dev/sda1"])
+
+        # non-existent filesystems have nothing to probe
+        fmt = fs.Ext4FS(device="/dev/sda2")
+        self.assertEqual(fmt.currentSize, Size(0))
+        self.assertEqual(self.probed, ["/dev/sda1"])
+
+    def testPrefetch(self):
+        formats = [fs.Ext4FS(device="/dev/sda%d" % i, exists=True)
+                   for i in range(1, 5)]
+        formats.append(getFormat(None))
+        fs.prefetchSizeInfo(formats, workers=2)
+        self.assertEqual(sorted(self.probed),
+                         ["/dev/sda%d" % i for i in range(1, 5)])
+
+        fs.prefetchSizeInfo(formats)
+        self.assertEqual(len(self.probed), 4)
+        self.assertTrue(all(f.resizable for f in formats[:4]))
+
+if __name__ == "__main__":
+    unittest.main()
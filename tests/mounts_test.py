@@ -0,0 +1,36 @@
+#!/usr/bin/python
+
+import unittest
+
+from blivet.mounts import MountsCache
+
+MOUNTINFO = """\
+17 22 0:17 / /sys rw,nosuid shared:6 - sysfs sysfs rw
+22 1 253:0 / / rw,relatime shared:1 - ext4 /dev/vda1 rw
+40 22 253:16 /home /home rw,relatime shared:20 - btrfs /dev/vdb rw,space_cache
+41 22 253:16 / /mnt/top rw,relatime - btrfs /dev/vdb rw,space_cache
+42 22 253:0 / /mnt/again rw,relatime shared:1 master:2 - ext4 /dev/vda1 rw
+garbage
+"""
+
+class MountsCacheTestCase(unittest.TestCase):
+    def testParseMountInfo(self):
+        mountpoints = MountsCache._parseMountInfo(MOUNTINFO.splitlines())
+        self.assertEqual(dict(mountpoints),
+                         {("sysfs", None): ["/sys"],
+                          ("/dev/vda1", None): ["/", "/mnt/again"],
+                          ("/dev/vdb", "home"): ["/home"],
+                          ("/dev/vdb", 5): ["/mnt/top"]})
+
+    def testCacheCheck(self):
+        cache = MountsCache()
+        self.assertTrue(cache.isMountpoint("/"))
+        self.assertFalse(cache.isMountpoint("/not/a/mountpoint"))
+        self.assertEqual(cache.getMountpoints("/not/a/device"), [])
+
+        # nothing is parsed again until the mount table changes
+        if cache._poller is not None:
+            self.assertFalse(cache._mountsChanged())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -77,6 +77,28 @@ class ParentListTestCase(unittest.TestCase):
         dev3.parents = []
         self.assertEqual(len(dev3.parents), 0)
 
+    def testDeviceChildren(self):
+        """ Verify that Device.children and ancestors track parent changes. """
+        dev1 = Device("dev1")
+        dev2 = Device("dev2", [dev1])
+        dev3 = Device("dev3", [dev2])
+        self.assertEqual(dev1.children, [dev2])
+        self.assertEqual(set(dev3.ancestors), set([dev1, dev2, dev3]))
+        self.assertTrue(dev3.dependsOn(dev1))
+
+        dev4 = Device("dev4")
+        dev2.parents.replace(dev1, dev4)
+        self.assertEqual(dev1.children, [])
+        self.assertEqual(dev4.children, [dev2])
+        self.assertEqual(set(dev3.ancestors), set([dev2, dev3, dev4]))
+        self.assertFalse(dev3.dependsOn(dev1))
+        self.assertTrue(dev3.dependsOn(dev4))
+
+        dev2.parents.remove(dev4)
+        self.assertEqual(dev4.children, [])
+        self.assertFalse(dev3.dependsOn(dev4))
+        self.assertFalse(dev3.dependsOn(dev3))
+
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(ParentListTestCase)
@@ -1,15 +1,18 @@
 #!/usr/bin/python
 
+import random
 import unittest
-from mock import Mock
+from mock import Mock, patch
 
 import parted
 
+from blivet import partitioning
 from blivet.partitioning import addPartition
 from blivet.partitioning import getNextPartitionType
 from blivet.partitioning import doPartitioning
 from blivet.partitioning import allocatePartitions
 from blivet.partitioning import getFreeRegions
+from blivet.partitioning import getBestFreeSpaceRegion
 from blivet.partitioning import Request
 from blivet.partitioning import Chunk
 from blivet.partitioning import LVRequest
@@ -26,6 +29,7 @@ from blivet.devices import PartitionDevice
 from tests.imagebackedtestcase import ImageBackedTestCase
 from blivet.util import sparsetmpfile
 from blivet.formats import getFormat
+from blivet.formats.disklabel import FreeSpaceMap
 from blivet.size import Size
 from blivet.flags import flags
 
@@ -285,6 +289,53 @@ class PartitioningTestCase(unittest.TestCase):
         self.assertEqual(req2.growth, 0)
         self.assertEqual(req3.growth, 35)
 
+    def testChunkLimits(self):
+        def request(rid, base, max_growth=0, grow=True):
+            dev = Mock()
+            dev.configure_mock(req_grow=grow, id=rid, name="req%d" % rid)
+            req = Request(dev)
+            req.base = base
+            req.max_growth = max_growth
+            return req
+
+        # requests reach their limits at different levels: req3 first, then
+        # req2; req4 is never reached
+        req1 = request(1, 100)
+        req2 = request(2, 100, max_growth=150)
+        req3 = request(3, 200, max_growth=20)
+        req4 = request(4, 100, max_growth=10000)
+        req5 = request(5, 300, grow=False)
+        chunk = Chunk(1500, requests=[req1, req2, req3, req4, req5])
+        self.assertEqual(chunk.pool, 700)
+
+        chunk.growRequests()
+
+        # 680 units are left after req3 is done. An equal share for req1,
+        # req2 and req4 would be 226 each, which is beyond req2's limit, so
+        # req1 and req4 split the remaining 530.
+        self.assertEqual(chunk.pool, 0)
+        self.assertEqual([r.growth for r in (req1, req2, req3, req4, req5)],
+                         [265, 150, 20, 265, 0])
+        self.assertEqual([r.done for r in (req1, req2, req3, req4, req5)],
+                         [False, True, True, False, True])
+
+        # many requests with limits at every level
+        requests = [request(i, 10 + i % 7, max_growth=i * 3) for i in range(1, 301)]
+        chunk = Chunk(100000, requests=requests)
+        pool = chunk.pool
+        chunk.growRequests()
+        self.assertEqual(chunk.pool, 0)
+        self.assertEqual(sum(r.growth for r in requests), pool)
+        self.assertTrue(all(r.growth <= r.max_growth for r in requests))
+
+        # the water level is the same for every request below its limit,
+        # except that the first of them gets the leftovers
+        below = [r for r in requests if not r.done]
+        self.assertGreater(len(below), 1)
+        levels = set(r.growth * 16 // r.base for r in below[1:])
+        self.assertLessEqual(max(levels) - min(levels), 2)
+        self.assertGreaterEqual(below[0].growth * 16 // below[0].base, max(levels))
+
     def testDiskChunk1(self):
         disk_size = Size("100 MiB")
         with sparsetmpfile("chunktest", disk_size) as disk_file:
@@ -437,6 +488,36 @@ class PartitioningTestCase(unittest.TestCase):
             self.assertEqual(requests[3].growth, 0)
             self.assertEqual(requests[4].growth, 2048)
 
+    def testAllocateGrowthCache(self):
+        disk_size = Size("100 MiB")
+        with sparsetmpfile("growtest1", disk_size) as path1, \
+             sparsetmpfile("growtest2", disk_size) as path2, \
+             sparsetmpfile("growtest3", disk_size) as path3:
+            disks = []
+            for path in (path1, path2, path3):
+                disk = DiskFile(path)
+                disk.format = getFormat("disklabel", device=disk.path,
+                                        exists=False)
+                disks.append(disk)
+
+            partitions = [PartitionDevice("p%d" % i, size=Size("10 MiB"),
+                                          grow=True)
+                          for i in range(3)]
+            free = getFreeRegions(disks)
+
+            b = Mock(bootDisk=None, compareDisksKey=lambda d: d.name)
+            with patch("blivet.partitioning.getDiskGrowth",
+                       wraps=partitioning.getDiskGrowth) as getDiskGrowth:
+                allocatePartitions(b, disks, partitions, free)
+
+            # growth is largest with each partition on its own disk
+            self.assertEqual(len(set(p.disk for p in partitions)), 3)
+
+            # without caching every candidate disk would mean simulating
+            # growth on all three disks
+            self.assertLess(getDiskGrowth.call_count,
+                            len(partitions) * len(disks) * len(disks))
+
     def testVGChunk(self):
         pv = StorageDevice("pv1", size=Size("40 GiB"),
                            fmt=getFormat("lvmpv"))
@@ -505,6 +586,114 @@ class PartitioningTestCase(unittest.TestCase):
         self.assertEqual(req2.growth, 3956)
         self.assertEqual(req3.growth, 512)
 
+class FreeSpaceMapTestCase(unittest.TestCase):
+    sectorSize = 512
+
+    def getGeometry(self, start, end):
+        return Mock(start=start, end=end, length=end - start + 1)
+
+    def getDisk(self, regions, extended=None, maxStart=None):
+        disk = Mock()
+        disk.device.sectorSize = self.sectorSize
+        disk.device.path = "/dev/fake"
+        disk.maxPartitionStartSector = maxStart or 2**40
+        disk.getFreeSpaceRegions.return_value = [self.getGeometry(*r) for r in regions]
+        if extended:
+            ext = Mock()
+            ext.geometry.contains.side_effect = lambda g: extended[0] <= g.start and g.end <= extended[1]
+            disk.getExtendedPartition.return_value = ext
+        else:
+            disk.getExtendedPartition.return_value = None
+        return disk
+
+    def walkFreeRegions(self, disk, part_type, req_size, start=None, boot=None,
+                        best_free=None, grow=None):
+        """ The original linear search done by getBestFreeSpaceRegion. """
+        extended = disk.getExtendedPartition()
+        for free_geom in disk.getFreeSpaceRegions():
+            if start is not None and not free_geom.start <= start <= free_geom.end:
+                continue
+            if extended:
+                in_extended = extended.geometry.contains(free_geom)
+                if ((in_extended and part_type == parted.PARTITION_NORMAL) or
+                    (not in_extended and part_type == parted.PARTITION_LOGICAL)):
+                    continue
+            if free_geom.start > disk.maxPartitionStartSector:
+                continue
+            if boot and Size(free_geom.start * self.sectorSize) + req_size > Size("2 TiB"):
+                continue
+
+            free_size = Size(free_geom.length * self.sectorSize)
+            if grow or part_type == parted.PARTITION_EXTENDED:
+                better = lambda a, b: a > b
+            else:
+                better = lambda a, b: a < b
+            if req_size <= free_size:
+                if not best_free or better(free_geom.length, best_free.length):
+                    best_free = free_geom
+                    if boot:
+                        break
+
+        return best_free
+
+    def testExtended(self):
+        disk = self.getDisk([(34, 2047), (4096, 10239), (12288, 20479),
+                             (30000, 30999)],
+                            extended=(12000, 40000))
+        free_map = FreeSpaceMap(disk)
+        self.assertEqual(len(free_map), 4)
+
+        normal = getBestFreeSpaceRegion(disk, parted.PARTITION_NORMAL,
+                                        Size("512 KiB"), free_map=free_map)
+        self.assertEqual(normal.start, 34)
+        logical = getBestFreeSpaceRegion(disk, parted.PARTITION_LOGICAL,
+                                         Size("256 KiB"), free_map=free_map)
+        self.assertEqual(logical.start, 30000)
+        logical = getBestFreeSpaceRegion(disk, parted.PARTITION_LOGICAL,
+                                         Size("512 KiB"), grow=True,
+                                         free_map=free_map)
+        self.assertEqual(logical.start, 12288)
+        self.assertIsNone(getBestFreeSpaceRegion(disk, parted.PARTITION_NORMAL,
+                                                 Size("1 GiB"),
+                                                 free_map=free_map))
+        self.assertIsNone(getBestFreeSpaceRegion(disk, parted.PARTITION_NORMAL,
+                                                 Size("1 KiB"), start=12300,
+                                                 free_map=free_map))
+
+    def testMatchesLinearSearch(self):
+        rand = random.Random(17)
+        part_types = [parted.PARTITION_NORMAL, parted.PARTITION_LOGICAL,
+                      parted.PARTITION_EXTENDED]
+        for _i in range(200):
+            regions = []
+            sector = rand.randint(0, 2048)
+            for _j in range(rand.randint(0, 12)):
+                length = rand.choice([1, 2048, 4096, 2**20, 2**22, 2**32])
+                regions.append((sector, sector + length - 1))
+                sector += length + rand.randint(1, 2**21)
+
+            extended = None
+            if regions and rand.random() < 0.5:
+                first = rand.randrange(len(regions))
+                extended = (regions[first][0] - 1, sector + 1)
+
+            disk = self.getDisk(regions, extended=extended,
+                                maxStart=rand.choice([None, 2**30]))
+            free_map = FreeSpaceMap(disk)
+            for _j in range(20):
+                kwargs = {"part_type": rand.choice(part_types),
+                          "req_size": Size(rand.choice([1, 2048, 2**20, 2**22, 2**32]) * self.sectorSize),
+                          "boot": rand.random() < 0.2,
+                          "grow": rand.random() < 0.5}
+                if regions and rand.random() < 0.2:
+                    kwargs["start"] = rand.choice(regions)[0] + rand.randint(0, 4096)
+                if regions and rand.random() < 0.3:
+                    kwargs["best_free"] = self.getGeometry(0, rand.choice([2048, 2**22]))
+
+                expected = self.walkFreeRegions(disk, **kwargs)
+                self.assertIs(getBestFreeSpaceRegion(disk, free_map=free_map, **kwargs),
+                              expected, kwargs)
+
 class ExtendedPartitionTestCase(ImageBackedTestCase):
 
     disks = {"disk1": Size("2 GiB")}
@@ -399,5 +399,46 @@ class UtilityMethodsTestCase(unittest.TestCase):
         self.assertIsInstance(2**Size(2), Decimal)
         self.assertIsInstance(1024 % Size(127), Decimal)
 
+    def testIntegralArithmetic(self):
+        s = Size(-7)
+
+        # Decimal semantics are kept for negative values
+        self.assertEqual(s // 2, Size(-3))
+        self.assertEqual(s % 2, Size(-1))
+        self.assertEqual(s // Size(2), Size(-3))
+
+        # partial bytes are still dropped for non-integral operands
+        self.assertEqual(s + Decimal("0.5"), Size(-6))
+        self.assertEqual(Size(3) * Decimal("1.5"), Size(4))
+        self.assertEqual(sum([Size(1), Size(2), Size(3)]), Size(6))
+        self.assertEqual(Size(Size(5)), Size(5))
+        self.assertIsInstance(Size(Size(5)) + 1, Size)
+
+    def testLRUCache(self):
+        cache = size._LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        self.assertEqual(cache.get("a"), 1)
+        cache["c"] = 3
+
+        # "b" was the least recently used item
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+
+    def testCacheInvalidation(self):
+        self.assertEqual(size.parseSpec("5 KiB"), Decimal(5120))
+        self.assertEqual(Size(5120).humanReadable(), "5 KiB")
+        self.assertEqual(size._parseCache.get("5 KiB"), Decimal(5120))
+        self.assertNotEqual(len(size._humanReadableCache), 0)
+
+        # pretend the locale was changed
+        size._localeState["locale"] = None
+        size._checkLocale()
+        self.assertIsNone(size._parseCache.get("5 KiB"))
+        self.assertEqual(len(size._humanReadableCache), 0)
+        self.assertEqual(size._unitTables, {})
+
 if __name__ == "__main__":
     unittest.main()
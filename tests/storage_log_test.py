@@ -0,0 +1,63 @@
+#!/usr/bin/python
+
+import logging
+import unittest
+
+from blivet import storage_log
+from blivet.storage_log import log_method_call, log_method_return
+from blivet.storage_log import DeferredFormat
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+class StorageLogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.handler = ListHandler()
+        storage_log.log.addHandler(self.handler)
+        self.level = storage_log.log.level
+        self.formatted = 0
+
+    def tearDown(self):
+        storage_log.log.removeHandler(self.handler)
+        storage_log.log.setLevel(self.level)
+
+    def _format(self):
+        self.formatted += 1
+        return "details"
+
+    def someMethod(self):
+        log_method_call(self, "arg", info=DeferredFormat(self._format),
+                        passphrase="secret")
+        log_method_return(self, 42)
+
+    def testDebugEnabled(self):
+        storage_log.log.setLevel(logging.DEBUG)
+        self.someMethod()
+        self.assertNotEqual(self.formatted, 0)
+        (call, ret) = self.handler.messages
+        self.assertTrue(call.lstrip().startswith(
+                        "StorageLogTestCase.someMethod: arg ;"))
+        self.assertIn(" info: details ;", call)
+        self.assertIn(" passphrase: Skipped ;", call)
+        self.assertNotIn("secret", call)
+        self.assertTrue(ret.lstrip().startswith(
+                        "StorageLogTestCase.someMethod returned 42"))
+
+        # indentation reflects the depth of the calling method's frame
+        (name, depth) = storage_log.function_name_and_depth()
+        self.assertEqual(name, "testDebugEnabled")
+        self.assertEqual(len(call) - len(call.lstrip()), depth + 1)
+
+    def testDebugDisabled(self):
+        storage_log.log.setLevel(logging.INFO)
+        self.someMethod()
+        self.assertEqual(self.handler.messages, [])
+        self.assertEqual(self.formatted, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -52,5 +52,21 @@ class TopologicalSortTestCase(unittest.TestCase):
         self.failUnless(check_order(order, graph),
                         "ordering constraints not satisfied")
 
+class StableTopologicalSortTestCase(unittest.TestCase):
+    def runTest(self):
+        items = [5, 2, 3, 4, 1]
+        edges = [(1, 2), (4, 5)]
+        graph = blivet.tsort.create_graph(items, edges)
+        self.assertEqual(blivet.tsort.tsort(graph, stable=True),
+                         [3, 4, 5, 1, 2])
+
+        # the graph is left intact
+        self.assertEqual(graph['edges'], edges)
+
+        edges = [(1, 2), (2, 1)]
+        graph = blivet.tsort.create_graph(items, edges)
+        self.assertRaises(blivet.tsort.CyclicGraphError,
+                          blivet.tsort.tsort, graph, stable=True)
+
 if __name__ == "__main__":
     unittest.main()
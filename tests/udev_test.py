@@ -36,6 +36,57 @@ class UdevTest(unittest.TestCase):
         blivet.udev.trigger()
         self.assertTrue(blivet.udev.util.run_program.called)
 
+class UdevSettleTest(unittest.TestCase):
+
+    def setUp(self):
+        import blivet.udev
+        blivet.udev._settled_seqnum[0] = None
+        blivet.udev.settle_stats.reset()
+        self.seqnum = 100
+        patchers = [mock.patch("blivet.udev.util"),
+                    mock.patch("blivet.udev.uevent_seqnum",
+                               side_effect=lambda: self.seqnum)]
+        self.util = patchers[0].start()
+        self.util.run_program.return_value = 0
+        patchers[1].start()
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        import blivet.udev
+        blivet.udev._settled_seqnum[0] = None
+
+    def test_settle_coalesced(self):
+        import blivet.udev
+        blivet.udev.settle()
+        blivet.udev.settle()
+        self.assertEqual(self.util.run_program.call_count, 1)
+
+        # a new uevent makes the next settle necessary
+        self.seqnum += 1
+        blivet.udev.settle()
+        blivet.udev.settle(force=True)
+        self.assertEqual(self.util.run_program.call_count, 3)
+
+        stats = blivet.udev.settle_stats.copy()
+        self.assertEqual((stats.calls, stats.skipped), (3, 1))
+        self.assertGreaterEqual(stats.time, 0)
+
+    def test_settle_failed(self):
+        import blivet.udev
+        # a settle that timed out doesn't count
+        self.util.run_program.return_value = 1
+        blivet.udev.settle()
+        blivet.udev.settle()
+        self.assertEqual(self.util.run_program.call_count, 2)
+
+        # without a sequence number every settle runs
+        self.util.run_program.return_value = 0
+        self.seqnum = None
+        blivet.udev.settle()
+        blivet.udev.settle()
+        self.assertEqual(self.util.run_program.call_count, 4)
+        self.assertEqual(blivet.udev.settle_stats.skipped, 0)
 
 if __name__ == "__main__":
     unittest.main()
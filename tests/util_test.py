@@ -1,8 +1,11 @@
 #!/usr/bin/python
 
+import time
 import unittest
 from decimal import Decimal
 
+import mock
+
 from blivet import util
 
 class MiscTest(unittest.TestCase):
@@ -22,3 +25,64 @@ class MiscTest(unittest.TestCase):
             self.assertTrue(util.power_of_two(2 ** i), msg=i)
             self.assertFalse(util.power_of_two(2 ** i + 1), msg=i)
             self.assertFalse(util.power_of_two(2 ** i - 1), msg=i)
+
+class ParallelMapTest(unittest.TestCase):
+    def test_parallel_map(self):
+        items = list(range(20))
+        for workers in (1, 4):
+            self.assertEqual(util.parallel_map(lambda x: x * 2, items,
+                                               workers=workers),
+                             [x * 2 for x in items])
+
+        self.assertEqual(util.parallel_map(str, [], workers=4), [])
+
+    def test_parallel_map_error(self):
+        called = []
+        def func(x):
+            called.append(x)
+            if x in (3, 7):
+                raise ValueError(x)
+            return x
+
+        with self.assertRaises(ValueError) as ctx:
+            util.parallel_map(func, range(10), workers=4)
+        self.assertEqual(ctx.exception.args, (3,))
+
+        # an error does not stop the remaining calls
+        self.assertEqual(sorted(called), list(range(10)))
+
+class RunProgramTest(unittest.TestCase):
+    def test_run_program(self):
+        self.assertEqual(util.run_program(["true"]), 0)
+        self.assertEqual(util.capture_output(["echo", "hello"]), "hello\n")
+
+    def test_log(self):
+        argv = ["sh", "-c", "echo out; echo err >&2"]
+        cmd = " ".join(argv)
+        with mock.patch("blivet.util.program_log") as program_log:
+            util.run_program(argv)
+
+        # the output is attributed to the command that produced it
+        self.assertEqual(program_log.info.call_args_list[:4],
+                         [mock.call("Running... %s", cmd),
+                          mock.call("%s: stdout:", cmd),
+                          mock.call("%s", "out"),
+                          mock.call("%s: stderr:", cmd)])
+        program_log.debug.assert_called_once_with("%s: return code: %d",
+                                                  cmd, 0)
+
+    def test_timeout(self):
+        start = time.time()
+        self.assertLess(util.run_program(["sleep", "10"], timeout=0.2), 0)
+        self.assertLess(time.time() - start, 5)
+
+    def test_concurrency(self):
+        start = time.time()
+        util.parallel_map(util.run_program, [["sleep", "0.5"]] * 4, workers=4)
+        self.assertLess(time.time() - start, 1.5)
+
+        util.set_program_concurrency(1)
+        self.addCleanup(util.set_program_concurrency, None)
+        start = time.time()
+        util.parallel_map(util.run_program, [["sleep", "0.2"]] * 3, workers=3)
+        self.assertGreaterEqual(time.time() - start, 0.6)